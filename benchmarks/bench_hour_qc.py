@@ -0,0 +1,234 @@
+"""Hour file QC over a day of synthetic data from every driver.
+
+Writes --hours hours for a Paros_600016BIS in text and in binary, a
+Young_86000 and an MPU9250, with known interval jitter, gaps, out of range
+values, malformed lines and a host clock drifting against baro_time. Then
+runs HourQC over every file and checks it finds what was put in. Reports
+lines/sec, MB/sec and the peak memory of the QC pass, and the lines/sec of
+parsing the same files one line at a time with a regex for comparison.
+Exits with an error if any check fails.
+
+Run from the repository root: python benchmarks/bench_hour_qc.py
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import socket
+import datetime
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "paros_sensors"))
+from ParosRecordFormat import ParosRecordFormat
+from paros_processor.HourQC import HourQC
+
+# (fields, sample rate, binary) of each sensor, values are made by makeValues()
+SENSORS = {
+    "paros1": ((("value", "float"), ("baro_time", "isotime")), 40, False),
+    "paros2": ((("value", "float"), ("baro_time", "isotime")), 40, True),
+    "wind1": ((("speed", "float"), ("direction", "float"), ("u", "float"), ("v", "float")), 32, False),
+    "imu1": ((("imu_time", "float"), ("accelX", "float"), ("accelY", "float"), ("accelZ", "float"), ("gyroX", "float"), ("gyroY", "float"), ("gyroZ", "float")), 150, False),
+}
+JITTER_MS = 1.5  # standard deviation of every interval
+GAPS = 3  # per hour, each of GAP_SAMPLES missing samples
+GAP_SAMPLES = 40
+OUT_OF_RANGE = 5  # values per hour set far outside the field's range
+MALFORMED = 4  # lines per text hour that are cut off or garbage
+OFFSET_MS = 250.0  # host clock ahead of baro_time at the start of each hour
+DRIFT_PPM = 30.0  # and gaining on it by this much
+
+def makeTimestamps(rng, hour_ns, rate):
+    # Jittered intervals with GAPS runs of samples taken out
+    interval_ns = 1e9 / rate
+    count = int(3600 * rate) - 1
+    intervals = np.maximum(rng.normal(interval_ns, JITTER_MS * 1e6, count), interval_ns / 10)
+    timestamps = hour_ns + np.cumsum(intervals).astype(np.int64)
+    keep = np.ones(count, bool)
+    for start in rng.choice(np.arange(100, count - 100, GAP_SAMPLES * 2), GAPS, replace=False):
+        keep[start:start + GAP_SAMPLES] = False
+    return timestamps[keep]
+
+def makeValues(rng, fields, timestamps, hour_ns):
+    # Columns of plausible readings, OUT_OF_RANGE of them far out of range
+    n = len(timestamps)
+    columns = {}
+    for name, kind in fields:
+        if name == "baro_time":
+            seconds = (timestamps - hour_ns) / 1e9
+            host_minus_device_ms = OFFSET_MS + DRIFT_PPM * 1e-3 * seconds + rng.normal(0, 0.3, n)
+            columns[name] = (timestamps - (host_minus_device_ms * 1e6).astype(np.int64)) // 1000
+        elif name == "imu_time":
+            columns[name] = np.round((timestamps - hour_ns) / 1e6)
+        elif name == "value":
+            columns[name] = np.round(rng.normal(14.7, 0.002, n), 6)
+        elif name == "speed":
+            columns[name] = np.round(rng.uniform(0.5, 20, n), 2)
+        elif name == "direction":
+            columns[name] = np.round(rng.uniform(0, 359.9, n), 1)
+        elif name.startswith("accel"):
+            columns[name] = np.round(rng.normal(1.0 if name == "accelZ" else 0.0, 0.01, n), 6)
+        else:
+            columns[name] = np.round(rng.normal(0, 0.5, n), 6)
+
+    checked = fields[1][0] if fields[0][0] == "imu_time" else fields[0][0]
+    columns[checked][rng.choice(n, OUT_OF_RANGE, replace=False)] = -9999.0
+    return columns, checked
+
+def writeHour(rng, path, record_format, timestamps, columns, binary):
+    dtype = np.dtype([("timestamp", "<i8")] + [(name, "<f8" if kind == "float" else "<i8") for name, kind in record_format.fields])
+    records = np.empty(len(timestamps), dtype)
+    records["timestamp"] = timestamps
+    for name, column in columns.items():
+        records[name] = column
+
+    with open(path, "wb") as f:
+        if binary:
+            # And a record cut off at the end, like a sampler that was killed
+            f.write(record_format.header + records.tobytes() + records[-1:].tobytes()[:11])
+            return 1
+
+        lines = record_format.render(records.tobytes())[0].split(b"\n")
+        for i in rng.choice(np.arange(1, len(lines) - 1), MALFORMED, replace=False):
+            lines[i] = lines[i][:len(lines[i]) // 2] + b"\n" + lines[i] if i % 2 else b"\x00\x00\x00\x00\n" + lines[i]
+        f.write(b"\n".join(lines))
+        return MALFORMED
+
+def writeDay(data_loc, hostname, hours, seed):
+    # Returns {sensor: [(hour, path, expected), ...]}
+    rng = np.random.default_rng(seed)
+    day = datetime.datetime(2026, 3, 1, tzinfo=datetime.UTC)
+    written = {}
+    for sensor, (fields, rate, binary) in SENSORS.items():
+        os.makedirs(os.path.join(data_loc, sensor))
+        record_format = ParosRecordFormat(hostname, {"id": sensor}, fields)
+        written[sensor] = []
+        for h in range(hours):
+            hour = (day + datetime.timedelta(hours=h)).strftime('%Y-%m-%d-%H')
+            hour_ns = int((day + datetime.timedelta(hours=h)).timestamp()) * 1000000000
+            timestamps = makeTimestamps(rng, hour_ns, rate)
+            columns,checked = makeValues(rng, fields, timestamps, hour_ns)
+            path = os.path.join(data_loc, sensor, hour)
+            rejected = writeHour(rng, path, record_format, timestamps, columns, binary)
+            written[sensor].append((hour, path, {
+                "samples": len(timestamps),
+                "rejected_lines": rejected,
+                "interval_ms": 1e3 / rate,
+                "checked": checked,
+                "clock": "baro_time" in columns,
+            }))
+    return written
+
+def check(sensor, hour, results, expected):
+    # Problems with one hour's results, an empty list if there are none
+    problems = []
+    def differs(name, want, tolerance):
+        got = results.get(name, float("nan"))
+        if not abs(got - want) <= tolerance:
+            problems.append(f"{sensor} {hour} {name} {got:.6g}, expected {want:.6g}")
+
+    interval_ms = expected["interval_ms"]
+    differs("samples", expected["samples"], 0)
+    differs("rejected_lines", expected["rejected_lines"], 0)
+    differs("gaps", GAPS, 0)
+    # Each gap is GAP_SAMPLES + 1 jittered intervals long
+    differs("gap_seconds", GAPS * GAP_SAMPLES * interval_ms / 1e3, 5 * JITTER_MS / 1e3 * (GAPS * (GAP_SAMPLES + 1)) ** 0.5)
+    differs("interval_ms", interval_ms, 0.1)
+    differs("jitter_ms", JITTER_MS, JITTER_MS * 0.1)
+    differs(f"{expected['checked']}_out_of_range", OUT_OF_RANGE, 0)
+    differs(f"{expected['checked']}_outliers", OUT_OF_RANGE, 0)
+    differs("backwards", 0, 0)
+    if expected["clock"]:
+        differs("baro_time_drift_ppm", DRIFT_PPM, 0.5)
+        differs("baro_time_offset_ms", OFFSET_MS + DRIFT_PPM * 1e-3 * 1800, 1.0)
+    return problems
+
+def regexBaseline(paths):
+    # Lines/sec of pulling every field out of the text files one line at a time
+    field_re = re.compile(rb'([^,= ]+)=("[^"]*"|[^,\s]+)')
+    lines = 0
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                parts = line.rsplit(b" ", 1)
+                try:
+                    int(parts[1])
+                    [float(value) for key, value in field_re.findall(parts[0].split(b" ", 1)[1]) if not value.startswith(b'"')]
+                    lines += 1
+                except (IndexError, ValueError):
+                    pass
+    return lines / (time.perf_counter() - start)
+
+def runQC(qc, written):
+    results = {}
+    for sensor, hours in written.items():
+        for hour, path, expected in hours:
+            results[(sensor, hour)] = qc.checkHour(path, hour)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", help="Hours of data for every sensor", type=int, default=24)
+    parser.add_argument("--seed", help="Random seed", type=int, default=1)
+    parser.add_argument("--keep", help="Keep the generated data here instead of a temporary directory")
+    args = parser.parse_args()
+
+    data_loc = args.keep or tempfile.mkdtemp()
+    hostname = socket.gethostname()
+    print(f"Writing {args.hours} hours of {len(SENSORS)} sensors to {data_loc}")
+    written = writeDay(data_loc, hostname, args.hours, args.seed)
+
+    qc = HourQC(f"{hostname}_qc")
+    start = time.perf_counter()
+    results = runQC(qc, written)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    runQC(qc, {sensor: hours[:1] for sensor, hours in written.items()})
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    problems = []
+    for sensor, hours in written.items():
+        for hour, path, expected in hours:
+            problems += check(sensor, hour, results[(sensor, hour)], expected)
+            # Every summary has to make a line the processor can upload
+            if not qc.summaryLine(sensor, results[(sensor, hour)], 0).startswith(f"{hostname}_qc,id={sensor} ".encode()):
+                problems.append(f"{sensor} {hour} has no summary line")
+
+    lines = sum(r["samples"] + r["rejected_lines"] for r in results.values())
+    size = sum(os.path.getsize(path) for hours in written.values() for hour, path, expected in hours)
+    text_paths = [path for sensor, hours in written.items() if not SENSORS[sensor][2] for hour, path, expected in hours[:1]]
+    print(
+        f"QC of {len(results)} hour files, {lines} lines in {size / 1e6:.0f} MB: {seconds:.2f} s, "
+        f"{lines / seconds:.0f} lines/sec, {size / 1e6 / seconds:.0f} MB/sec, {peak / 1e6:.0f} MB peak"
+    )
+    print(f"One line at a time with a regex: {regexBaseline(text_paths):.0f} lines/sec")
+
+    for sensor, hours in written.items():
+        first = results[(sensor, hours[0][0])]
+        print(
+            f"  {sensor:6s} {first['rate_hz']:7.2f} Hz  jitter {first['jitter_ms']:.2f} ms  gaps {first['gaps']:.0f} "
+            f"({first['gap_seconds']:.2f} s)  rejected {first['rejected_lines']:.0f}  coverage {first['coverage']:.4f}"
+            + (f"  drift {first['baro_time_drift_ppm']:.2f} ppm" if "baro_time_drift_ppm" in first else "")
+        )
+
+    if not args.keep:
+        shutil.rmtree(data_loc)
+
+    if problems:
+        print(f"{len(problems)} problems:")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("Every injected gap, out of range value, malformed line and the clock drift were found")
+
+if __name__ == "__main__":
+    main()
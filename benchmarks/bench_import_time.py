@@ -0,0 +1,107 @@
+"""Import time of each entry point, checked against a startup budget.
+
+Every sampler restart and every processor restart pays for its imports
+before the first sample is read or the first batch is sent. Each entry
+point is imported in a fresh interpreter with `python -X importtime`, the
+fastest of --repeat runs counts, and the heaviest imports are listed. Exits
+with an error if an entry point goes over its budget or loads a module it
+must not, such as the HTTP client stack in a sampler.
+
+Budgets are for a desktop-class machine, use --scale on slower hardware
+like the Pi. Entry points whose hardware libraries are not installed (RPi.GPIO
+for MPU9250) are skipped.
+
+Run from the repository root: python benchmarks/bench_import_time.py
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SENSORS_DIR = os.path.join(ROOT, "paros_sensors")
+
+# Nothing that samples needs to talk HTTP or do array math
+SAMPLER_FORBIDDEN = ("influxdb_client", "urllib3", "numpy")
+
+# name -> (directory it runs from, budget in ms, modules it must not load)
+ENTRY_POINTS = {
+    "Paros_600016BIS": (SENSORS_DIR, 80, SAMPLER_FORBIDDEN),
+    "Young_86000": (SENSORS_DIR, 80, SAMPLER_FORBIDDEN),
+    "MPU9250": (SENSORS_DIR, 80, SAMPLER_FORBIDDEN),
+    "ParosSamplerHost": (SENSORS_DIR, 120, SAMPLER_FORBIDDEN),
+    "processor": (ROOT, 200, ("influxdb_client", "numpy")),
+}
+
+def importOnce(name, run_dir):
+    # Returns (import ms, {direct import: cumulative ms}, loaded modules), or None
+    # if the entry point's own dependencies are missing
+    code = f"import sys, json; import {name}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=run_dir,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        if "ModuleNotFoundError" in result.stderr:
+            return None
+        raise RuntimeError(f"Importing {name} failed:\n{result.stderr}")
+
+    # Lines come children first, each indented by its depth. The entry
+    # point's own imports are the ones since the previous top-level import
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        entries.append((module.strip(), depth, int(cumulative_us) / 1000))
+
+    end = next(i for i, (module, depth, ms) in enumerate(entries) if module == name and depth == 0)
+    start = end
+    while start > 0 and entries[start - 1][1] > 0:
+        start -= 1
+    children = {module: ms for module, depth, ms in entries[start:end] if depth == 1}
+
+    return entries[end][2], children, json.loads(result.stdout)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", help="Runs per entry point, the fastest counts", type=int, default=5)
+    parser.add_argument("--scale", help="Multiply the budgets for slower hardware", type=float, default=1.0)
+    parser.add_argument("--top", help="Heaviest imports listed per entry point", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for name, (run_dir, budget_ms, forbidden) in ENTRY_POINTS.items():
+        runs = [importOnce(name, run_dir) for i in range(args.repeat)]
+        if runs[0] is None:
+            print(f"{name:17s} skipped, missing dependencies")
+            continue
+
+        import_ms, children, modules = min(runs, key=lambda run: run[0])
+        budget_ms *= args.scale
+        loaded = sorted({module.split(".")[0] for module in modules} & set(forbidden))
+        over = import_ms > budget_ms
+
+        status = "OK"
+        if over or loaded:
+            failed = True
+            status = "OVER BUDGET" if over else "FORBIDDEN IMPORTS"
+        print(f"{name:17s} {import_ms:7.1f} ms   budget {budget_ms:7.1f} ms   {len(modules):4d} modules   {status}")
+        if loaded:
+            print(f"                  loads {', '.join(loaded)}")
+
+        heaviest = sorted(((ms, module) for module, ms in children.items()), reverse=True)
+        for ms, module in heaviest[:args.top]:
+            print(f"                  {ms:7.1f} ms  {module}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Samples/sec of influxdb_client.Point against LineProtocolTemplate.
+
+Run from the repository root: python benchmarks/bench_line_protocol.py
+"""
+import os
+import sys
+import time
+import math
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+from LineProtocolTemplate import LineProtocolTemplate
+
+# Field layouts and representative values for each driver's samplingLoop
+DRIVERS = {
+    "Paros_600016BIS": (
+        (("value", float), ("baro_time", str)),
+        lambda: (random.uniform(14.0, 15.0), "2024-03-01T12:00:00.123456")
+    ),
+    "Young_86000": (
+        (("speed", float), ("direction", float), ("u", float), ("v", float)),
+        lambda: (round(random.uniform(0, 20), 2), round(random.uniform(0, 360), 1), random.uniform(-20, 20), random.uniform(-20, 20))
+    ),
+    "MPU9250": (
+        (("imu_time", float), ("accelX", float), ("accelY", float), ("accelZ", float), ("gyroX", float), ("gyroY", float), ("gyroZ", float)),
+        lambda: (float(random.randint(0, 10**9)),) + tuple(round(random.uniform(-8, 8), 6) for i in range(6))
+    ),
+}
+
+def pointSerialize(influxdb_client, box_id, sensor_id, fields, values, timestamp_ns):
+    # What every driver did per sample before the template
+    p = influxdb_client.Point(box_id)
+    for (name, field_type), value in zip(fields, values):
+        p.field(name, value)
+    p.time(timestamp_ns)
+    p.tag("id", sensor_id)
+    return p.to_line_protocol()
+
+def rate(fn, samples):
+    start = time.perf_counter()
+    for values, timestamp_ns in samples:
+        fn(values, timestamp_ns)
+    return len(samples) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", help="Samples per driver", type=int, default=100000)
+    args = parser.parse_args()
+
+    try:
+        import influxdb_client
+    except ImportError:
+        influxdb_client = None
+        print("influxdb_client not installed, only timing the template")
+
+    box_id = "paros1"
+    sensor_id = "142166"
+
+    for driver, (fields, make_values) in DRIVERS.items():
+        samples = [(make_values(), time.time_ns() + i) for i in range(args.samples)]
+        # edge cases Point has to agree with us on
+        samples[0] = (tuple(math.nan if t is float else "a\"b\\c" for n, t in fields), samples[0][1])
+        samples[1] = (tuple(1.0 if t is float else "" for n, t in fields), samples[1][1])
+
+        template = LineProtocolTemplate(box_id, {"id": sensor_id}, fields)
+        after = rate(template.serialize, samples)
+
+        if influxdb_client is None:
+            print(f"{driver:16s} template {after:10.0f} samples/sec")
+            continue
+
+        point_fn = lambda values, timestamp_ns: pointSerialize(influxdb_client, box_id, sensor_id, fields, values, timestamp_ns)
+        for values, timestamp_ns in samples:
+            if point_fn(values, timestamp_ns) != template.serialize(values, timestamp_ns):
+                print(f"{driver}: output differs from Point for {values}")
+                sys.exit(1)
+
+        before = rate(point_fn, samples)
+        print(f"{driver:16s} Point {before:10.0f} samples/sec   template {after:10.0f} samples/sec   ({after / before:.1f}x)")
+
+if __name__ == "__main__":
+    main()
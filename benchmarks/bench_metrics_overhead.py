@@ -0,0 +1,132 @@
+"""Cost of the Prometheus textfile metrics on the sampler hot path.
+
+The counters are updated whether metrics are written or not, so the hot path
+cost is measured directly:
+
+- per sample: the two counter updates in ParosSensor.addSample()
+- per read: ParosSerialSensor.nextFrames() timing the oldest frame into the
+  read latency histogram
+- per write: rendering and replacing one sampler's textfile, on the metrics
+  thread every ParosMetrics.WRITE_PERIOD seconds
+
+Then Young_86000 runs against the simulator from sensor_sim.py with metrics
+off and on, writing every --write-period seconds, and reports CPU per sample
+for both.
+
+Run from the repository root: python benchmarks/bench_metrics_overhead.py
+"""
+import os
+import sys
+import time
+import timeit
+import logging
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+from sensor_sim import YoungSimulator, PtySerial, installStandIns
+
+installStandIns()
+from Young_86000 import Young_86000
+from ParosMetrics import ParosMetrics
+from ParosHistogram import ParosHistogram
+from ParosSerialSensor import ParosSerialSensor
+
+def hotPathCosts(number):
+    # ns per call of what the hot paths gained, less the cost of calling an
+    # empty function
+    class Counters:
+        sample_count = 0
+        last_sample_ns = 0
+    counters = Counters()
+    histogram = ParosHistogram(ParosSerialSensor.READ_LATENCY_BUCKETS)
+    frames = [(b"", time.time_ns())]
+
+    def perSample():
+        counters.sample_count += 1
+        counters.last_sample_ns = 1700000000000000000
+
+    def perRead():
+        histogram.observe((time.time_ns() - frames[0][1]) / 1e9)
+
+    def empty():
+        pass
+
+    def cost(func):
+        return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+    call = cost(empty)
+    return {
+        "per sample (counters)": cost(perSample) - call,
+        "per read (latency histogram)": cost(perRead) - call,
+    }
+
+def writeCost(sensor, number):
+    # ms per textfile write of an instrumented sensor
+    sensor.metrics = ParosMetrics("bench.prom", tempfile.mkdtemp())
+    sensor.metrics.addCollector(sensor._collectMetrics)
+    seconds = min(timeit.repeat(sensor.metrics.write, number=number, repeat=3)) / number
+    with open(sensor.metrics.path) as f:
+        size = len(f.read())
+    return seconds * 1000, size
+
+def runYoung(rate, seconds, metrics_loc):
+    # CPU seconds per sample
+    if metrics_loc:
+        os.environ["PAROS_METRICS_LOCATION"] = metrics_loc
+    else:
+        os.environ.pop("PAROS_METRICS_LOCATION", None)
+
+    sim = YoungSimulator(rate, "00001")
+    PtySerial.simulators[sim.device] = sim
+    sim.start()
+    sensor = Young_86000("bench", "00001", tempfile.mkdtemp(), sim.device)
+
+    sampler = threading.Thread(target=sensor.samplingLoop, name="young")
+    cpu_start = time.process_time()
+    sampler.start()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    samples = sensor.sample_count
+
+    sensor.requestStop()
+    sampler.join()
+    sensor._getSensorPort().close()
+    sim.stop()
+    del PtySerial.simulators[sim.device]
+    return cpu / max(1, samples), samples
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", help="Young frames/sec for the end to end run", type=float, default=4096)
+    parser.add_argument("--seconds", help="Seconds per end to end run", type=float, default=10)
+    parser.add_argument("--write-period", help="ParosMetrics.WRITE_PERIOD for the end to end run", type=float, default=1)
+    parser.add_argument("--number", help="Calls per micro benchmark", type=int, default=200000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("Hot path")
+    for name, ns in hotPathCosts(args.number).items():
+        print(f"  {name:30s} {ns:7.1f} ns")
+
+    # The textfile of a sampler, its size does not depend on the counts
+    sim = YoungSimulator(YoungSimulator.HARDWARE_RATE, "00001")
+    sim.start()
+    sensor = Young_86000("bench", "00001", tempfile.mkdtemp(), sim.device)
+    write_ms, size = writeCost(sensor, 1000)
+    sensor.closeSamples()
+    sensor._getSensorPort().close()
+    sim.stop()
+    print(f"  {'textfile write':30s} {write_ms:7.3f} ms  ({size} bytes, every {ParosMetrics.WRITE_PERIOD} s)")
+
+    print(f"Young_86000 at {args.rate:.0f}/s for {args.seconds:.0f} s")
+    ParosMetrics.WRITE_PERIOD = args.write_period
+    off, off_samples = runYoung(args.rate, args.seconds, None)
+    on, on_samples = runYoung(args.rate, args.seconds, tempfile.mkdtemp())
+    print(f"  metrics off  {off * 1e6:6.2f} us/sample  ({off_samples} samples)")
+    print(f"  metrics on   {on * 1e6:6.2f} us/sample  ({on_samples} samples, textfile every {args.write_period} s)")
+
+if __name__ == "__main__":
+    main()
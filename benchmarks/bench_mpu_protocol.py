@@ -0,0 +1,194 @@
+"""MPU9250 text lines against the binary records of firmware/MPU9250.ino.
+
+Decoding: the same IMU readings as the firmware sends them in each format,
+parsed the way MPU9250.samplingLoop() does, --chunk frames at a time like
+frames queued on the port. Both have to give the same samples, to the six
+decimals the text lines carry. Also reports the bytes each sample takes on
+the wire and the most samples/sec --baud carries.
+
+Round trip: the MPU9250 driver in binary mode against MPUSimulator on a pty,
+with every --corrupt-every'th frame corrupted or cut off. Every other frame
+has to arrive once and in order, and each bad one has to be counted as a
+parse failure without losing the frames around it. Exits with an error if
+either check fails.
+
+Run from the repository root: python benchmarks/bench_mpu_protocol.py
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import binascii
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+from sensor_sim import MPUSimulator, PtySerial, installStandIns, cobsEncode
+
+GPIO = installStandIns()
+from MPU9250 import MPU9250
+from MPUFrameDecoder import MPUFrameDecoder
+
+MODE_PIN = 36
+
+def makeReadings(count):
+    # Raw counts that wander like a box being bumped now and then
+    counts = [0, 0, 4096, 0, 0, 0]
+    readings = []
+    for i in range(count):
+        counts = [max(-32768, min(32767, c + random.randint(-40, 40))) for c in counts]
+        readings.append((1000 + i * 2, *counts))
+    return readings
+
+def textLine(reading):
+    # printIMUData(), calcAccel() and calcGyro() are float divisions
+    imu_time, ax, ay, az, gx, gy, gz = reading
+    accel = MPUFrameDecoder.ACCEL_SENS
+    gyro = MPUFrameDecoder.GYRO_SENS
+    return f"{imu_time},{ax / accel:f},{ay / accel:f},{az / accel:f},{gx / gyro:f},{gy / gyro:f},{gz / gyro:f}\r\n".encode()
+
+def binaryFrame(reading):
+    record = MPUFrameDecoder.RECORD.pack(*reading)
+    return cobsEncode(record + binascii.crc_hqx(record, MPUFrameDecoder.CRC_INIT).to_bytes(2, "big")) + MPUFrameDecoder.FRAME_END
+
+def decodeText(chunks):
+    samples = []
+    for chunk in chunks:
+        for frame, timestamp_ns in chunk:
+            in_parts = frame.strip().split(b",")
+            if len(in_parts) != 7:
+                continue
+            samples.append([float(part) for part in in_parts])
+    return samples
+
+def decodeBinary(chunks):
+    decoder = MPUFrameDecoder()
+    samples = []
+    for chunk in chunks:
+        chunk_samples, failures = decoder.decodeFrames(chunk)
+        samples += [sample for sample, timestamp_ns in chunk_samples]
+    return samples
+
+def chunked(data, terminator, chunk):
+    frames = [(frame, 0) for frame in data.split(terminator)[:-1]]
+    return [frames[i:i + chunk] for i in range(0, len(frames), chunk)]
+
+def checkDecoding(args):
+    readings = makeReadings(args.frames)
+    text = b"".join(textLine(reading) for reading in readings)
+    binary = b"".join(binaryFrame(reading) for reading in readings)
+    text_chunks = chunked(text, MPU9250.frameTerminator, args.chunk)
+    binary_chunks = chunked(binary, MPUFrameDecoder.FRAME_END, args.chunk)
+
+    start = time.perf_counter()
+    text_samples = decodeText(text_chunks)
+    text_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    binary_samples = decodeBinary(binary_chunks)
+    binary_time = time.perf_counter() - start
+
+    same = len(text_samples) == len(binary_samples) == len(readings) and all(
+        abs(a - b) <= 1e-6 for text_sample, binary_sample in zip(text_samples, binary_samples)
+        for a, b in zip(text_sample, binary_sample)
+    )
+    if not same:
+        print(f"Text gave {len(text_samples)} samples and binary {len(binary_samples)}, not the same readings")
+        return False
+
+    print(f"{len(readings)} readings, same samples from both formats")
+    for name, data, seconds in (("text", text, text_time), ("binary", binary, binary_time)):
+        per_sample = len(data) / len(readings)
+        print(
+            f"  {name:6s} {len(readings) / seconds:10.0f} frames/sec  {seconds / len(readings) * 1e6:5.2f} us/frame  "
+            f"{per_sample:5.1f} bytes/sample  {args.baud / 10 / per_sample:5.0f} samples/sec at {args.baud:.0f} baud"
+        )
+    return True
+
+def checkRoundTrip(args):
+    os.environ["PAROS_IMU_FORMAT"] = "binary"
+    sim = MPUSimulator(args.rate, GPIO, MODE_PIN, args.corrupt_every)
+    PtySerial.simulators[sim.device] = sim
+    sim.start()
+    sensor = MPU9250("bench", "mpu", tempfile.mkdtemp(), sim.device, MODE_PIN)
+
+    seqs = []
+    add_sample = sensor.addSample
+    def recordingAddSample(values, timestamp_ns=None):
+        seqs.append(int(values[0]))
+        add_sample(values, timestamp_ns)
+    sensor.addSample = recordingAddSample
+
+    exit_code = []
+    def sample():
+        try:
+            sensor.samplingLoop()
+        except SystemExit as e:
+            exit_code.append(e.code)
+    sampler = threading.Thread(target=sample, name="MPU9250")
+    sampler.start()
+    time.sleep(args.seconds)
+    sim.pause()
+
+    # Let the driver catch up with what was sent
+    seen = -1
+    while sampler.is_alive() and len(seqs) != seen:
+        seen = len(seqs)
+        time.sleep(0.5)
+
+    gave_up = not sampler.is_alive()
+    if not gave_up:
+        sensor.requestStop()
+        sampler.join()
+    sensor._getSensorPort().close()
+    sent_ns = sim.stop()
+    del PtySerial.simulators[sim.device]
+
+    if not seqs:
+        print("Round trip: no samples")
+        return False
+
+    # Frames before the first sample went to the driver's startup checks
+    first_seq = seqs[0]
+    expected = [seq for seq in range(first_seq, len(sent_ns)) if sent_ns[seq] >= 0 and not sim.corrupted(seq)]
+    corrupted = sum(1 for seq in range(first_seq, len(sent_ns)) if sim.corrupted(seq))
+    overrun = sum(1 for seq in range(first_seq, len(sent_ns)) if sent_ns[seq] < 0)
+
+    print(
+        f"Round trip at {args.rate:.0f}/s for {args.seconds:.0f} s: {len(seqs)} samples, "
+        f"{corrupted} frames corrupted or cut off, {sensor.parse_failures} parse failures, {overrun} overrun"
+    )
+    if gave_up:
+        print(f"  driver exited with {exit_code[0] if exit_code else '?'}")
+        return False
+    if seqs != expected:
+        missing = len(set(expected) - set(seqs))
+        print(f"  expected {len(expected)} samples in order, {missing} missing")
+        return False
+    if sensor.parse_failures != corrupted or overrun:
+        print("  every bad frame should be one parse failure, with no overrun")
+        return False
+    print("  every good frame arrived once, in order")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", help="Readings to decode", type=int, default=200000)
+    parser.add_argument("--chunk", help="Frames handed to the decoder at a time", type=int, default=32)
+    parser.add_argument("--baud", help="Serial line speed for the samples/sec column", type=float, default=115200)
+    parser.add_argument("--rate", help="Round trip: frames/sec from the simulator", type=float, default=2000)
+    parser.add_argument("--seconds", help="Round trip: seconds of streaming", type=float, default=5)
+    parser.add_argument("--corrupt-every", help="Round trip: corrupt or cut off every so many frames, fewer than 10 in all", type=int, default=1500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    decoded = checkDecoding(args)
+    round_trip = checkRoundTrip(args)
+    if not decoded or not round_trip:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Barometer timestamps/sec of strptime against ParosTimeParser, plus a fuzz check.
+
+The fuzz check feeds both paths valid timestamps, timestamps in odd but
+accepted layouts and corrupted serial data, and fails if they ever disagree
+on the output or on whether the timestamp is rejected.
+
+Run from the repository root: python benchmarks/bench_paros_time.py
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+from ParosTimeParser import ParosTimeParser
+
+def strptimeIso(time_str):
+    # What Paros_600016BIS did per sample before the parser
+    in_time = datetime.datetime.strptime(time_str, "%m/%d/%y %H:%M:%S.%f")
+    timeStr = in_time.isoformat()
+    if in_time.microsecond == 0:
+        timeStr += ".000000"
+    return timeStr
+
+def barometerTimes(count, rate_hz):
+    # A barometer sampling at rate_hz from a random start
+    start = datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=random.randint(0, 10**8))
+    step = datetime.timedelta(microseconds=1000000 // rate_hz)
+    return [(start + i * step).strftime("%m/%d/%y %H:%M:%S.%f") for i in range(count)]
+
+def fuzzTimes(count):
+    times = []
+    for i in range(count):
+        time_str = barometerTimes(1, 20)[0]
+        choice = random.randrange(8)
+        if choice == 0:
+            # corrupted byte
+            pos = random.randrange(len(time_str))
+            time_str = time_str[:pos] + random.choice("0123456789/:. x\x00²") + time_str[pos + 1:]
+        elif choice == 1:
+            # truncated line
+            time_str = time_str[:random.randrange(len(time_str))]
+        elif choice == 2:
+            # short fraction
+            time_str = time_str[:random.randrange(18, len(time_str))]
+        elif choice == 3:
+            # out of range fields
+            time_str = f"{random.randint(0, 13):02d}/{random.randint(0, 32):02d}/{random.randint(0, 99):02d} " \
+                f"{random.randint(0, 25):02d}:{random.randint(0, 61):02d}:{random.randint(0, 61):02d}.{random.randint(0, 999999):06d}"
+        elif choice == 4:
+            # single digit fields and extra whitespace that strptime accepts
+            time_str = time_str.replace("/0", "/").replace(" ", "  ")
+        elif choice == 5:
+            # trailing garbage
+            time_str += random.choice(["0", " ", "\r", "x"])
+        times.append(time_str)
+    return times
+
+def outcome(fn, time_str):
+    try:
+        return fn(time_str)
+    except ValueError:
+        return ValueError
+
+def rate(fn, times):
+    start = time.perf_counter()
+    for time_str in times:
+        fn(time_str)
+    return len(times) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", help="Timestamps to time", type=int, default=200000)
+    parser.add_argument("--fuzz", help="Timestamps to fuzz", type=int, default=200000)
+    args = parser.parse_args()
+
+    # Equivalence
+    times = fuzzTimes(args.fuzz) + barometerTimes(args.fuzz // 10, 20) + barometerTimes(args.fuzz // 10, 1)
+    times += ["12/31/68 23:59:59.999999", "01/01/69 00:00:00.000000", "02/29/24 00:00:00.5", "02/29/23 00:00:00.000000"]
+    parser_fn = ParosTimeParser().toIso
+    for time_str in times:
+        expected = outcome(strptimeIso, time_str)
+        actual = outcome(parser_fn, time_str)
+        if expected != actual:
+            print(f"toIso({time_str!r}) gave {actual!r}, strptime gave {expected!r}")
+            sys.exit(1)
+    print(f"{len(times)} timestamps parse the same as strptime")
+
+    # Speed at the barometer's sampling rate
+    times = barometerTimes(args.samples, 20)
+    before = rate(strptimeIso, times)
+    after = rate(ParosTimeParser().toIso, times)
+    print(f"strptime {before:10.0f} timestamps/sec   parser {after:10.0f} timestamps/sec   ({after / before:.1f}x)")
+
+if __name__ == "__main__":
+    main()
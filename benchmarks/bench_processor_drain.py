@@ -0,0 +1,311 @@
+"""Backlog drain of the real processor against a local InfluxDB stand-in.
+
+Writes --hours completed hours of data for --sensors sensors, points every
+pointer at the oldest hour and runs processor.py as a child process, with
+uploads going to influx_standin.py over HTTP. Reports how long the processor
+took to catch up, lines/sec, pointer checkpoint writes and the processor's
+memory high water mark.
+
+--torn-lines tears a line in every hour file like a power cut does. The
+batches holding them are refused with HTTP 400 as a whole, and only the
+torn lines may be dropped without holding up the rest. --max-body-kib
+refuses larger writes with HTTP 413, and their lines have to arrive in
+smaller writes.
+
+--crashes kills the processor with SIGKILL in the middle of that many
+uploads, half of them after the stand-in stored the batch (the reply was
+lost) and half before. The processor is restarted right away like systemd
+would, and resumes from its last pointer checkpoint or spooled batches.
+
+--live-rate keeps a sampler writing the current hour of every sensor for
+--live-seconds while the backlog drains, and the report says how long it
+took until data from after the processor started showed up. With
+--live-summary (tiered upload) that is the summary lane, and every live
+line has to be counted in the summaries exactly once.
+
+At the end every line has to be in the stand-in exactly once, counting
+points the way InfluxDB does so a resent batch overwrites itself. In serial
+and batched mode each sensor's lines also have to arrive in order. In
+concurrent mode a sensor's in-flight uploads may land in any order, only
+the pointer moves in order. Exits with an error if any check fails.
+
+Run from the repository root: python benchmarks/bench_processor_drain.py --crashes 3
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import datetime
+import argparse
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from influx_standin import InfluxStandIn, parseOutages
+from paros_processor import DirWatcher
+
+def writeBacklog(data_loc, sensors, hours, lines_per_hour, torn=False):
+    # Returns {sensor: [timestamp of every line in order]}. torn cuts a line
+    # in the middle of every hour off and glues the next one onto it, like
+    # an append after a power cut, and neither of them is expected
+    hostname = socket.gethostname()
+    start_hour = datetime.datetime.now(datetime.UTC).replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=hours)
+    expected = {sensor: [] for sensor in sensors}
+    for sensor in sensors:
+        os.makedirs(os.path.join(data_loc, sensor), exist_ok=True)
+        for h in range(hours):
+            hour = start_hour + datetime.timedelta(hours=h)
+            hour_ns = int(hour.timestamp()) * 1000000000
+            step_ns = 3600 * 1000000000 // lines_per_hour
+            timestamps = [hour_ns + i * step_ns for i in range(lines_per_hour)]
+            lines = [f"{hostname},id={sensor} value={i % 1000}.5,baro_time=\"x\" {ts}\n" for i, ts in enumerate(timestamps)]
+            if torn:
+                middle = lines_per_hour // 2
+                lines[middle] = lines[middle][:len(lines[middle]) // 2]
+                del timestamps[middle:middle + 2]
+            with open(os.path.join(data_loc, sensor, hour.strftime('%Y-%m-%d-%H')), "w") as f:
+                f.writelines(lines)
+            expected[sensor].extend(timestamps)
+    return expected, start_hour.strftime('%Y-%m-%d-%H')
+
+def writeLive(data_loc, sensors, rate, seconds, expected, stop_event):
+    # Appends a line per sensor every 1/rate seconds to the current hour
+    # file, like a sampler with a one line buffer
+    hostname = socket.gethostname()
+    start = time.monotonic()
+    i = 0
+    while not stop_event.is_set() and time.monotonic() - start < seconds:
+        now = datetime.datetime.now(datetime.UTC)
+        ts = time.time_ns()
+        for sensor in sensors:
+            with open(os.path.join(data_loc, sensor, now.strftime('%Y-%m-%d-%H')), "a") as f:
+                f.write(f"{hostname},id={sensor} value={i % 1000}.25,baro_time=\"x\" {ts}\n")
+            expected[sensor].append(ts)
+        i += 1
+        time.sleep(max(0, start + i / rate - time.monotonic()))
+
+def summaryCounts(standin, measurement, first_line, counts):
+    # Adds up the count field of the summary points in standin.lines from
+    # first_line on, a resent point replaces the earlier one. Returns the
+    # next line to look at
+    lines = standin.lines
+    end = len(lines)
+    for line in lines[first_line:end]:
+        if line.startswith(measurement):
+            key = (line.split(b" ", 1)[0], line.rsplit(b" ", 1)[1])
+            counts[key] = int(line.split(b"count=", 1)[1].split(b",", 1)[0])
+    return end
+
+def readHighWater(pid):
+    # VmHWM of a process in kB, 0 once it is gone
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return 0
+
+def checkDelivery(standin, expected, ordered):
+    # Returns a list of problems
+    problems = []
+    hostname = socket.gethostname()
+    full_rate_points = standin.measurement_points.get(hostname.encode(), 0)
+    for sensor, timestamps in expected.items():
+        series = f"{hostname},id={sensor}".encode()
+        counts = [standin.points.get((series, str(ts).encode()), 0) for ts in timestamps]
+        missing = counts.count(0)
+        if missing:
+            problems.append(f"sensor {sensor}: {missing} lines never arrived")
+
+    expected_points = sum(len(timestamps) for timestamps in expected.values())
+    if full_rate_points != expected_points:
+        problems.append(f"{full_rate_points} points stored, expected {expected_points}")
+
+    if ordered:
+        # First arrival of each line has to follow the file order
+        last = {}
+        seen = set()
+        out_of_order = 0
+        for line in standin.lines:
+            if not line.startswith(f"{hostname},".encode()):
+                continue
+            key = (line.split(b" ", 1)[0], line.rsplit(b" ", 1)[1])
+            if key in seen:
+                continue
+            seen.add(key)
+            ts = int(key[1])
+            if ts < last.get(key[0], 0):
+                out_of_order += 1
+            last[key[0]] = ts
+        if out_of_order:
+            problems.append(f"{out_of_order} lines arrived before a line that comes earlier in their file")
+
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", help="PAROS_PROCESSOR_MODE", choices=("serial", "concurrent", "batched"), default="serial")
+    parser.add_argument("--sensors", help="Number of sensors", type=int, default=3)
+    parser.add_argument("--hours", help="Hours of backlog", type=int, default=3)
+    parser.add_argument("--rate", help="Samples/sec each sensor wrote", type=float, default=10)
+    parser.add_argument("--latency", help="Seconds added to every write", type=float, default=0.05)
+    parser.add_argument("--bandwidth-mbps", help="Uplink speed, 0 for unlimited", type=float, default=0)
+    parser.add_argument("--error-rate", help="Fraction of writes failed with HTTP 500", type=float, default=0)
+    parser.add_argument("--outages", help="start:end seconds of InfluxDB outage, comma separated", type=str, default="")
+    parser.add_argument("--crashes", help="Uploads to kill the processor in the middle of", type=int, default=0)
+    parser.add_argument("--checkpoint-interval", help="PAROS_POINTER_CHECKPOINT_INTERVAL", type=float, default=10)
+    parser.add_argument("--no-spool", help="Run without PAROS_BUFFER_LOCATION", action="store_true")
+    parser.add_argument("--live-rate", help="Samples/sec written to the current hour of each sensor meanwhile", type=float, default=0)
+    parser.add_argument("--live-seconds", help="Seconds the live samples are written for", type=float, default=30)
+    parser.add_argument("--live-summary", help="Tiered upload (PAROS_LIVE_SUMMARY=1)", action="store_true")
+    parser.add_argument("--backfill-mbps", help="PAROS_BACKFILL_MAX_RATE with --live-summary, 0 for unlimited", type=float, default=0)
+    parser.add_argument("--torn-lines", help="Tear a line in every hour file, InfluxDB refuses the batch it is in", action="store_true")
+    parser.add_argument("--max-body-kib", help="Writes InfluxDB refuses as too large, 0 for no limit", type=float, default=0)
+    parser.add_argument("--timeout", help="Give up after this many seconds", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    data_loc = os.path.join(work_dir, "data")
+    sensors = [str(100000 + i) for i in range(args.sensors)]
+    expected, first_hour = writeBacklog(data_loc, sensors, args.hours, int(args.rate * 3600), args.torn_lines)
+    total_lines = sum(len(timestamps) for timestamps in expected.values())
+
+    os.makedirs(os.path.join(work_dir, "sensor_configs"))
+    with open(os.path.join(work_dir, "sensor_configs", f"{socket.gethostname()}.json"), "w") as f:
+        json.dump({"sensors": [{"driver": "", "sensor_id": sensor, "args": ""} for sensor in sensors]}, f)
+    with open(os.path.join(work_dir, "pointer.json"), "w") as f:
+        json.dump({"pointers": {sensor: [first_hour, 0] for sensor in sensors}}, f)
+
+    # Each upload has a one in four chance of a crash until --crashes were
+    # injected, once per processor process
+    rng = random.Random(args.seed)
+    crash_lock = threading.Lock()
+    crash_state = {"proc": None, "killed": None, "crashes": 0, "live_seen": None}
+    def crashingWrite(lines):
+        # Also notes when the first line from after the start arrived
+        if crash_state["live_seen"] is None and any(int(line.rsplit(b" ", 1)[1]) >= start_ns for line in lines):
+            crash_state["live_seen"] = time.monotonic()
+
+        with crash_lock:
+            proc = crash_state["proc"]
+            if crash_state["crashes"] >= args.crashes or proc is crash_state["killed"] or rng.random() > 0.25:
+                return True
+            crash_state["killed"] = proc
+            crash_state["crashes"] += 1
+            os.kill(proc.pid, signal.SIGKILL)
+            return crash_state["crashes"] % 2 == 0
+
+    standin = InfluxStandIn(
+        latency=args.latency,
+        bandwidth=args.bandwidth_mbps * 1000000 / 8,
+        error_rate=args.error_rate,
+        outages=parseOutages(args.outages),
+        on_write=crashingWrite,
+        seed=args.seed,
+        max_body_bytes=int(args.max_body_kib * 1024)
+    )
+
+    env = dict(
+        os.environ,
+        PAROS_DATA_LOCATION=data_loc,
+        PAROS_INFLUXDB_HOST=standin.url,
+        PAROS_INFLUXDB_ORG="org",
+        PAROS_INFLUXDB_BUCKET="bucket",
+        PAROS_INFLUXDB_TOKEN="token",
+        PAROS_BUFFER_LOCATION="" if args.no_spool else os.path.join(work_dir, "buffer"),
+        PAROS_BACKUP_LOCATION="",
+        PAROS_PROCESSOR_MODE=args.mode,
+        PAROS_POINTER_CHECKPOINT_INTERVAL=str(args.checkpoint_interval),
+        PAROS_LIVE_SUMMARY="1" if args.live_summary else "0",
+        PAROS_BACKFILL_MAX_RATE=str(args.backfill_mbps * 1000000 / 8)
+    )
+
+    # Pointer checkpoints are renamed over pointer.json
+    watcher = DirWatcher()
+    watcher.watch("work", work_dir)
+    pointer_writes = 0
+
+    log = open(os.path.join(work_dir, "processor.log"), "w")
+    def startProcessor():
+        return subprocess.Popen([sys.executable, os.path.join(ROOT, "processor.py")], cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    live_stop = threading.Event()
+    live_writer = threading.Thread(target=writeLive, args=(data_loc, sensors, args.live_rate, args.live_seconds, expected, live_stop))
+
+    standin.start()
+    start = time.monotonic()
+    start_ns = time.time_ns()
+    crash_state["proc"] = startProcessor()
+    if args.live_rate:
+        live_writer.start()
+    restarts = 0
+    high_water = 0
+    def supervise():
+        # Restarts the processor like systemd would, between checks
+        nonlocal restarts, high_water, pointer_writes
+        high_water = max(high_water, readHighWater(crash_state["proc"].pid))
+        if crash_state["proc"].poll() is not None:
+            restarts += 1
+            with crash_lock:
+                crash_state["proc"] = startProcessor()
+        for created in watcher.wait(0.05).values():
+            pointer_writes += created.count("pointer.json")
+
+    full_rate = socket.gethostname().encode()
+    while time.monotonic() - start < args.timeout:
+        if not live_writer.is_alive() and standin.measurement_points.get(full_rate, 0) >= sum(len(timestamps) for timestamps in expected.values()):
+            break
+        supervise()
+    elapsed = time.monotonic() - start
+
+    # The summary of the last live period goes out once it is
+    # HOUR_CLOSE_DELAY old, wait for it
+    live_lines = sum(len(timestamps) for timestamps in expected.values()) - total_lines
+    summary_counts = {}
+    summary_line = 0
+    summary = f"{socket.gethostname()}_summary,".encode()
+    if args.live_summary:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            summary_line = summaryCounts(standin, summary, summary_line, summary_counts)
+            if sum(summary_counts.values()) >= live_lines:
+                break
+            supervise()
+
+    # Stop it like systemd, which checkpoints the pointers
+    crash_state["proc"].send_signal(signal.SIGTERM)
+    crash_state["proc"].wait()
+    for created in watcher.wait(0.2).values():
+        pointer_writes += created.count("pointer.json")
+    standin.stop()
+
+    resent = len(standin.lines) - len(standin.points)
+    print(f"{args.mode} mode, {args.sensors} sensors x {args.hours} h backlog = {total_lines} lines")
+    print(f"  caught up in     {elapsed:8.2f} s   {len(standin.points) / elapsed:9.0f} lines/sec")
+    print(f"  requests         {standin.requests:8d}   {standin.body_bytes / 1024 / 1024:.1f} MiB sent, {resent} lines resent")
+    print(f"  errors           {standin.errors:8d} HTTP 500, {standin.outage_errors} HTTP 503, {standin.dropped} dropped in crashes")
+    print(f"  refused          {standin.rejected_writes:8d} HTTP 400 ({standin.rejected_lines} bad lines), {standin.too_large} HTTP 413")
+    print(f"  crashes          {crash_state['crashes']:8d}   {restarts} restarts")
+    print(f"  pointer writes   {pointer_writes:8d}")
+    print(f"  memory high water {high_water / 1024:7.1f} MiB")
+    if args.live_rate:
+        live_seen = crash_state["live_seen"]
+        print(f"  live data after  {live_seen - start if live_seen else float('inf'):8.2f} s   {live_lines} live lines, {len(summary_counts)} summary points")
+
+    problems = checkDelivery(standin, expected, args.mode != "concurrent")
+    if args.live_summary and sum(summary_counts.values()) != live_lines:
+        problems.append(f"summaries count {sum(summary_counts.values())} live lines, expected {live_lines}")
+    if problems:
+        for problem in problems:
+            print(f"  FAILED: {problem}")
+        print(f"  processor log: {log.name}")
+        sys.exit(1)
+    print("  every line arrived exactly once" + (", in order" if args.mode != "concurrent" else ""))
+
+if __name__ == "__main__":
+    main()
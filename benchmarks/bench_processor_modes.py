@@ -0,0 +1,103 @@
+"""Backlog drain rate of the serial, concurrent and batched processor modes.
+
+InfluxDB is replaced with a write call that sleeps for a fixed round-trip
+time plus the time the body takes at a given bandwidth, so the numbers
+show how much of each RTT the processor overlaps and how the upload
+size adapts to the link.
+
+Run from the repository root: python benchmarks/bench_processor_modes.py --rtt 0.2
+"""
+import os
+import sys
+import json
+import time
+import socket
+import datetime
+import argparse
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+class SleepingWriter:
+
+    def __init__(self, rtt, bandwidth):
+        self.rtt = rtt
+        self.bandwidth = bandwidth  # bytes/sec, 0 for unlimited
+        self.lines = 0
+        self.lock = threading.Lock()
+
+    def write(self, output_lp, num_lines):
+        time.sleep(self.rtt + (len(output_lp) / self.bandwidth if self.bandwidth else 0))
+        with self.lock:
+            self.lines += num_lines
+
+    def logStats(self):
+        pass
+
+def writeBacklog(data_loc, sensors, hour, lines_per_sensor):
+    hostname = socket.gethostname()
+    for sensor in sensors:
+        os.makedirs(os.path.join(data_loc, sensor), exist_ok=True)
+        timestamp = time.time_ns()
+        with open(os.path.join(data_loc, sensor, hour), "w") as f:
+            for i in range(lines_per_sensor):
+                f.write(f"{hostname},id={sensor} value={i}.5 {timestamp + i}\n")
+
+def runMode(mode, sensors, lines_per_sensor, rtt, bandwidth):
+    # Runs in a child process so every mode starts from a clean processor
+    import processor
+
+    tmp_dir = tempfile.mkdtemp()
+    os.chdir(tmp_dir)
+    os.makedirs("sensor_configs")
+    with open(f"sensor_configs/{socket.gethostname()}.json", "w") as f:
+        json.dump({"sensors": [{"driver": "", "sensor_id": sensor, "args": ""} for sensor in sensors]}, f)
+
+    hour = (datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=1)).strftime('%Y-%m-%d-%H')
+    writeBacklog(os.path.join(tmp_dir, "data"), sensors, hour, lines_per_sensor)
+    with open("pointer.json", "w") as f:
+        json.dump({"pointers": {sensor: [hour, 0] for sensor in sensors}}, f)
+
+    os.environ["PAROS_PROCESSOR_MODE"] = mode
+    cur_processor = processor.parosProcessor(os.path.join(tmp_dir, "data"), "http://127.0.0.1:1", "org", "bucket", "token")
+    writer = SleepingWriter(rtt, bandwidth)
+    cur_processor.influx_writer = writer
+
+    total_lines = len(sensors) * lines_per_sensor
+    start = time.perf_counter()
+    threading.Thread(target=cur_processor.processorLoop, daemon=True).start()
+    while writer.lines < total_lines:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({"lines": total_lines, "seconds": elapsed}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", help="Number of sensors", type=int, default=3)
+    parser.add_argument("--lines", help="Backlog lines per sensor", type=int, default=60000)
+    parser.add_argument("--rtt", help="Simulated InfluxDB round-trip time in seconds", type=float, default=0.2)
+    parser.add_argument("--bandwidth-mbps", help="Simulated uplink bandwidth, 0 for unlimited", type=float, default=0)
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sensors = [str(100000 + i) for i in range(args.sensors)]
+    bandwidth = args.bandwidth_mbps * 1000000 / 8
+
+    if args.run_mode:
+        runMode(args.run_mode, sensors, args.lines, args.rtt, bandwidth)
+        return
+
+    for mode in ("serial", "concurrent", "batched"):
+        result = subprocess.run(
+            [sys.executable, __file__, "--run-mode", mode, "--sensors", str(args.sensors), "--lines", str(args.lines), "--rtt", str(args.rtt), "--bandwidth-mbps", str(args.bandwidth_mbps)],
+            capture_output=True, text=True, check=True
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{mode:10s} {stats['lines']} lines in {stats['seconds']:7.2f} s   {stats['lines'] / stats['seconds']:9.0f} lines/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Idle CPU and sample-to-upload latency of the processor wakeup modes.
+
+Each mode runs in its own process. The processor first sits idle with no
+new data, then a writer thread appends one line per sensor every second
+(like the samplers flushing their buffers) and the time from append to
+upload is recorded, along with the uploads per second. --flush-rate 50
+is a fast sensor flushing often, which must not turn into an upload per
+flush.
+
+Run from the repository root: python benchmarks/bench_processor_wakeup.py
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import datetime
+import argparse
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+class LatencyWriter:
+
+    # Stands in for InfluxWriter, uploads are only timed
+    compress = False
+    rejected_lines = 0
+
+    def __init__(self):
+        self.latencies = []
+        self.uploads = 0
+
+    def encode(self, output_lp):
+        return output_lp
+
+    def post(self, body, num_lines, raw_size, compressed=None):
+        now = time.time_ns()
+        self.uploads += 1
+        for line in body.splitlines():
+            self.latencies.append((now - int(line.rsplit(b" ", 1)[1])) / 1e6)
+        return 0, False
+
+    def logStats(self):
+        pass
+
+def runMode(mode, sensors, idle_seconds, active_seconds, flush_rate):
+    import processor
+
+    tmp_dir = tempfile.mkdtemp()
+    os.chdir(tmp_dir)
+    os.makedirs("sensor_configs")
+    hostname = socket.gethostname()
+    with open(f"sensor_configs/{hostname}.json", "w") as f:
+        json.dump({"sensors": [{"driver": "", "sensor_id": sensor, "args": ""} for sensor in sensors]}, f)
+
+    os.environ["PAROS_PROCESSOR_WAKEUP"] = mode
+    data_loc = os.path.join(tmp_dir, "data")
+    for sensor in sensors:
+        os.makedirs(os.path.join(data_loc, sensor))
+    cur_processor = processor.parosProcessor(data_loc, "http://127.0.0.1:1", "org", "bucket", "token")
+    writer = LatencyWriter()
+    cur_processor.influx_writer = writer
+    threading.Thread(target=cur_processor.processorLoop, daemon=True).start()
+
+    # Idle phase
+    time.sleep(1)
+    cpu_start = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = (time.process_time() - cpu_start) / idle_seconds * 100
+
+    # Active phase, each sensor flushes flush_rate times a second at a random phase
+    def appendLines(sensor):
+        end_time = time.monotonic() + active_seconds
+        time.sleep(random.random() / flush_rate)
+        while time.monotonic() < end_time:
+            hour = datetime.datetime.now(datetime.UTC).strftime('%Y-%m-%d-%H')
+            with open(os.path.join(data_loc, sensor, hour), "a") as f:
+                f.write(f"{hostname},id={sensor} value=1 {time.time_ns()}\n")
+            time.sleep(1 / flush_rate)
+
+    appenders = [threading.Thread(target=appendLines, args=(sensor,)) for sensor in sensors]
+    for appender in appenders:
+        appender.start()
+    for appender in appenders:
+        appender.join()
+    time.sleep(2)
+
+    latencies = sorted(writer.latencies)
+    print(json.dumps({
+        "idle_cpu": idle_cpu,
+        "uploads_per_sec": writer.uploads / active_seconds,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "lines": len(latencies)
+    }))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", help="Number of sensors", type=int, default=3)
+    parser.add_argument("--idle-seconds", help="Length of the idle phase", type=float, default=10)
+    parser.add_argument("--active-seconds", help="Length of the phase with new data", type=float, default=20)
+    parser.add_argument("--flush-rate", help="Flushes/sec of each sensor in the active phase", type=float, default=1)
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sensors = [str(100000 + i) for i in range(args.sensors)]
+
+    if args.run_mode:
+        runMode(args.run_mode, sensors, args.idle_seconds, args.active_seconds, args.flush_rate)
+        return
+
+    for mode in ("timer", "inotify"):
+        result = subprocess.run(
+            [sys.executable, __file__, "--run-mode", mode, "--sensors", str(args.sensors),
+             "--idle-seconds", str(args.idle_seconds), "--active-seconds", str(args.active_seconds), "--flush-rate", str(args.flush_rate)],
+            capture_output=True, text=True, check=True
+        )
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{mode:8s} idle CPU {stats['idle_cpu']:5.2f} %   latency p50 {stats['p50']:7.1f} ms   p95 {stats['p95']:7.1f} ms   {stats['uploads_per_sec']:5.1f} uploads/sec   ({stats['lines']} lines)")
+
+if __name__ == "__main__":
+    main()
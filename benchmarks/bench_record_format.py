@@ -0,0 +1,115 @@
+"""SD write volume and CPU per sample of the text and binary hour file formats.
+
+Writes the same samples for each driver through ParosHourWriter in both
+formats, then reads them back through TailReader the way the processor
+uploads them and checks that the binary files render to exactly the same
+line protocol as the text files.
+
+Run from the repository root: python benchmarks/bench_record_format.py
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "paros_sensors"))
+from LineProtocolTemplate import LineProtocolTemplate
+from ParosRecordFormat import ParosRecordFormat
+from ParosHourWriter import ParosHourWriter
+from paros_processor import TailReader
+
+# Field layouts, binary kinds and representative values for each driver's samplingLoop
+DRIVERS = {
+    "Paros_600016BIS": (
+        (("value", float), ("baro_time", str)),
+        {"baro_time": "isotime"},
+        lambda i: (round(random.uniform(14.0, 15.0), 6), f"2024-03-01T12:{i // 1200 % 60:02d}:{i // 20 % 60:02d}.{i % 20 * 50000:06d}")
+    ),
+    "Young_86000": (
+        (("speed", float), ("direction", float), ("u", float), ("v", float)),
+        {},
+        lambda i: (round(random.uniform(0, 20), 2), round(random.uniform(0, 360), 1), random.uniform(-20, 20), random.uniform(-20, 20))
+    ),
+    "MPU9250": (
+        (("imu_time", float), ("accelX", float), ("accelY", float), ("accelZ", float), ("gyroX", float), ("gyroY", float), ("gyroZ", float)),
+        {},
+        lambda i: (float(i * 10),) + tuple(round(random.uniform(-8, 8), 6) for j in range(6))
+    ),
+}
+
+BOX_ID = "paros1"
+SENSOR_ID = "142166"
+BATCH_LINES = 5000
+
+def writeSamples(sensor_dir, samples, encode, header):
+    writer = ParosHourWriter(sensor_dir, 20, 1.0, "never", header=header)
+    start = time.process_time()
+    for values, timestamp_ns in samples:
+        writer.write(encode(values, timestamp_ns), timestamp_ns)
+    writer.close()
+    return time.process_time() - start
+
+def readSamples(path):
+    # Everything the processor does per batch before handing it to the writer
+    tail_reader = TailReader(BOX_ID.encode())
+    output = []
+    offset = 0
+    start = time.process_time()
+    while True:
+        output_lp,offset,num_lines = tail_reader.read(path, offset, BATCH_LINES)
+        if not num_lines:
+            break
+        output.append(output_lp)
+    return time.process_time() - start, b"".join(output)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", help="Samples per driver", type=int, default=200000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        # Every sample in the same hour so each format is one file
+        hour_start = time.time_ns() // ParosHourWriter.NS_PER_HOUR * ParosHourWriter.NS_PER_HOUR
+
+        for driver, (fields, kinds, make_values) in DRIVERS.items():
+            samples = [(make_values(i), hour_start + i * 50000000 % ParosHourWriter.NS_PER_HOUR) for i in range(args.samples)]
+            samples.sort(key=lambda sample: sample[1])
+
+            template = LineProtocolTemplate(BOX_ID, {"id": SENSOR_ID}, fields)
+            record_format = ParosRecordFormat(BOX_ID, {"id": SENSOR_ID}, [(name, "float" if t is float else kinds[name]) for name, t in fields])
+
+            results = {}
+            for name, encode, header in (
+                ("text", lambda values, timestamp_ns: f"{template.serialize(values, timestamp_ns)}\n".encode(), b""),
+                ("binary", record_format.pack, record_format.header)
+            ):
+                sensor_dir = os.path.join(tmp_dir, driver, name)
+                os.makedirs(sensor_dir)
+                write_cpu = writeSamples(sensor_dir, samples, encode, header)
+                path = os.path.join(sensor_dir, os.listdir(sensor_dir)[0])
+                read_cpu, output_lp = readSamples(path)
+                results[name] = (os.path.getsize(path), write_cpu, read_cpu, output_lp)
+
+            if results["text"][3] != results["binary"][3]:
+                print(f"{driver}: binary records render differently from the text file")
+                sys.exit(1)
+
+            print(driver)
+            for name, (size, write_cpu, read_cpu, output_lp) in results.items():
+                print(
+                    f"  {name:6s} {size / args.samples:6.1f} bytes/sample on disk   "
+                    f"sampler {write_cpu / args.samples * 1e6:5.2f} us/sample   "
+                    f"processor {read_cpu / args.samples * 1e6:5.2f} us/sample"
+                )
+            print(f"  binary writes {results['text'][0] / results['binary'][0]:.1f}x less to the SD card")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Host timestamp lag during SD card stalls, inline reading against pipeline mode.
+
+A writer thread plays an MPU9250 over a pseudo terminal, putting the time
+each line was sent into its imu_time field. Every --stall-every seconds a
+flush of the hour file stalls for --stall seconds, like an SD card busy with
+wear leveling. The lag is the sample's host timestamp minus the time it was
+sent, and the frame queue statistics show how close pipeline mode came to
+dropping data.
+
+Run from the repository root: python benchmarks/bench_sample_pipeline.py
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+import serial
+from ParosSerialSensor import ParosSerialSensor
+
+class BenchSensor(ParosSerialSensor):
+
+    sampleFields = (("imu_time", float),) + tuple((name, float) for name in ("accelX", "accelY", "accelZ", "gyroX", "gyroY", "gyroZ"))
+
+    def __init__(self, data_loc, device_file):
+        super().__init__("paros1", "bench", data_loc, device_file, 115200, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE, 1.0)
+
+def playMPU(master_fd, rate, seconds):
+    burst_period = 0.005
+    per_burst = max(1, int(rate * burst_period))
+    end_time = time.monotonic() + seconds
+    next_burst = time.monotonic()
+    while time.monotonic() < end_time:
+        lines = []
+        for i in range(per_burst):
+            values = ",".join(f"{random.uniform(-8, 8):f}" for j in range(6))
+            lines.append(f"{time.time_ns() // 1000},{values}\r\n")
+        os.write(master_fd, "".join(lines).encode())
+        next_burst += burst_period
+        time.sleep(max(0, next_burst - time.monotonic()))
+
+def runMode(pipeline, args):
+    os.environ["PAROS_SAMPLE_PIPELINE"] = "1" if pipeline else "0"
+    os.environ["PAROS_SAMPLE_BUFFER_SIZE"] = "100"
+    data_loc = tempfile.mkdtemp()
+    master_fd, slave_fd = os.openpty()
+    sensor = BenchSensor(data_loc, os.ttyname(slave_fd))
+
+    # Stall some flushes
+    flush = sensor.writer.flush
+    next_stall = [time.monotonic() + args.stall_every]
+    def stallingFlush():
+        if time.monotonic() >= next_stall[0]:
+            time.sleep(args.stall)
+            next_stall[0] = time.monotonic() + args.stall_every
+        flush()
+    sensor.writer.flush = stallingFlush
+
+    lags = []
+    add_sample = sensor.addSample
+    def recordingAddSample(values, timestamp_ns=None):
+        lags.append(timestamp_ns / 1e6 - values[0] / 1e3)
+        add_sample(values, timestamp_ns)
+    sensor.addSample = recordingAddSample
+
+    player = threading.Thread(target=playMPU, args=(master_fd, args.rate, args.seconds), daemon=True)
+    player.start()
+    end_time = time.monotonic() + args.seconds + 1
+    while time.monotonic() < end_time:
+        frames = sensor.nextFrames()
+        if frames is None:
+            break
+        for frame, timestamp_ns in frames:
+            in_parts = frame.strip().split(b",")
+            if len(in_parts) == 7:
+                sensor.addSample([float(part) for part in in_parts], timestamp_ns)
+
+    lags.sort()
+    name = "pipeline" if pipeline else "inline"
+    print(
+        f"{name:8s} {len(lags):6d} samples   lag p50 {lags[len(lags) // 2]:7.1f} ms   "
+        f"p99 {lags[int(len(lags) * 0.99)]:7.1f} ms   max {lags[-1]:7.1f} ms"
+    )
+    if sensor.pipeline is not None:
+        print(
+            f"         queue high water {sensor.pipeline.high_water}/{sensor.pipeline.capacity}, "
+            f"{sensor.pipeline.dropped} frames dropped"
+        )
+        sensor.pipeline.stop()
+
+    sensor.closeSamples()
+    os.close(master_fd)
+    os.close(slave_fd)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", help="Lines per second", type=int, default=1000)
+    parser.add_argument("--seconds", help="Seconds per mode", type=float, default=10)
+    parser.add_argument("--stall", help="Seconds each stalled flush takes", type=float, default=0.5)
+    parser.add_argument("--stall-every", help="Seconds between stalled flushes", type=float, default=3)
+    args = parser.parse_args()
+
+    runMode(False, args)
+    runMode(True, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Memory and CPU of one sampler process per sensor against ParosSamplerHost.
+
+Plays --sensors Young 86000 anemometers over pseudo terminals and runs them
+first as separate Young_86000.py processes, the way setup.sh creates one
+service per sensor, then all in one ParosSamplerHost.py process. After
+--settle seconds it measures resident and proportional set size (PSS counts
+shared library pages once across processes) and the CPU used during
+--seconds.
+
+With --fault the first anemometer sends a burst of bad checksums in the
+middle of the run, which makes its driver give up. The samples written per
+sensor show whether the other sensors kept going and whether the host
+restarted the failed one.
+
+Run from the repository root: python benchmarks/bench_sampler_host.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from functools import reduce
+from operator import xor
+
+SENSORS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors")
+
+def youngFrame(sensor_id, good=True):
+    body = f"{sensor_id} {random.uniform(0, 20):06.2f} {random.randint(0, 359):03d} 00".encode()
+    checksum = reduce(xor, body, 0)
+    if not good:
+        checksum ^= 0xFF
+    return body + f"*{checksum:02X}\r".encode()
+
+def playYoung(master_fd, sensor_id, rate, stop_event, fault_at=None):
+    next_frame = time.monotonic()
+    while not stop_event.is_set():
+        if fault_at is not None and time.monotonic() >= fault_at:
+            os.write(master_fd, b"".join(youngFrame(sensor_id, False) for i in range(20)))
+            fault_at = None
+        try:
+            os.write(master_fd, youngFrame(sensor_id))
+        except OSError:
+            return
+        next_frame += 1 / rate
+        time.sleep(max(0, next_frame - time.monotonic()))
+
+def readUsage(pid):
+    # (rss kB, pss kB, cpu seconds) of one process
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    pss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            pss = next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+    except (OSError, StopIteration):
+        pass
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return rss, pss, cpu
+
+def countSamples(data_loc, sensor_id):
+    sensor_dir = os.path.join(data_loc, sensor_id)
+    if not os.path.isdir(sensor_dir):
+        return 0
+    total = 0
+    for name in os.listdir(sensor_dir):
+        with open(os.path.join(sensor_dir, name), "rb") as f:
+            total += f.read().count(b"\n")
+    return total
+
+def runLayout(name, args):
+    data_loc = tempfile.mkdtemp()
+    work_dir = tempfile.mkdtemp()
+    env = dict(os.environ, PAROS_DATA_LOCATION=data_loc, PAROS_SAMPLE_BUFFER_SIZE="1")
+
+    sensor_ids = [f"{i:05d}" for i in range(1, args.sensors + 1)]
+    ptys = [os.openpty() for sensor_id in sensor_ids]
+    stop_event = threading.Event()
+    fault_at = time.monotonic() + args.settle + args.seconds / 4 if args.fault else None
+    players = []
+    for i, (sensor_id, (master_fd, slave_fd)) in enumerate(zip(sensor_ids, ptys)):
+        player = threading.Thread(target=playYoung, args=(master_fd, sensor_id, args.rate, stop_event, fault_at if i == 0 else None), daemon=True)
+        player.start()
+        players.append(player)
+
+    if name == "process":
+        procs = [
+            subprocess.Popen([sys.executable, os.path.join(SENSORS_DIR, "Young_86000.py"), sensor_id, os.ttyname(slave_fd)], env=env, cwd=work_dir)
+            for sensor_id, (master_fd, slave_fd) in zip(sensor_ids, ptys)
+        ]
+    else:
+        os.makedirs(os.path.join(work_dir, "sensor_configs"))
+        with open(os.path.join(work_dir, "sensor_configs", f"{socket.gethostname()}.json"), "w") as f:
+            json.dump({"sensors": [
+                {"driver": "Young_86000.py", "sensor_id": sensor_id, "args": os.ttyname(slave_fd)}
+                for sensor_id, (master_fd, slave_fd) in zip(sensor_ids, ptys)
+            ]}, f)
+        procs = [subprocess.Popen([sys.executable, os.path.join(SENSORS_DIR, "ParosSamplerHost.py")], env=env, cwd=work_dir)]
+
+    time.sleep(args.settle)
+    start = [readUsage(proc.pid) for proc in procs if proc.poll() is None]
+    time.sleep(args.seconds)
+    end = [readUsage(proc.pid) for proc in procs if proc.poll() is None]
+
+    for proc in procs:
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGTERM)
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    stop_event.set()
+    for master_fd, slave_fd in ptys:
+        os.close(master_fd)
+        os.close(slave_fd)
+
+    rss = sum(usage[0] for usage in end)
+    pss = sum(usage[1] for usage in end)
+    cpu = sum(usage[2] for usage in end) - sum(usage[2] for usage in start)
+    print(
+        f"{name:8s} {len(procs):2d} processes   RSS {rss / 1024:7.1f} MiB   PSS {pss / 1024:7.1f} MiB   "
+        f"CPU {cpu / args.seconds * 100:5.2f} %   (of {len(end)} still running)"
+    )
+    print("         samples per sensor: " + ", ".join(f"{sensor_id} {countSamples(data_loc, sensor_id)}" for sensor_id in sensor_ids))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", help="Number of simulated anemometers", type=int, default=4)
+    parser.add_argument("--rate", help="Frames per second from each anemometer", type=float, default=32)
+    parser.add_argument("--settle", help="Seconds before measuring", type=float, default=3)
+    parser.add_argument("--seconds", help="Seconds to measure", type=float, default=20)
+    parser.add_argument("--fault", help="Make the first anemometer fail during the run", action="store_true")
+    args = parser.parse_args()
+
+    runLayout("process", args)
+    runLayout("host", args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Throughput and latency of each sampler driver against a simulated device.
+
+Runs Paros_600016BIS, Young_86000 and MPU9250 in this process against the
+simulators in sensor_sim.py, starting at the real device's rate and going up
+by --step until the driver stops keeping up or --max-rate. For each rate it
+reports:
+
+- frames lost: overrun at the port, or dropped by the driver (frame queue
+  full in pipeline mode, or frames that failed to parse). Frames the driver
+  reads while starting up are not counted
+- CPU per sample, all of this process's CPU since the simulator runs in its
+  own process
+- latency from the frame being written to the pty to the sample being
+  written to its hour file, p50/p99/max
+
+Frames sent during the first --seconds at each rate are measured. A rate is
+sustainable if none of them were lost, the driver was still running and p99
+latency stayed under --max-latency. The hour writer's buffer time
+(PAROS_SAMPLE_BUFFER_TIME) is part of the latency.
+
+The pty carries bytes as fast as the driver reads them. --baud limits each
+simulated device to what its serial line carries, e.g. to compare the
+MPU9250's text and binary records (--imu-format) at the ESP32's 115200 baud:
+
+    python benchmarks/bench_samplers.py --drivers MPU9250 --baud 115200 --min-rate 100 --step 1.25
+
+Run from the repository root: python benchmarks/bench_samplers.py
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+from sensor_sim import ParosSimulator, YoungSimulator, MPUSimulator, PtySerial, installStandIns
+
+GPIO = installStandIns()
+from Paros_600016BIS import Paros_600016BIS
+from Young_86000 import Young_86000
+from MPU9250 import MPU9250
+
+MODE_PIN = 36
+
+# name -> (driver, simulator, simulator arguments after the rate, sensor_id,
+# driver arguments after the device)
+DRIVERS = {
+    "Paros_600016BIS": (Paros_600016BIS, ParosSimulator, ("123456",), "123456", ()),
+    "Young_86000": (Young_86000, YoungSimulator, ("00001",), "00001", ()),
+    "MPU9250": (MPU9250, MPUSimulator, (GPIO, MODE_PIN), "mpu", (MODE_PIN,)),
+}
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def runRate(name, rate, args):
+    driver, sim_class, sim_args, sensor_id, driver_args = DRIVERS[name]
+    sim = sim_class(rate, *sim_args)
+    if args.baud:
+        sim.wire_rate = args.baud / 10
+    PtySerial.simulators[sim.device] = sim
+    sim.start()
+
+    sensor = driver("bench", sensor_id, tempfile.mkdtemp(), sim.device, *driver_args)
+
+    # Which frame each sample came from, and when its hour file write returned
+    pending = []
+    written = []
+    last_seq = [0]
+    add_sample = sensor.addSample
+    def recordingAddSample(values, timestamp_ns=None):
+        last_seq[0] = sim.seqFromSample(values, last_seq[0])
+        pending.append(last_seq[0])
+        add_sample(values, timestamp_ns)
+    sensor.addSample = recordingAddSample
+
+    flush = sensor.writer.flush
+    def recordingFlush():
+        flush()
+        disk_ns = time.time_ns()
+        written.extend((seq, disk_ns) for seq in pending)
+        pending.clear()
+    sensor.writer.flush = recordingFlush
+
+    exit_code = []
+    def sample():
+        try:
+            sensor.samplingLoop()
+        except SystemExit as e:
+            exit_code.append(e.code)
+    sampler = threading.Thread(target=sample, name=name)
+
+    # Frames sent during the first --seconds are measured. The stream keeps
+    # going for --max-latency after that so the hour writer keeps flushing
+    # the way it does in steady state
+    cpu_start = time.process_time()
+    sampler.start()
+    time.sleep(args.seconds)
+    window_end_ns = time.time_ns()
+    time.sleep(args.max_latency)
+    sim.pause()
+
+    # Let the driver catch up with what was sent
+    seen = -1
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and sampler.is_alive():
+        time.sleep(0.5)
+        if len(pending) + len(written) == seen:
+            break
+        seen = len(pending) + len(written)
+    cpu = time.process_time() - cpu_start
+    samples = len(pending) + len(written)
+    gave_up = not sampler.is_alive()
+
+    # Stop the driver the way ctrl+c does, which closes the hour file
+    if sampler.is_alive():
+        sensor.requestStop()
+        sampler.join()
+    else:
+        sensor.closeSamples()
+    sensor._getSensorPort().close()
+    pipeline_dropped = sensor.pipeline.dropped if sensor.pipeline is not None else 0
+    if sensor.pipeline is not None:
+        sensor.pipeline.stop()
+    sent_ns = sim.stop()
+    del PtySerial.simulators[sim.device]
+
+    # Frames before the first sample went to the driver's startup checks
+    first_seq = min((seq for seq, disk_ns in written), default=0)
+    window_seq = first_seq
+    while window_seq < len(sent_ns) and sent_ns[window_seq] <= window_end_ns:
+        window_seq += 1
+
+    overrun = sum(1 for seq in range(first_seq, window_seq) if sent_ns[seq] < 0)
+    latencies = sorted((disk_ns - sent_ns[seq]) / 1e6 for seq, disk_ns in written if first_seq <= seq < window_seq and sent_ns[seq] >= 0)
+    lost = window_seq - first_seq - len(latencies)
+
+    p99 = percentile(latencies, 0.99) if latencies else float("inf")
+    sustainable = not gave_up and lost == 0 and p99 <= args.max_latency * 1000
+    print(
+        f"  {rate:8.0f}/s  {len(latencies):7d} samples  lost {lost:6d} "
+        f"(overrun {overrun}, queue {pipeline_dropped})  "
+        f"CPU {cpu / max(1, samples) * 1e6:6.1f} us/sample  "
+        + (f"latency p50 {percentile(latencies, 0.5):7.1f}  p99 {p99:7.1f}  max {latencies[-1]:7.1f} ms" if latencies else "no samples")
+        + ("" if sustainable else "  <- not sustained")
+        + (f"  (driver exited with {exit_code[0] if exit_code else '?'})" if gave_up else "")
+    )
+    return sustainable
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", help="Comma separated drivers to run", type=str, default=",".join(DRIVERS))
+    parser.add_argument("--seconds", help="Seconds per rate", type=float, default=5)
+    parser.add_argument("--step", help="Rate multiplier between runs", type=float, default=4)
+    parser.add_argument("--min-rate", help="First rate tried, frames/sec, instead of the real device's", type=float)
+    parser.add_argument("--max-rate", help="Highest rate tried, frames/sec", type=float, default=200000)
+    parser.add_argument("--baud", help="Serial line speed of the simulated devices, unlimited if not given", type=float)
+    parser.add_argument("--max-latency", help="Highest sustainable p99 latency, seconds", type=float, default=2.0)
+    parser.add_argument("--pipeline", help="Read frames on their own thread (PAROS_SAMPLE_PIPELINE=1)", action="store_true")
+    parser.add_argument("--format", help="Hour file format (PAROS_SAMPLE_FORMAT)", choices=("text", "binary"), default="text")
+    parser.add_argument("--imu-format", help="MPU9250 records on the wire (PAROS_IMU_FORMAT)", choices=("text", "binary"), default="text")
+    args = parser.parse_args()
+
+    os.environ["PAROS_SAMPLE_PIPELINE"] = "1" if args.pipeline else "0"
+    os.environ["PAROS_SAMPLE_FORMAT"] = args.format
+    os.environ["PAROS_IMU_FORMAT"] = args.imu_format
+    logging.basicConfig(level=logging.CRITICAL)
+
+    for name in args.drivers.split(","):
+        sim_class = DRIVERS[name][1]
+        print(f"{name} (real device {sim_class.HARDWARE_RATE}/s)")
+
+        best = None
+        rate = args.min_rate or sim_class.HARDWARE_RATE
+        while rate <= args.max_rate:
+            if not runRate(name, rate, args):
+                break
+            best = rate
+            rate *= args.step
+
+        print(f"  max sustained: {f'{best:.0f}/s' if best else 'none'}")
+
+if __name__ == "__main__":
+    main()
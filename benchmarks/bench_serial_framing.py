@@ -0,0 +1,112 @@
+"""Reader CPU per 1000 samples of readline() against ParosSerialSensor.readFrames().
+
+A writer thread plays an MPU9250 over a pseudo terminal at --rate lines/sec,
+in bursts the way a UART fills the kernel buffer, and the sampler side reads
+and parses the lines the way MPU9250.samplingLoop does. Only the reader
+thread's CPU time is counted.
+
+Run from the repository root: python benchmarks/bench_serial_framing.py
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+import serial
+from ParosSerialSensor import ParosSerialSensor
+
+class BenchSensor(ParosSerialSensor):
+
+    def __init__(self, data_loc, device_file):
+        super().__init__("paros1", "bench", data_loc, device_file, 115200, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE, 1.0)
+
+def playMPU(master_fd, rate, seconds, stop_event):
+    # Lines like the firmware's printf("%i,%f,%f,%f,%f,%f,%f")
+    burst_period = 0.01
+    per_burst = max(1, int(rate * burst_period))
+    imu_time = 0
+    end_time = time.monotonic() + seconds
+    next_burst = time.monotonic()
+    sent = 0
+    while time.monotonic() < end_time and not stop_event.is_set():
+        lines = []
+        for i in range(per_burst):
+            imu_time += 1000 // max(1, rate // 1000)
+            values = ",".join(f"{random.uniform(-8, 8):f}" for j in range(6))
+            lines.append(f"{imu_time},{values}\r\n")
+        os.write(master_fd, "".join(lines).encode())
+        sent += per_burst
+        next_burst += burst_period
+        time.sleep(max(0, next_burst - time.monotonic()))
+    return sent
+
+def readLegacy(sensor, count):
+    # One readline() and an eagerly formatted debug message per sample
+    port = sensor._getSensorPort()
+    read = 0
+    while read < count:
+        cur_line = port.readline()
+        logging.debug(f"Received from Device: {cur_line}")
+        if not cur_line:
+            break
+        in_parts = cur_line.decode().strip().split(",")
+        if len(in_parts) == 7:
+            [float(part) for part in in_parts]
+            read += 1
+    return read
+
+def readFramed(sensor, count):
+    read = 0
+    while read < count:
+        frames = sensor.readFrames()
+        if frames is None:
+            break
+        for frame in frames:
+            in_parts = frame.strip().split(b",")
+            if len(in_parts) == 7:
+                [float(part) for part in in_parts]
+                read += 1
+    return read
+
+def runMode(name, read_fn, rate, seconds, data_loc):
+    master_fd, slave_fd = os.openpty()
+    sensor = BenchSensor(data_loc, os.ttyname(slave_fd))
+    stop_event = threading.Event()
+    expected = int(rate * seconds)
+
+    result = {}
+    def reader():
+        start = time.thread_time()
+        result["read"] = read_fn(sensor, expected)
+        result["cpu"] = time.thread_time() - start
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    playMPU(master_fd, rate, seconds, stop_event)
+    reader_thread.join(timeout=seconds + 5)
+    stop_event.set()
+
+    sensor._getSensorPort().close()
+    os.close(master_fd)
+    os.close(slave_fd)
+
+    print(f"{name:9s} {result['read']:7d} samples   {result['cpu'] / max(1, result['read']) * 1000 * 1000:7.2f} ms CPU per 1000 samples")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", help="Lines per second, the MPU9250's full 1 kHz rate by default", type=int, default=1000)
+    parser.add_argument("--seconds", help="Seconds per mode", type=float, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    data_loc = tempfile.mkdtemp()
+    runMode("readline", readLegacy, args.rate, args.seconds, data_loc)
+    runMode("framed", readFramed, args.rate, args.seconds, data_loc)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Lines/sec of the processor's hour file reader on a large backlog.
+
+Compares the readline based reader the processor used before TailReader
+against TailReader at the normal upload size and at a catch-up size.
+
+Run from the repository root: python benchmarks/bench_tail_reader.py --size-mb 300
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from paros_processor import TailReader
+
+HOSTNAME = "paros1"
+
+def legacyRead(path, cur_offset, max_lines):
+    # parosProcessor.__getLatestData before TailReader
+    with open(path, 'rb') as f:
+        f.seek(cur_offset)
+        output_str = ""
+        line_counter = 0
+        while line_counter <= max_lines:
+            lp_str = f.readline()
+            if not lp_str:
+                break
+            while not lp_str.startswith(HOSTNAME.encode()):
+                cur_offset -= 1
+                f.seek(cur_offset)
+                lp_str = f.readline()
+            output_str += lp_str.decode()
+            line_counter += 1
+            cur_offset += len(lp_str)
+    return output_str, cur_offset, line_counter
+
+def writeBacklog(path, size):
+    timestamp = time.time_ns()
+    written = 0
+    with open(path, "w") as f:
+        while written < size:
+            lines = []
+            for i in range(10000):
+                timestamp += 50000000
+                lines.append(f"{HOSTNAME},id=142166 baro_time=\"2024-03-01T12:00:00.{i % 1000000:06d}\",value={random.uniform(14, 15)} {timestamp}\n")
+            chunk = "".join(lines)
+            f.write(chunk)
+            written += len(chunk)
+
+def drain(read_fn, path, max_lines):
+    offset = 0
+    total_lines = 0
+    start = time.perf_counter()
+    while True:
+        data, offset, num_lines = read_fn(path, offset, max_lines)
+        if not num_lines:
+            break
+        total_lines += num_lines
+    return total_lines, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", help="Size of the generated backlog", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "2024-03-01-12")
+        writeBacklog(path, args.size_mb * 1024 * 1024)
+        print(f"Backlog of {os.path.getsize(path) / 1024 / 1024:.0f} MB")
+
+        reader = TailReader(HOSTNAME.encode())
+        runs = [
+            ("readline, 600 lines", legacyRead, 600),
+            ("TailReader, 600 lines", reader.read, 600),
+            ("TailReader, 50000 lines", reader.read, 50000),
+        ]
+        for name, read_fn, max_lines in runs:
+            lines, elapsed = drain(read_fn, path, max_lines)
+            print(f"{name:25s} {lines:10d} lines in {elapsed:6.2f} s   {lines / elapsed:12.0f} lines/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Frames/sec of the old Young_86000 string parsing against YoungFrameDecoder.
+
+Replays a raw capture of the anemometer's serial output (--capture, as read
+from the port) or, without one, generated 86000 frames with the occasional
+bad checksum and status code. Both paths have to produce the same samples.
+
+Run from the repository root: python benchmarks/bench_young_decoder.py
+"""
+import os
+import sys
+import math
+import time
+import random
+import argparse
+from functools import reduce
+from operator import xor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "paros_sensors"))
+from YoungFrameDecoder import YoungFrameDecoder
+
+def makeCapture(frames):
+    # Wind that wanders like the real thing, 0.1 degree direction steps
+    speed = 5.0
+    direction = 180.0
+    data = []
+    for i in range(frames):
+        speed = min(99.99, max(0.0, speed + random.uniform(-0.3, 0.3)))
+        direction = (direction + random.uniform(-5, 5)) % 360
+        body = f"0 {speed:06.2f} {direction:05.1f} {'00' if random.random() > 0.001 else '04'}".encode()
+        checksum = reduce(xor, body, 0)
+        if random.random() < 0.001:
+            checksum ^= 0x01
+        data.append(body + f"*{checksum:02X}\r".encode())
+    return b"".join(data)
+
+def decodeChunk(decoder, data):
+    # Splits raw serial input into frames like ParosSerialSensor.readFrames
+    # and decodes each the way Young_86000 does. Returns (samples, number of
+    # bad frames, bytes after the last complete frame)
+    frames = data.split(YoungFrameDecoder.FRAME_END)
+    remainder = frames.pop()
+
+    samples = []
+    failures = 0
+    for frame in frames:
+        sample = decoder.decodeFrame(frame)
+        if sample is None:
+            failures += 1
+        elif sample:
+            samples.append(sample)
+
+    return samples, failures, remainder
+
+def xorChecksum(string):
+    # Young_86000.__xor_checksum before the decoder
+    result = 0
+    asterisk_index = string.find('*')
+    for char in string[:asterisk_index]:
+        result ^= ord(char)
+    return result
+
+def legacyDecode(frame):
+    # The per-frame work samplingLoop did before the decoder
+    strIn = frame.decode()
+    in_parts = strIn.strip().split(" ")
+    verification_parts = in_parts[-1].split("*")
+    if len(verification_parts) != 2:
+        return ()
+    if verification_parts[0] != "00":
+        return None
+    checksum = int(verification_parts[1], 16)
+    if xorChecksum(strIn) != checksum:
+        return None
+    cur_speed = float(in_parts[1])
+    cur_direction = float(in_parts[2])
+    angle_rad = math.radians(cur_direction)
+    return (cur_speed, cur_direction, cur_speed * math.cos(angle_rad), cur_speed * math.sin(angle_rad))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", help="Raw serial capture to replay")
+    parser.add_argument("--frames", help="Frames to generate without a capture", type=int, default=200000)
+    parser.add_argument("--chunk", help="Bytes handed to the decoder at a time, like frames queued on the port", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as f:
+            capture = f.read()
+    else:
+        capture = makeCapture(args.frames)
+
+    # Old path, one read_until(b'\r') at a time
+    start = time.perf_counter()
+    frames = [frame + b"\r" for frame in capture.split(b"\r")[:-1]]
+    legacy_samples = []
+    legacy_failures = 0
+    for frame in frames:
+        sample = legacyDecode(frame)
+        if sample is None:
+            legacy_failures += 1
+        elif sample:
+            legacy_samples.append(sample)
+    legacy_time = time.perf_counter() - start
+
+    # Decoder, fed in chunks the way queued frames come off the port
+    decoder = YoungFrameDecoder()
+    start = time.perf_counter()
+    samples = []
+    failures = 0
+    buffer = b""
+    for pos in range(0, len(capture), args.chunk):
+        chunk_samples, chunk_failures, buffer = decodeChunk(decoder, buffer + capture[pos:pos + args.chunk])
+        samples += chunk_samples
+        failures += chunk_failures
+    decoder_time = time.perf_counter() - start
+
+    if samples != legacy_samples or failures != legacy_failures:
+        print(f"Decoder gave {len(samples)} samples and {failures} failures, expected {len(legacy_samples)} and {legacy_failures}")
+        sys.exit(1)
+
+    print(f"{len(frames)} frames, {failures} failed, same samples from both paths")
+    print(
+        f"legacy {len(frames) / legacy_time:10.0f} frames/sec   decoder {len(frames) / decoder_time:10.0f} frames/sec   "
+        f"({legacy_time / decoder_time:.1f}x)"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Local stand-in for InfluxDB's /api/v2/write endpoint.
+
+Accepts line protocol the way InfluxDB does (gzip or identity, 204 on
+success) and keeps every accepted line, so benchmarks can check what
+arrived without a real database. What it can simulate:
+
+- latency: seconds added to every write
+- bandwidth: request bodies share a link of this many bytes/sec
+- error_rate: fraction of writes answered with HTTP 500 and not stored
+- outages: (start, end) seconds after start() during which every write gets
+  HTTP 503
+- on_write: called with each request's lines before they are stored,
+  returning False drops them. Used to inject crashes mid-upload
+- max_body_bytes: larger line protocol bodies get HTTP 413 and are not
+  stored, like InfluxDB's max-body-size
+
+A write with a line without a field set and timestamp gets HTTP 400 and
+none of its lines are stored, like /api/v2/write does.
+
+Points overwrite each other by series and timestamp like in InfluxDB, so a
+batch that is sent twice is stored once. lines keeps every accepted line in
+arrival order, resends included.
+
+Runs on its own for pointing a processor at it:
+python benchmarks/influx_standin.py --port 8086 --latency 0.2
+"""
+import gzip
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class InfluxStandIn:
+
+    def __init__(self, port=0, latency=0, bandwidth=0, error_rate=0, outages=(), on_write=None, seed=None, max_body_bytes=0):
+        # Instance Vars
+        self.latency = latency  # seconds added to every write
+        self.bandwidth = bandwidth  # bytes/sec shared by all requests, 0 for unlimited
+        self.error_rate = error_rate  # fraction of writes failed with HTTP 500
+        self.outages = outages  # (start, end) seconds after start() answered with HTTP 503
+        self.on_write = on_write  # called with the lines of each write, False drops them
+        self.max_body_bytes = max_body_bytes  # line protocol bytes per write, 0 for unlimited
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.link_free = 0  # monotonic time the simulated link is done with earlier bodies
+        self.start_time = None
+
+        # What arrived
+        self.lines = []  # every accepted line in arrival order
+        self.points = {}  # (series, timestamp) -> times it was written
+        self.measurement_points = {}  # measurement -> number of distinct points
+        self.requests = 0  # writes that were stored, answered with 204
+        self.errors = 0  # writes answered with HTTP 500
+        self.outage_errors = 0  # writes answered with HTTP 503
+        self.dropped = 0  # writes on_write dropped
+        self.rejected_lines = 0  # malformed lines, their writes got HTTP 400
+        self.rejected_writes = 0  # writes answered with HTTP 400, nothing stored
+        self.too_large = 0  # writes answered with HTTP 413, nothing stored
+        self.body_bytes = 0  # request bytes received, compressed if they were
+
+        standin = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                standin.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self.start_time = time.monotonic()
+        threading.Thread(target=self.server.serve_forever, name="influx-standin", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def inOutage(self):
+        elapsed = time.monotonic() - self.start_time
+        return any(start <= elapsed < end for start, end in self.outages)
+
+    def handle(self, request):
+        url = urlsplit(request.path)
+        body = request.rfile.read(int(request.headers.get("Content-Length", 0)))
+
+        if url.path != "/api/v2/write":
+            self.__reply(request, 404, '{"code":"not found","message":"path not found"}')
+            return
+        if not parse_qs(url.query).get("bucket"):
+            self.__reply(request, 400, '{"code":"invalid","message":"bucket is required"}')
+            return
+
+        if self.inOutage():
+            with self.lock:
+                self.outage_errors += 1
+            self.__reply(request, 503, '{"code":"unavailable","message":"simulated outage"}')
+            return
+
+        # Latency, then the body's turn on the shared link
+        with self.lock:
+            now = time.monotonic()
+            self.link_free = max(now, self.link_free) + (len(body) / self.bandwidth if self.bandwidth else 0)
+            done = self.link_free + self.latency
+            failed = self.random.random() < self.error_rate
+        time.sleep(max(0, done - time.monotonic()))
+
+        if failed:
+            with self.lock:
+                self.errors += 1
+            self.__reply(request, 500, '{"code":"internal error","message":"simulated error"}')
+            return
+
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        if self.max_body_bytes and len(body) > self.max_body_bytes:
+            with self.lock:
+                self.too_large += 1
+            self.__reply(request, 413, f'{{"code":"request too large","message":"unable to read data: points batch is too large, over {self.max_body_bytes} bytes"}}')
+            return
+        lines = body.splitlines()
+
+        if self.on_write is not None and self.on_write(lines) is False:
+            with self.lock:
+                self.dropped += 1
+            self.__reply(request, 500, '{"code":"internal error","message":"write dropped"}')
+            return
+
+        rejected = sum(not self.__valid(line) for line in lines)
+        if rejected:
+            with self.lock:
+                self.rejected_writes += 1
+                self.rejected_lines += rejected
+            self.__reply(request, 400, f'{{"code":"invalid","message":"unable to parse {rejected} lines"}}')
+            return
+
+        with self.lock:
+            self.requests += 1
+            self.body_bytes += int(request.headers.get("Content-Length", 0))
+            self.lines.extend(lines)
+            for line in lines:
+                # No escaped spaces in the series or timestamp of paros lines
+                key = (line.split(b" ", 1)[0], line.rsplit(b" ", 1)[1])
+                count = self.points.get(key, 0)
+                self.points[key] = count + 1
+                if not count:
+                    measurement = key[0].split(b",", 1)[0]
+                    self.measurement_points[measurement] = self.measurement_points.get(measurement, 0) + 1
+
+        self.__reply(request, 204)
+
+    def __valid(self, line):
+        # Measurement and tags, fields and a timestamp, no escaped spaces in paros lines
+        parts = line.split(b" ")
+        return len(parts) == 3 and b"=" in parts[1] and parts[2].isdigit()
+
+    def __reply(self, request, status, message=None):
+        try:
+            request.send_response(status)
+            if message is None:
+                request.send_header("Content-Length", "0")
+                request.end_headers()
+            else:
+                data = message.encode()
+                request.send_header("Content-Type", "application/json")
+                request.send_header("Content-Length", str(len(data)))
+                request.end_headers()
+                request.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client is gone, e.g. a crash was injected
+            pass
+
+def parseOutages(outages):
+    # "start:end,start:end" in seconds
+    return tuple(tuple(float(part) for part in outage.split(":")) for outage in outages.split(",") if outage)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", help="Port to listen on", type=int, default=8086)
+    parser.add_argument("--latency", help="Seconds added to every write", type=float, default=0)
+    parser.add_argument("--bandwidth-mbps", help="Link speed shared by all writes, 0 for unlimited", type=float, default=0)
+    parser.add_argument("--error-rate", help="Fraction of writes failed with HTTP 500", type=float, default=0)
+    parser.add_argument("--outages", help="start:end seconds answered with HTTP 503, comma separated", type=str, default="")
+    args = parser.parse_args()
+
+    standin = InfluxStandIn(args.port, args.latency, args.bandwidth_mbps * 1000000 / 8, args.error_rate, parseOutages(args.outages))
+    standin.start()
+    print(f"Listening on {standin.url}, ctrl+c to stop")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"{standin.requests} writes, {len(standin.lines)} lines, {len(standin.points)} points, {standin.errors + standin.outage_errors} errors")
+    except KeyboardInterrupt:
+        standin.stop()
+
+if __name__ == "__main__":
+    main()
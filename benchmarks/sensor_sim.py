@@ -0,0 +1,366 @@
+"""Simulated sensors on pseudo terminals, for running the drivers without hardware.
+
+Each simulator runs in its own process and talks its device's protocol on
+the master side of a pty, the driver opens the slave side like a serial
+port:
+
+- ParosSimulator: a Paros 6000-16B-IS. Answers *0100SN and *0100EW*0100GR=
+  and streams *0001V frames after *0100P4, until the next command
+- YoungSimulator: a Young 86000 streaming checksummed frames
+- MPUSimulator: the ESP32 running firmware/MPU9250.ino, streaming 7-field
+  CSV, or COBS framed binary records after "B<rate>". It reboots when DTR
+  goes low then high, and only streams if the mode pin was low (IMU mode)
+  at boot. It can corrupt or cut off every so many binary frames
+
+Frames go out in bursts at the requested rate, which can be far above what
+the real device does. The master side doesn't block, so if the driver falls
+behind and the pty buffer fills up, frames are lost like a UART overrun
+instead of slowing the simulator down. Setting wire_rate limits the bytes
+per second to what the device's serial line carries, frames the line has no
+room for are lost the same way. Every frame's position in the stream is
+written into one of its fields, see seqFromSample().
+
+installStandIns() replaces RPi.GPIO with GPIOStandIn and serial.Serial with
+PtySerial, whose DTR changes go to the simulator. Call it before importing
+the drivers.
+"""
+import os
+import sys
+import tty
+import time
+import types
+import select
+import binascii
+import struct
+import datetime
+import multiprocessing
+from array import array
+from functools import reduce
+from operator import xor
+
+import serial
+
+class PtySimulator:
+
+    HARDWARE_RATE = 1  # frames/sec the real device sends
+    BURST_PERIOD = 0.002  # seconds between bursts of frames
+    STREAM_AT_START = True  # starts streaming without being asked to
+    WIRE_BUFFER = 128  # bytes the device queues for its UART before frames are lost
+
+    def __init__(self, rate):
+        # Instance Vars
+        self.rate = rate  # frames/sec while streaming
+        self.wire_rate = None  # bytes/sec of the device's serial line, baud / 10, None for no limit
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.device = os.ttyname(self.slave_fd)
+        self.control, self.child_control = multiprocessing.Pipe()
+        self.process = multiprocessing.get_context("fork").Process(target=self.__run, daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def pause(self):
+        # Stop streaming, commands are still answered
+        self.control.send(("pause",))
+
+    def stop(self):
+        # Returns the wall clock ns each frame was written at by position in
+        # the stream, -1 for frames lost to an overrun or the serial line
+        self.control.send(("stop",))
+        sent_ns = array("q")
+        sent_ns.frombytes(self.control.recv_bytes())
+        self.process.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+        return sent_ns
+
+    def frames(self, first_seq, count):
+        # count encoded frames, starting at stream position first_seq
+        raise NotImplementedError
+
+    def command(self, line):
+        # One line sent by the driver, without its b"\r\n"
+        pass
+
+    def message(self, msg):
+        # A message sent from the driver's side other than pause/stop
+        pass
+
+    def reply(self, data):
+        try:
+            os.write(self.master_fd, data)
+        except BlockingIOError:
+            pass
+
+    def startStream(self, delay=0):
+        self.stream_start = time.monotonic() + delay
+        self.streamed = 0
+        self.streaming = True
+
+    def stopStream(self):
+        self.streaming = False
+
+    def __run(self):
+        os.set_blocking(self.master_fd, False)
+        self.sent_ns = array("q")
+        self.wire_free = 0  # monotonic time the serial line has sent everything queued
+        self.streaming = False
+        if self.STREAM_AT_START:
+            self.startStream()
+
+        commands = b""
+        while True:
+            readable, _, _ = select.select([self.master_fd, self.child_control], [], [], self.BURST_PERIOD)
+
+            if self.child_control in readable:
+                msg = self.child_control.recv()
+                if msg[0] == "stop":
+                    break
+                elif msg[0] == "pause":
+                    self.stopStream()
+                else:
+                    self.message(msg)
+
+            if self.master_fd in readable:
+                try:
+                    commands += os.read(self.master_fd, 4096)
+                except (BlockingIOError, OSError):
+                    pass
+                while b"\r\n" in commands:
+                    line, commands = commands.split(b"\r\n", 1)
+                    self.command(line)
+
+            if self.streaming:
+                due = int((time.monotonic() - self.stream_start) * self.rate) - self.streamed
+                if due > 0:
+                    self.__writeFrames(due)
+
+        self.child_control.send_bytes(self.sent_ns.tobytes())
+
+    def __writeFrames(self, count):
+        # Whatever doesn't fit in the pty buffer is lost, the same as a
+        # UART overrun on the real port
+        frames = self.frames(len(self.sent_ns), count)
+        fits = self.__wireFits(frames)
+        data = b"".join(frame for frame, fit in zip(frames, fits) if fit)
+        try:
+            written = os.write(self.master_fd, data)
+        except BlockingIOError:
+            written = 0
+        now_ns = time.time_ns()
+
+        end = 0
+        for frame, fit in zip(frames, fits):
+            if fit:
+                end += len(frame)
+            self.sent_ns.append(now_ns if fit and end <= written else -1)
+        self.streamed += count
+
+    def __wireFits(self, frames):
+        # Which frames the serial line has room for, the device's UART
+        # queue holds WIRE_BUFFER bytes
+        if self.wire_rate is None:
+            return [True] * len(frames)
+
+        now = time.monotonic()
+        fits = []
+        for frame in frames:
+            queued = max(0, self.wire_free - now) * self.wire_rate
+            fit = queued + len(frame) <= self.WIRE_BUFFER
+            if fit:
+                self.wire_free = max(now, self.wire_free) + len(frame) / self.wire_rate
+            fits.append(fit)
+        return fits
+
+class ParosSimulator(PtySimulator):
+
+    HARDWARE_RATE = 40  # continuous P4 sampling as the boxes use it
+    STREAM_AT_START = False
+
+    def __init__(self, rate, serial_number):
+        super().__init__(rate)
+        self.serial_number = serial_number
+
+    def command(self, line):
+        # Any command stops P4 sampling, like on the barometer
+        self.stopStream()
+        if line == b"*0100SN":
+            self.reply(f"*0001SN={self.serial_number}\r\n".encode())
+        elif line.startswith(b"*0100EW*0100GR="):
+            self.reply(b"*0001GR=" + line.split(b"=", 1)[1] + b"\r\n")
+        elif line == b"*0100P4":
+            self.startStream()
+
+    def frames(self, first_seq, count):
+        # The pressure field is the position in the stream
+        baro_time = datetime.datetime.now(datetime.UTC).strftime("%m/%d/%y %H:%M:%S.%f")
+        return [f"*0001V,{baro_time},{seq:.3f}\r\n".encode() for seq in range(first_seq, first_seq + count)]
+
+    @staticmethod
+    def seqFromSample(values, last_seq):
+        return int(values[0])
+
+class YoungSimulator(PtySimulator):
+
+    HARDWARE_RATE = 32  # fastest output rate of the 86000
+    SPEED_STEPS = 100000  # "000.00" to "999.99"
+
+    def __init__(self, rate, sensor_id):
+        super().__init__(rate)
+        self.sensor_id = sensor_id
+
+    def frames(self, first_seq, count):
+        # The speed field is the position in the stream, wrapping around
+        frames = []
+        for seq in range(first_seq, first_seq + count):
+            body = f"{self.sensor_id} {seq % self.SPEED_STEPS / 100:06.2f} {seq % 360:03d} 00".encode()
+            frames.append(body + f"*{reduce(xor, body, 0):02X}\r".encode())
+        return frames
+
+    @classmethod
+    def seqFromSample(cls, values, last_seq):
+        # The first position at or after last_seq with this speed
+        seq = last_seq - last_seq % cls.SPEED_STEPS + round(values[0] * 100)
+        return seq if seq >= last_seq else seq + cls.SPEED_STEPS
+
+class MPUSimulator(PtySimulator):
+
+    HARDWARE_RATE = 1000  # the MPU9250's full sample rate
+    BOOT_TIME = 0.1  # seconds from reset to the first sample
+    RECORD = struct.Struct("<I6h")  # binary record, see firmware/MPU9250.ino
+    RAW_COUNTS = (49, -12, 4088, 2, -3, 1)  # accel and gyro counts of every binary record
+
+    def __init__(self, rate, gpio, mode_pin, corrupt_every=0):
+        super().__init__(rate)
+        self.gpio = gpio
+        self.mode_pin = mode_pin
+        self.corrupt_every = corrupt_every  # every so many binary frames is corrupted or cut off, 0 for none
+        self.binary = False
+
+    def setDTR(self, state):
+        # Called on the driver's side, the firmware picks its mode at boot
+        self.control.send(("dtr", state, self.gpio.pins.get(self.mode_pin) == self.gpio.LOW))
+
+    def message(self, msg):
+        if msg[0] != "dtr":
+            return
+
+        dtr, imu_mode = msg[1], msg[2]
+        if not dtr:
+            # Held in reset
+            self.stopStream()
+        elif imu_mode:
+            self.binary = False
+            self.startStream(self.BOOT_TIME)
+
+    def command(self, line):
+        # The simulator keeps its own rate, "B<rate>" only picks the format
+        if line.startswith(b"B"):
+            self.binary = True
+        elif line == b"A":
+            self.binary = False
+
+    def frames(self, first_seq, count):
+        # The imu_time field is the position in the stream
+        if self.binary:
+            return [self.binaryFrame(seq) for seq in range(first_seq, first_seq + count)]
+        return [
+            f"{seq},0.012000,-0.003000,0.998000,0.100000,-0.200000,0.050000\r\n".encode()
+            for seq in range(first_seq, first_seq + count)
+        ]
+
+    def binaryFrame(self, seq):
+        record = self.RECORD.pack(seq, *self.RAW_COUNTS)
+        frame = cobsEncode(record + binascii.crc_hqx(record, 0xFFFF).to_bytes(2, "big")) + b"\x00"
+        if not self.corrupted(seq):
+            return frame
+        if seq // self.corrupt_every % 2:
+            # Cut off, the rest of it was lost
+            return frame[:len(frame) // 2] + b"\x00"
+        # One byte flipped, never to a zero
+        i = len(frame) // 2
+        flipped = frame[i] ^ 0x5A or frame[i] ^ 0xA5
+        return frame[:i] + bytes((flipped,)) + frame[i + 1:]
+
+    def corrupted(self, seq):
+        return self.corrupt_every > 0 and seq % self.corrupt_every == self.corrupt_every - 1
+
+    @staticmethod
+    def seqFromSample(values, last_seq):
+        return int(values[0])
+
+def cobsEncode(data):
+    # Consistent overhead byte stuffing of less than 254 bytes: every zero
+    # becomes the distance to the next one, the first byte the distance to
+    # the first
+    out = bytearray(1)
+    code_index = 0
+    for byte in data:
+        if byte == 0:
+            out[code_index] = len(out) - code_index
+            code_index = len(out)
+            out.append(0)
+        else:
+            out.append(byte)
+    out[code_index] = len(out) - code_index
+    return bytes(out)
+
+class PtySerial(serial.Serial):
+
+    # pyserial's modem line ioctls fail on a pty, DTR goes to the simulator
+    # on that pty instead
+    simulators = {}  # slave device -> simulator
+
+    def _update_dtr_state(self):
+        simulator = self.simulators.get(self.port)
+        if simulator is not None and hasattr(simulator, "setDTR"):
+            simulator.setDTR(self._dtr_state)
+
+    def _update_rts_state(self):
+        pass
+
+class GPIOStandIn(types.ModuleType):
+
+    # Just enough of RPi.GPIO for the drivers, pins keep their last output
+    BOARD = "BOARD"
+    BCM = "BCM"
+    OUT = "OUT"
+    IN = "IN"
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        super().__init__("RPi.GPIO")
+        self.mode = None
+        self.pins = {}  # pin -> last output
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=None, pull_up_down=None):
+        if direction == self.OUT and initial is not None:
+            self.pins[pin] = initial
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def cleanup(self, pins=None):
+        self.pins.clear()
+
+def installStandIns():
+    # Returns the GPIO stand-in. Always replaces the real RPi.GPIO, nothing
+    # here should drive the pins of the machine it runs on
+    gpio = GPIOStandIn()
+    package = types.ModuleType("RPi")
+    package.GPIO = gpio
+    sys.modules["RPi"] = package
+    sys.modules["RPi.GPIO"] = gpio
+    serial.Serial = PtySerial
+    return gpio
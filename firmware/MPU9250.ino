@@ -17,6 +17,20 @@ int intPin = 26;
 int modePin = 25;
 bool imuMode;
 
+// IMU mode output, text lines until the host sends "B<samples/sec>" for
+// binary records or "A" to go back to text at the boot sample rate.
+// A binary record is imu.time (ms, uint32) and the raw accel and gyro
+// counts (6 x int16), little-endian, then the CRC-16/CCITT of the record
+// (poly 0x1021, init 0xFFFF) big-endian. It is COBS encoded so the only
+// zero byte on the wire is the one ending each frame, see
+// paros_sensors/MPUFrameDecoder.py
+#define BOOT_SAMPLE_RATE 20
+#define RECORD_SIZE 16
+#define FRAME_SIZE (RECORD_SIZE + 4)  // COBS code byte, record, CRC and the zero byte
+bool binaryMode = false;
+char command[16];
+uint8_t commandLength = 0;
+
 uint64_t timestamp;
 bool new_timestamp;
 
@@ -53,16 +67,24 @@ void setup()
     imu.setGyroFSR(2000);                             // Set gyro to 2000 dps
     imu.setAccelFSR(8);                               // Set accel to +/-8g
     imu.setLPF(98);                                   // Set LPF corner frequency to 98Hz
-    imu.setSampleRate(20);                            // Set sample rate to 20Hz
+    imu.setSampleRate(BOOT_SAMPLE_RATE);              // Set sample rate to 20Hz
   }
 }
 
 void loop() 
 {
+  if (imuMode) {
+    readCommand();
+  }
+
   if (imuMode && imu.dataReady()) {
     // IMU loop
     imu.update(UPDATE_ACCEL | UPDATE_GYRO);
-    printIMUData();
+    if (binaryMode) {
+      sendIMURecord();
+    } else {
+      printIMUData();
+    }
   } else {
     if (new_timestamp) {
       // Timestamp Loop
@@ -84,3 +106,104 @@ void printIMUData(void)
   SerialPort.printf("%i,%f,%f,%f,%f,%f,%f", imu.time, accelX, accelY, accelZ, gyroX, gyroY, gyroZ);
   SerialPort.println();
 }
+
+void readCommand(void)
+{
+  // Commands end with "\r\n", see ParosSerialSensor.writeSerial()
+  while (SerialPort.available()) {
+    char c = SerialPort.read();
+    if (c == '\r' || c == '\n') {
+      if (commandLength > 0) {
+        command[commandLength] = '\0';
+        runCommand(command);
+        commandLength = 0;
+      }
+    } else if (commandLength < sizeof(command) - 1) {
+      command[commandLength++] = c;
+    }
+  }
+}
+
+void runCommand(const char *cmd)
+{
+  if (cmd[0] == 'B') {
+    // Binary records, at the given sample rate if there is one (4 to 1000)
+    int rate = atoi(cmd + 1);
+    if (rate > 0) {
+      imu.setSampleRate(rate);
+    }
+    binaryMode = true;
+  } else if (cmd[0] == 'A') {
+    imu.setSampleRate(BOOT_SAMPLE_RATE);
+    binaryMode = false;
+  }
+}
+
+void sendIMURecord(void)
+{
+  uint8_t record[RECORD_SIZE + 2];
+  putUint32(record, 0, imu.time);
+  putUint16(record, 4, (int16_t) imu.ax);
+  putUint16(record, 6, (int16_t) imu.ay);
+  putUint16(record, 8, (int16_t) imu.az);
+  putUint16(record, 10, (int16_t) imu.gx);
+  putUint16(record, 12, (int16_t) imu.gy);
+  putUint16(record, 14, (int16_t) imu.gz);
+
+  uint16_t crc = crc16(record, RECORD_SIZE);
+  record[RECORD_SIZE] = crc >> 8;
+  record[RECORD_SIZE + 1] = crc & 0xFF;
+
+  uint8_t frame[FRAME_SIZE];
+  size_t length = cobsEncode(record, sizeof(record), frame);
+  frame[length++] = 0;
+  SerialPort.write(frame, length);
+}
+
+void putUint32(uint8_t *out, size_t offset, uint32_t value)
+{
+  for (int i = 0; i < 4; i++) {
+    out[offset + i] = (value >> (8 * i)) & 0xFF;
+  }
+}
+
+void putUint16(uint8_t *out, size_t offset, uint16_t value)
+{
+  out[offset] = value & 0xFF;
+  out[offset + 1] = value >> 8;
+}
+
+uint16_t crc16(const uint8_t *data, size_t length)
+{
+  // CRC-16/CCITT, what binascii.crc_hqx(data, 0xFFFF) computes
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t) data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+size_t cobsEncode(const uint8_t *data, size_t length, uint8_t *out)
+{
+  // Each zero is replaced by the distance to the next one, the first byte
+  // is the distance to the first. Records are shorter than 254 bytes, so
+  // there are never 0xFF blocks to split
+  size_t codeIndex = 0;
+  size_t outIndex = 1;
+  uint8_t code = 1;
+  for (size_t i = 0; i < length; i++) {
+    if (data[i] == 0) {
+      out[codeIndex] = code;
+      codeIndex = outIndex++;
+      code = 1;
+    } else {
+      out[outIndex++] = data[i];
+      code++;
+    }
+  }
+  out[codeIndex] = code;
+  return outIndex;
+}
@@ -0,0 +1,54 @@
+import gzip
+
+class ArchiveReader:
+
+    KEEP_SIZE = 64 * 1024  # bytes kept behind the read position for short backward seeks
+
+    def __init__(self, path):
+        # Instance Vars
+        self.path = path
+        self.file = gzip.open(path, 'rb')
+        self.window = bytearray()  # decompressed bytes from window_start up to where the gzip stream is
+        self.window_start = 0
+        self.pos = 0
+
+    # File-like seek/read over the uncompressed hour. A gzip stream can only be
+    # read forward, so the bytes just behind the read position are kept around
+    # for TailReader, which seeks back to the end of the last complete line on
+    # every read. Only seeking further back starts decompressing from the top
+
+    def seek(self, pos):
+        self.pos = pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size):
+        if self.pos < self.window_start:
+            self.file.close()
+            self.file = gzip.open(self.path, 'rb')
+            self.window = bytearray()
+            self.window_start = 0
+
+        # Drop what is too far behind the read position
+        keep_start = max(self.window_start, self.pos - self.KEEP_SIZE)
+        window_end = self.window_start + len(self.window)
+        if keep_start >= window_end:
+            self.file.seek(keep_start)
+            self.window = bytearray()
+            self.window_start = keep_start
+        elif keep_start > self.window_start:
+            del self.window[:keep_start - self.window_start]
+            self.window_start = keep_start
+
+        window_end = self.window_start + len(self.window)
+        if self.pos + size > window_end:
+            self.window += self.file.read(self.pos + size - window_end)
+
+        start = self.pos - self.window_start
+        data = bytes(self.window[start:start + size])
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,64 @@
+import logging
+
+class BatchController:
+
+    LIVE = "live"  # at the live edge, small batches every loop period
+    CATCHUP = "catchup"  # behind, large back to back batches
+
+    MIN_LINES = 100  # never shrink a batch below this many lines
+
+    def __init__(self, name, live_lines, max_lines, max_bytes, target_latency):
+        # Instance Vars
+        self.name = name  # used in log messages
+        self.live_lines = live_lines  # batch size at the live edge
+        self.max_lines = max_lines  # largest catch-up batch
+        self.max_bytes = max_bytes  # largest catch-up payload
+        self.target_latency = target_latency  # seconds a write may take before batches shrink
+
+        self.state = self.LIVE
+        self.batch_lines = live_lines  # current catch-up batch size
+        self.slow_start = True  # double the batch until the first sign of congestion
+        self.errors = 0  # failed writes since startup
+
+    def nextSize(self, bytes_per_line):
+        # Number of lines to read for the next batch
+        if self.state == self.LIVE:
+            return self.live_lines
+
+        return max(1, min(self.batch_lines, self.max_bytes // max(1, bytes_per_line)))
+
+    def update(self, behind):
+        # behind is True when the data being read is from a completed hour
+        # or the last read filled the whole batch
+        new_state = self.CATCHUP if behind else self.LIVE
+        if new_state == self.state:
+            return
+
+        if new_state == self.CATCHUP:
+            logging.info(f"{self.name} is behind, switching to catch-up uploads")
+            self.batch_lines = self.live_lines
+            self.slow_start = True
+        else:
+            logging.info(f"{self.name} reached the live edge")
+
+        self.state = new_state
+
+    def recordSuccess(self, num_lines, latency):
+        # Additive increase, multiplicative decrease on the catch-up batch size
+        if self.state != self.CATCHUP:
+            return
+
+        if latency > self.target_latency:
+            self.batch_lines = max(self.MIN_LINES, self.batch_lines // 2)
+            self.slow_start = False
+        elif num_lines >= self.batch_lines:
+            if self.slow_start:
+                self.batch_lines *= 2
+            else:
+                self.batch_lines += self.live_lines
+            self.batch_lines = min(self.batch_lines, self.max_lines)
+
+    def recordFailure(self):
+        self.errors += 1
+        self.batch_lines = max(self.MIN_LINES, self.batch_lines // 2)
+        self.slow_start = False
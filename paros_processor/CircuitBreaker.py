@@ -0,0 +1,64 @@
+import time
+import random
+import logging
+import threading
+
+class CircuitBreaker:
+
+    CLOSED = "closed"  # InfluxDB is reachable, write normally
+    OPEN = "open"  # InfluxDB is down, don't try until the backoff has passed
+    HALF_OPEN = "half-open"  # one trial write after the backoff
+
+    def __init__(self, failure_threshold, backoff_base, backoff_max):
+        # Instance Vars
+        self.failure_threshold = failure_threshold  # consecutive failures before opening
+        self.backoff_base = backoff_base  # seconds before the first retry
+        self.backoff_max = backoff_max  # longest wait between retries
+
+        self.state = self.CLOSED
+        self.failures = 0  # consecutive failed writes
+        self.retry_time = 0  # monotonic time of the next trial write
+        self.lock = threading.Lock()
+
+    def allowRequest(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() >= self.retry_time:
+                # Let a single write through to see if InfluxDB is back
+                self.state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def isWaiting(self):
+        # True while backing off and the next trial write is not due yet
+        return self.state == self.OPEN and time.monotonic() < self.retry_time
+
+    def recordSuccess(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logging.info("Conenction to InfluxDB restored")
+
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def recordFailure(self, e):
+        with self.lock:
+            self.failures += 1
+
+            if self.state == self.CLOSED and self.failures < self.failure_threshold:
+                return
+
+            if self.state == self.CLOSED:
+                logging.error(f"Connection to InfluxDB Lost: {e}")
+
+            # Exponential backoff with full jitter so boxes that lost the
+            # same server don't all come back at the same moment
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - self.failure_threshold))
+            delay = random.uniform(0, backoff)
+            logging.debug(f"Next InfluxDB retry in {delay:.1f} s")
+
+            self.state = self.OPEN
+            self.retry_time = time.monotonic() + delay
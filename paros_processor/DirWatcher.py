@@ -0,0 +1,94 @@
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+class DirWatcher:
+
+    # inotify event masks from <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+    def __init__(self):
+        # Instance Vars
+        self.fd = -1  # inotify file descriptor, -1 if inotify is not available
+        self.watches = {}  # watch descriptor -> name given to watch()
+
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            self.fd = -1
+
+        if self.fd < 0:
+            logging.warning("inotify is not available, falling back to the loop timer")
+
+    def available(self):
+        return self.fd >= 0
+
+    def watch(self, name, path):
+        # Wake up when a file in path is appended to or created
+        if not self.available():
+            return
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.IN_MODIFY | self.IN_CREATE | self.IN_MOVED_TO)
+        if wd < 0:
+            logging.warning(f"Unable to watch {path}: {os.strerror(ctypes.get_errno())}")
+            return
+
+        self.watches[wd] = name
+
+    def wait(self, timeout):
+        # Blocks until something changes or timeout seconds pass. Returns a dict
+        # of name -> list of files created, with an entry for every watched
+        # directory that changed (everything after a queue overflow)
+        if not self.available():
+            return {}
+
+        ready,_,_ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return {}
+
+        changes = {}
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+
+            pos = 0
+            while pos < len(data):
+                wd,mask,cookie,name_len = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                file_name = data[pos:pos + name_len].rstrip(b"\0").decode()
+                pos += name_len
+
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were lost, treat everything as changed
+                    for name in self.watches.values():
+                        changes.setdefault(name, [])
+                    continue
+
+                name = self.watches.get(wd)
+                if name is None:
+                    continue
+
+                created = changes.setdefault(name, [])
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    created.append(file_name)
+
+        return changes
+
+    def close(self):
+        if self.available():
+            os.close(self.fd)
+            self.fd = -1
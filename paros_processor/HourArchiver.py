@@ -0,0 +1,96 @@
+import os
+import re
+import gzip
+import time
+import shutil
+import logging
+
+class HourArchiver:
+
+    HOUR_FILE_RE = re.compile(r'\d{4}-\d{2}-\d{2}-\d{2}')
+    ARCHIVE_SUFFIX = ".gz"
+
+    def __init__(self, data_loc, backup_loc, max_bytes, max_age_days, compress_level=6):
+        # Instance Vars
+        self.data_loc = data_loc  # hour files written by the samplers
+        self.backup_loc = backup_loc  # compressed hours, same <sensor>/<hour> layout
+        self.max_bytes = max_bytes  # remove the oldest archives beyond this total size
+        self.max_age_days = max_age_days  # remove archives of hours older than this
+        self.compress_level = compress_level
+
+        os.makedirs(self.backup_loc, exist_ok=True)
+
+    def archiveDir(self, sensor):
+        return os.path.join(self.backup_loc, sensor)
+
+    def archivePath(self, sensor, hour):
+        return os.path.join(self.archiveDir(sensor), hour + self.ARCHIVE_SUFFIX)
+
+    def archive(self, sensor, before_hour):
+        # Compress every hour file of sensor older than before_hour, which must
+        # be an hour the processor is done with, then remove the original
+        sensor_dir = os.path.join(self.data_loc, sensor)
+        try:
+            hours = sorted(name for name in os.listdir(sensor_dir) if self.HOUR_FILE_RE.fullmatch(name) and name < before_hour)
+        except FileNotFoundError:
+            return 0
+
+        for hour in hours:
+            self.__archiveHour(os.path.join(sensor_dir, hour), self.archivePath(sensor, hour))
+
+        return len(hours)
+
+    def enforceRetention(self):
+        # Age limit first, then the oldest hours go until the archive fits in max_bytes
+        archives = []  # (hour, path, size)
+        for sensor in os.listdir(self.backup_loc):
+            archive_dir = self.archiveDir(sensor)
+            if not os.path.isdir(archive_dir):
+                continue
+
+            for entry in os.scandir(archive_dir):
+                hour = entry.name[:-len(self.ARCHIVE_SUFFIX)]
+                if entry.name.endswith(self.ARCHIVE_SUFFIX) and self.HOUR_FILE_RE.fullmatch(hour):
+                    archives.append((hour, entry.path, entry.stat().st_size))
+
+        archives.sort()
+        oldest_hour = time.strftime('%Y-%m-%d-%H', time.gmtime(time.time() - self.max_age_days * 86400))
+        total_bytes = sum(size for hour,path,size in archives)
+
+        removed = 0
+        for hour,path,size in archives:
+            if hour >= oldest_hour and total_bytes <= self.max_bytes:
+                break
+
+            os.remove(path)
+            total_bytes -= size
+            removed += 1
+
+        if removed:
+            logging.info(f"Removed {removed} archived hours, {total_bytes / 1024 / 1024:.1f} MiB of archives left")
+
+        return removed
+
+    def __archiveHour(self, src_path, dst_path):
+        # The archive is complete and on disk before the original is removed,
+        # so a crash at any point leaves at least one full copy of the hour
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = dst_path + ".tmp"
+
+        with open(src_path, 'rb') as src, open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(os.path.basename(src_path), 'wb', self.compress_level, raw, mtime=0) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            raw.flush()
+            os.fsync(raw.fileno())
+            raw_size = src.tell()
+            archive_size = raw.tell()
+
+        os.replace(tmp_path, dst_path)
+        dir_fd = os.open(os.path.dirname(dst_path), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        os.remove(src_path)
+        logging.debug(f"Archived {src_path} to {dst_path}, {raw_size} -> {archive_size} bytes")
@@ -0,0 +1,65 @@
+import os
+import re
+import bisect
+import threading
+
+class HourIndex:
+
+    HOUR_FILE_RE = re.compile(r'\d{4}-\d{2}-\d{2}-\d{2}')
+
+    def __init__(self, sensor_dir, archive_dir=None):
+        # Instance Vars
+        self.sensor_dir = sensor_dir
+        self.archive_dir = archive_dir  # compressed hours, named <hour>.gz
+        self.hours = []  # sorted names of the hour files in sensor_dir and archive_dir
+        self.dir_mtimes = None  # mtimes of the directories when they were last listed
+        self.lock = threading.Lock()
+
+        self.refresh()
+
+    def refresh(self):
+        # Creating or removing a file changes the directory mtime, so the
+        # directories are only listed again when there is something new in them
+        dirs = [self.sensor_dir] if self.archive_dir is None else [self.sensor_dir, self.archive_dir]
+        dir_mtimes = tuple(self.__dirMtime(cur_dir) for cur_dir in dirs)
+        if dir_mtimes == self.dir_mtimes:
+            return
+
+        hours = set()
+        for cur_dir,dir_mtime in zip(dirs, dir_mtimes):
+            if dir_mtime is None:
+                continue
+            for name in os.listdir(cur_dir):
+                if name.endswith(".gz"):
+                    name = name[:-3]
+                if self.HOUR_FILE_RE.fullmatch(name):
+                    hours.add(name)
+
+        with self.lock:
+            self.hours = sorted(hours)
+            self.dir_mtimes = dir_mtimes
+
+    def add(self, hour):
+        # Record a new hour file without listing the directory
+        with self.lock:
+            i = bisect.bisect_left(self.hours, hour)
+            if i == len(self.hours) or self.hours[i] != hour:
+                self.hours.insert(i, hour)
+
+    def nextHour(self, hour, live_hour):
+        # The first hour after hour that has a file. Hours without files are
+        # skipped, but never past live_hour since its file may not exist yet
+        self.refresh()
+
+        with self.lock:
+            i = bisect.bisect_right(self.hours, hour)
+            if i < len(self.hours) and self.hours[i] < live_hour:
+                return self.hours[i]
+
+        return live_hour
+
+    def __dirMtime(self, cur_dir):
+        try:
+            return os.stat(cur_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,410 @@
+import math
+import gzip
+import datetime
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from ParosRecordFormat import ParosRecordFormat
+from LineProtocolTemplate import LineProtocolTemplate
+
+class HourQC:
+
+    # Health of one sensor's hour file: sample rate and interval jitter,
+    # gaps, lines that could not be used, value ranges and outliers, and the
+    # drift between the host clock and a device clock field like baro_time.
+    # The file is read CHUNK_BYTES at a time and every chunk is reduced with
+    # numpy, so memory stays the same however long the hour is. Text lines
+    # are taken apart a whole column at a time from where their "=" are,
+    # binary records are mapped straight into arrays
+
+    CHUNK_BYTES = 8 * 1024 * 1024  # read from the hour file at a time
+    GAP_FACTOR = 5  # an interval this many times the usual one is a gap
+    OUTLIER_MADS = 10  # values further than this many MADs from their chunk's median are outliers
+    MIN_SPLIT_BYTES = 64 * 1024  # lines with a bad one in them are parsed one at a time below this
+    MAX_VALUE_SIZE = 64  # longest numeric field value in a text line
+    TIMESTAMP_SIZE = 19  # digits of a ns timestamp until the year 2286
+    ISOTIME_SIZE = 26  # "YYYY-MM-DDTHH:MM:SS.ffffff", see ParosTimeParser.toIso()
+    TIMESTAMP_POWERS = 10 ** np.arange(TIMESTAMP_SIZE - 1, -1, -1, dtype=np.int64)
+
+    # Values outside these ranges can't be real readings
+    FIELD_RANGES = {
+        "value": (0, 1200),  # barometers, in psia or hPa
+        "speed": (0, 75),  # Young 86000, m/s
+        "direction": (0, 360),
+        "accelX": (-8, 8),  # MPU9250 at setAccelFSR(8), g
+        "accelY": (-8, 8),
+        "accelZ": (-8, 8),
+        "gyroX": (-2000, 2000),  # MPU9250 at setGyroFSR(2000), dps
+        "gyroY": (-2000, 2000),
+        "gyroZ": (-2000, 2000),
+    }
+
+    def __init__(self, measurement):
+        # Instance Vars
+        self.measurement = measurement  # summaries are written to this measurement
+        self.templates = {}  # (sensor, result names) -> LineProtocolTemplate of the summary
+
+    def checkHour(self, path, hour):
+        # {name: value} for the hour file at path, plain or gzipped, where
+        # hour is its name. Values that don't apply to the hour are nan
+        hour_start = datetime.datetime.strptime(hour, '%Y-%m-%d-%H').replace(tzinfo=datetime.UTC)
+        stats = {
+            "hour_start_ns": int(hour_start.timestamp()) * 1000000000,
+            "samples": 0,
+            "rejected": 0,  # lines or records that could not be used
+            "first_ns": None,
+            "last_ns": None,
+            "interval_ns": None,  # median interval of the first chunk, the usual one
+            "intervals": 0,  # intervals that were not gaps
+            "deviation_sumsq": 0.0,  # of those intervals from the usual one, ns^2
+            "max_interval_ns": 0,
+            "gaps": 0,
+            "gap_ns": 0,  # time missing in the gaps
+            "backwards": 0,  # timestamps before the one of the sample before
+            "fields": {},  # name -> [count, min, max, sum, sum of squares, outliers, out of range]
+            "clocks": {},  # device clock field -> sums for the fit of host minus device time
+        }
+
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as f:
+            head = f.read(self.CHUNK_BYTES)
+            try:
+                record_format = ParosRecordFormat.fromHeader(head)
+            except EOFError:
+                # The sampler has only just created the file
+                return self.__results(stats)
+
+            if record_format is None:
+                self.__readLines(f, head, stats)
+            else:
+                self.__readRecords(f, head, record_format, stats)
+
+        return self.__results(stats)
+
+    def summaryLine(self, sensor, results, timestamp_ns):
+        # One line protocol line of results, tagged with the sensor id
+        names = tuple(results)
+        key = (sensor, names)
+        if key not in self.templates:
+            self.templates[key] = LineProtocolTemplate(self.measurement, {"id": sensor}, [(name, float) for name in names])
+        line = self.templates[key].serialize([float(value) for value in results.values()], timestamp_ns)
+        return f"{line}\n".encode() if line else b""
+
+    def __readRecords(self, f, head, record_format, stats):
+        # Fixed width records after the header, a record cut off at the end
+        # of the file is one rejected record
+        dtype = np.dtype([("timestamp", "<i8")] + [(name, "<f8" if kind == "float" else "<i8") for name, kind in record_format.fields])
+        data = head[record_format.header_size:]
+        rest = b""
+        while data:
+            if rest:
+                data = rest + data
+            num_records = len(data) // dtype.itemsize
+            records = np.frombuffer(data, dtype, count=num_records)
+            values = {name: records[name] for name, kind in record_format.fields if kind == "float"}
+            clocks = {name: records[name] * 1000 for name, kind in record_format.fields if kind == "isotime"}
+            self.__addChunk(stats, records["timestamp"], values, clocks)
+
+            rest = data[num_records * dtype.itemsize:]
+            data = f.read(self.CHUNK_BYTES)
+
+        if rest:
+            stats["rejected"] += 1
+
+    def __readLines(self, f, data, stats):
+        # Complete lines a chunk at a time. A line cut off at the end of the
+        # file, or one too long to be line protocol, is one rejected line
+        layout = None
+        rest = b""
+        while data:
+            if rest:
+                data = rest + data
+            end = data.rfind(b"\n") + 1
+            if not end:
+                if len(data) > self.CHUNK_BYTES:
+                    stats["rejected"] += 1
+                    data = b""
+                rest = data
+                data = f.read(self.CHUNK_BYTES)
+                continue
+
+            lines = memoryview(data)[:end]
+            if layout is None:
+                layout = self.__findLayout(data[:end])
+            if layout is None:
+                stats["rejected"] += data.count(b"\n", 0, end)
+            else:
+                timestamps,values,clocks,rejected = self.__parseLines(lines, layout)
+                stats["rejected"] += rejected
+                self.__addChunk(stats, timestamps, values, clocks)
+
+            rest = data[end:]
+            data = f.read(self.CHUNK_BYTES)
+
+        if rest:
+            stats["rejected"] += 1
+
+    def __findLayout(self, lines):
+        # Layout of the first line that can be taken apart: its prefix, the
+        # number of "=" in the prefix and (key, kind) of every field, where
+        # kind is "float", "isotime" for a device clock like baro_time or
+        # "string" for anything else, which is skipped
+        for line in lines.split(b"\n"):
+            fields = self.__splitLine(line)
+            if fields is None:
+                continue
+
+            prefix = line[:line.index(b" ") + 1]
+            kinds = []
+            for key, value in fields[1]:
+                if not value.startswith(b'"'):
+                    kind = "float"
+                elif len(value) == self.ISOTIME_SIZE + 2 and self.__isIsotime(value[1:-1]):
+                    kind = "isotime"
+                else:
+                    kind = "string"
+                kinds.append((key, kind))
+            return prefix, prefix.count(b"="), tuple(kinds)
+        return None
+
+    def __parseLines(self, lines, layout):
+        # (timestamps, {float field: values}, {clock field: ns}, rejected) of
+        # complete lines. Every line of an hour file normally has the same
+        # layout, so field values sit between the same "=" and the comma
+        # before the next key on every line. If any line doesn't, the lines
+        # are split in half until the halves without it parse that way, and
+        # the few lines around it are parsed one at a time
+        try:
+            return self.__parseColumns(lines, layout) + (0,)
+        except ValueError:
+            if len(lines) <= self.MIN_SPLIT_BYTES:
+                return self.__parseEachLine(lines, layout)
+
+        middle = bytes(lines[:len(lines) // 2]).rfind(b"\n") + 1
+        if not middle:
+            return self.__parseEachLine(lines, layout)
+        first = self.__parseLines(lines[:middle], layout)
+        second = self.__parseLines(lines[middle:], layout)
+        return (
+            np.concatenate((first[0], second[0])),
+            {key: np.concatenate((column, second[1][key])) for key, column in first[1].items()},
+            {key: np.concatenate((column, second[2][key])) for key, column in first[2].items()},
+            first[3] + second[3],
+        )
+
+    def __parseColumns(self, lines, layout):
+        # Raises ValueError if the lines don't all have the layout
+        prefix,prefix_equals,fields = layout
+        data = np.frombuffer(lines, np.uint8)
+        line_ends = np.flatnonzero(data == ord("\n"))
+        num_lines = len(line_ends)
+        equals = np.flatnonzero(data == ord("="))
+        if len(equals) != num_lines * (prefix_equals + len(fields)):
+            raise ValueError("Lines with other fields")
+        equals = equals.reshape(num_lines, -1)[:, prefix_equals:]
+
+        # Rows of the next width bytes from any position
+        width = max(len(prefix), self.MAX_VALUE_SIZE, self.ISOTIME_SIZE, self.TIMESTAMP_SIZE)
+        windows = sliding_window_view(np.concatenate((data, np.zeros(width, np.uint8))), width)
+
+        line_starts = np.r_[0, line_ends[:-1] + 1]
+        if not (windows[line_starts, :len(prefix)] == np.frombuffer(prefix, np.uint8)).all():
+            raise ValueError("Lines with another prefix")
+
+        timestamp_starts = line_ends - self.TIMESTAMP_SIZE
+        digits = windows[timestamp_starts, :self.TIMESTAMP_SIZE] - np.uint8(ord("0"))
+        if (digits > 9).any() or (data[timestamp_starts - 1] != ord(" ")).any():
+            raise ValueError("Lines without a timestamp")
+        timestamps = digits.astype(np.int64) @ self.TIMESTAMP_POWERS
+
+        values = {}
+        clocks = {}
+        for i, (key, kind) in enumerate(fields):
+            starts = equals[:, i] + 1
+            if i + 1 < len(fields):
+                ends = equals[:, i + 1] - len(fields[i + 1][0]) - 1
+                separator = ord(",")
+            else:
+                ends = timestamp_starts - 1
+                separator = ord(" ")
+            if (data[ends] != separator).any():
+                raise ValueError("Lines with other fields")
+
+            sizes = ends - starts
+            if kind == "float":
+                size = int(sizes.max())
+                if size > self.MAX_VALUE_SIZE or sizes.min() < 1:
+                    raise ValueError("Values that are not numbers")
+                # Zero padded values read as fixed width byte strings
+                column = windows[starts, :size].copy()
+                column[np.arange(size) >= sizes[:, None]] = 0
+                values[key] = column.view(f"S{size}").ravel().astype(np.float64)
+            elif kind == "isotime":
+                if (sizes != self.ISOTIME_SIZE + 2).any():
+                    raise ValueError("Clock fields that are not times")
+                column = np.ascontiguousarray(windows[starts + 1, :self.ISOTIME_SIZE])
+                clocks[key] = column.view(f"S{self.ISOTIME_SIZE}").ravel().astype("datetime64[ns]").astype(np.int64)
+
+        return timestamps, values, clocks
+
+    def __parseEachLine(self, lines, layout):
+        # Slow path for a chunk with lines that are cut off, run together or
+        # missing a field dropped as nan. Those lines are rejected
+        prefix,prefix_equals,fields = layout
+        keys = tuple(key for key, kind in fields)
+        timestamps = []
+        rows = []
+        rejected = 0
+        for line in bytes(lines).split(b"\n")[:-1]:
+            split = self.__splitLine(line) if line.startswith(prefix) else None
+            if split is None or tuple(key for key, value in split[1]) != keys:
+                rejected += 1
+                continue
+
+            try:
+                row = []
+                for (key, kind), (name, value) in zip(fields, split[1]):
+                    if kind == "float":
+                        row.append(float(value))
+                    elif kind == "isotime":
+                        row.append(np.datetime64(value[1:-1].decode(), "ns").astype(np.int64))
+                rows.append(row)
+                timestamps.append(split[0])
+            except ValueError:
+                rejected += 1
+
+        columns = list(zip(*rows)) if rows else [()] * len(fields)
+        values = {}
+        clocks = {}
+        parsed = [(key, kind) for key, kind in fields if kind != "string"]
+        for (key, kind), column in zip(parsed, columns):
+            if kind == "float":
+                values[key] = np.array(column, np.float64)
+            else:
+                clocks[key] = np.array(column, np.int64)
+        return np.array(timestamps, np.int64), values, clocks, rejected
+
+    def __splitLine(self, line):
+        # (timestamp, [(key, raw value), ...]) of one line, None if it can't
+        # be split. String values are quoted and may hold spaces or commas
+        fields = []
+        try:
+            field_set,timestamp = line.split(b" ", 1)[1].rsplit(b" ", 1)
+            i = 0
+            while i < len(field_set):
+                eq = field_set.index(b"=", i)
+                if field_set[eq + 1:eq + 2] == b'"':
+                    # Skip to the closing quote, past escaped ones
+                    end = eq + 2
+                    while field_set[end:end + 1] != b'"':
+                        end += 2 if field_set[end:end + 1] == b"\\" else 1
+                        if end >= len(field_set):
+                            return None
+                    end += 1
+                else:
+                    end = field_set.find(b",", eq)
+                    end = len(field_set) if end < 0 else end
+                fields.append((field_set[i:eq].decode(), field_set[eq + 1:end]))
+                i = end + 1
+            return int(timestamp), fields
+        except (UnicodeDecodeError, IndexError, ValueError):
+            return None
+
+    def __isIsotime(self, value):
+        try:
+            np.datetime64(value.decode(), "us")
+        except (UnicodeDecodeError, ValueError):
+            return False
+        return True
+
+    def __addChunk(self, stats, timestamps, values, clocks):
+        # Adds the samples of one chunk to the hour's totals
+        if not len(timestamps):
+            return
+
+        stats["samples"] += len(timestamps)
+        if stats["first_ns"] is None:
+            stats["first_ns"] = int(timestamps[0])
+            intervals = np.diff(timestamps)
+        else:
+            intervals = np.diff(timestamps, prepend=stats["last_ns"])
+        stats["last_ns"] = int(timestamps[-1])
+
+        if stats["interval_ns"] is None and (intervals > 0).any():
+            stats["interval_ns"] = int(np.median(intervals[intervals > 0]))
+
+        usual = stats["interval_ns"]
+        if usual is not None and len(intervals):
+            gaps = intervals > self.GAP_FACTOR * usual
+            steady = intervals[~gaps]
+            stats["gaps"] += int(gaps.sum())
+            stats["gap_ns"] += int((intervals[gaps] - usual).sum())
+            stats["intervals"] += len(steady)
+            stats["deviation_sumsq"] += float(np.square((steady - usual).astype(np.float64)).sum())
+            stats["max_interval_ns"] = max(stats["max_interval_ns"], int(intervals.max()))
+            stats["backwards"] += int((intervals < 0).sum())
+
+        for name, column in values.items():
+            column = column[np.isfinite(column)]
+            field = stats["fields"].setdefault(name, [0, math.inf, -math.inf, 0.0, 0.0, 0, 0])
+            if not len(column):
+                continue
+
+            # Outliers against the chunk's own median, robust to the outliers themselves
+            median = np.median(column)
+            deviations = np.abs(column - median)
+            mad = np.median(deviations)
+            outliers = int((deviations > self.OUTLIER_MADS * 1.4826 * mad).sum()) if mad > 0 else 0
+
+            low,high = self.FIELD_RANGES.get(name, (-math.inf, math.inf))
+            field[0] += len(column)
+            field[1] = min(field[1], float(column.min()))
+            field[2] = max(field[2], float(column.max()))
+            field[3] += float(column.sum())
+            field[4] += float(np.square(column).sum())
+            field[5] += outliers
+            field[6] += int(((column < low) | (column > high)).sum())
+
+        for name, device_ns in clocks.items():
+            # Host minus device time in ms against seconds into the hour
+            x = (timestamps - stats["hour_start_ns"]) / 1e9
+            y = (timestamps - device_ns) / 1e6
+            sums = stats["clocks"].setdefault(name, np.zeros(6))
+            sums += (len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum(), (y * y).sum())
+
+    def __results(self, stats):
+        nan = math.nan
+        samples = stats["samples"]
+        usual = stats["interval_ns"]
+        span_ns = stats["last_ns"] - stats["first_ns"] if samples > 1 else 0
+
+        results = {
+            "samples": samples,
+            "rejected_lines": stats["rejected"],
+            "rate_hz": (samples - 1) / (span_ns / 1e9) if span_ns > 0 else nan,
+            "interval_ms": usual / 1e6 if usual else nan,
+            "jitter_ms": math.sqrt(stats["deviation_sumsq"] / stats["intervals"]) / 1e6 if stats["intervals"] else nan,
+            "max_interval_ms": stats["max_interval_ns"] / 1e6 if usual else nan,
+            "gaps": stats["gaps"],
+            "gap_seconds": stats["gap_ns"] / 1e9,
+            "backwards": stats["backwards"],
+            "coverage": min(1.0, samples * usual / 3.6e12) if usual else nan,
+        }
+
+        for name, (count, low, high, total, total_sq, outliers, out_of_range) in stats["fields"].items():
+            mean = total / count if count else nan
+            results[f"{name}_min"] = low if count else nan
+            results[f"{name}_max"] = high if count else nan
+            results[f"{name}_mean"] = mean
+            results[f"{name}_std"] = math.sqrt(max(0.0, total_sq / count - mean * mean)) if count else nan
+            results[f"{name}_outliers"] = outliers
+            results[f"{name}_out_of_range"] = out_of_range
+
+        for name, (n, sx, sy, sxx, sxy, syy) in stats["clocks"].items():
+            # Least squares slope in ms per s, 1 ms/s is 1000 ppm
+            mean = sy / n
+            spread = n * sxx - sx * sx
+            results[f"{name}_offset_ms"] = mean
+            results[f"{name}_offset_std_ms"] = math.sqrt(max(0.0, syy / n - mean * mean))
+            results[f"{name}_drift_ppm"] = (n * sxy - sx * sy) / spread * 1000 if spread > 0 else nan
+
+        return results
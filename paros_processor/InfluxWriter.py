@@ -0,0 +1,121 @@
+import gzip
+import time
+import logging
+import threading
+import urllib3
+from urllib.parse import urlencode
+
+class InfluxWriter:
+
+    TIMEOUT = 10  # seconds per request, same as the influxdb_client default
+    # Replies about the batch itself: malformed lines, too large, wrong field
+    # types. /api/v2/write writes none of the batch then, so it is split in
+    # half and sent again until only the lines InfluxDB refuses are left.
+    # 401, 403 and 404 are about the token or bucket and 429 and 5xx about
+    # the server, those are retried like a connection error
+    SPLIT_STATUSES = (400, 413, 422)
+    TOO_LARGE = 413
+
+    def __init__(self, influx_url, influx_token, influx_org, influx_bucket, compress=True, compress_level=6, pool_size=4):
+        # Instance Vars
+        self.influx_org = influx_org
+        self.influx_bucket = influx_bucket
+        self.compress = compress  # gzip the request body
+        self.compress_level = compress_level
+
+        # Requests go straight to the /api/v2/write endpoint. influxdb_client
+        # can't take an already compressed body through its write api, and
+        # importing it costs the processor ~0.4 s of startup for one call.
+        # Same settings as its client: no retries, certificates verified
+        query = urlencode({"org": influx_org, "bucket": influx_bucket, "precision": "ns"})
+        self.write_url = f"{influx_url.rstrip('/')}/api/v2/write?{query}"
+        self.headers = {
+            "Authorization": f"Token {influx_token}",
+            "Content-Type": "text/plain; charset=utf-8"
+        }
+        self.http = urllib3.PoolManager(maxsize=pool_size, retries=False, timeout=self.TIMEOUT)
+
+        # Traffic stats since the last report
+        self.lock = threading.Lock()
+        self.stats_start = time.monotonic()
+        self.requests = 0
+        self.lines = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.rejected_lines = 0  # lines InfluxDB refused on their own since starting, never reset
+
+    def write(self, output_lp, num_lines):
+        # Same as post() for line protocol that isn't encoded yet
+        return self.post(self.encode(output_lp), num_lines, len(output_lp))
+
+    def encode(self, output_lp):
+        # Request body for the line protocol, compressed if enabled
+        if self.compress:
+            return gzip.compress(output_lp, compresslevel=self.compress_level, mtime=0)
+        return output_lp
+
+    def post(self, body, num_lines, raw_size, compressed=None):
+        # Sends a body from encode(). Returns (lines InfluxDB refused, True if
+        # the batch was too large and went out in parts). Every other line
+        # has been written once this returns, and it raises if the write
+        # should be retried later
+        if compressed is None:
+            compressed = self.compress
+
+        response = self.http.request(
+            "POST",
+            self.write_url,
+            body=body,
+            headers={**self.headers, "Content-Encoding": "gzip" if compressed else "identity"}
+        )
+        if response.status in self.SPLIT_STATUSES:
+            output_lp = gzip.decompress(body) if compressed else body
+            return self.__postSplit(output_lp, response)
+        if not 200 <= response.status < 300:
+            raise ConnectionError(f"InfluxDB write failed with HTTP {response.status}: {response.data[:200].decode(errors='replace')}")
+
+        with self.lock:
+            self.requests += 1
+            self.lines += num_lines
+            self.raw_bytes += raw_size
+            self.sent_bytes += len(body)
+        return 0, False
+
+    def __postSplit(self, output_lp, response):
+        # Sends the halves of a batch InfluxDB refused as a whole. A single
+        # line it still refuses can never be written and is dropped
+        lines = output_lp.splitlines(keepends=True)
+        too_large = response.status == self.TOO_LARGE
+        reply = response.data[:200].decode(errors='replace')
+        if len(lines) == 1:
+            logging.error(f"InfluxDB refused a line with HTTP {response.status}, dropped it: {reply} {output_lp[:200]}")
+            with self.lock:
+                self.rejected_lines += 1
+            return 1, too_large
+
+        logging.warning(f"InfluxDB refused a batch of {len(lines)} lines with HTTP {response.status}, sending it in halves: {reply}")
+        rejected = 0
+        half = len(lines) // 2
+        for part in (lines[:half], lines[half:]):
+            part_lp = b"".join(part)
+            part_rejected,part_too_large = self.post(self.encode(part_lp), len(part), len(part_lp))
+            rejected += part_rejected
+            too_large = too_large or part_too_large
+        return rejected, too_large
+
+    def logStats(self):
+        # Summarize the traffic since the last call, used to size the uplink
+        with self.lock:
+            elapsed = time.monotonic() - self.stats_start
+            requests,lines,raw_bytes,sent_bytes = self.requests,self.lines,self.raw_bytes,self.sent_bytes
+            self.stats_start = time.monotonic()
+            self.requests = self.lines = self.raw_bytes = self.sent_bytes = 0
+
+        if not requests:
+            return
+
+        logging.info(
+            f"Uploaded {lines} lines in {requests} requests over {elapsed:.0f} s: "
+            f"{requests / elapsed:.2f} requests/sec, {sent_bytes / elapsed / 1024:.1f} KiB/sec sent, "
+            f"compression ratio {raw_bytes / sent_bytes:.2f}"
+        )
@@ -0,0 +1,162 @@
+import re
+import numpy as np
+from LineProtocolTemplate import LineProtocolTemplate
+
+class LiveSummarizer:
+
+    # Reduces a sensor's full-rate line protocol to one mean/min/max/count
+    # point per period for every numeric field. Points are reduced in bulk
+    # with numpy, only the summary lines are formatted one by one. The last
+    # period read may still be getting samples, so it is carried over to the
+    # next batch instead of being sent
+
+    def __init__(self, measurement, period_ns):
+        # Instance Vars
+        self.measurement = measurement  # measurement the summaries are written to
+        self.period_ns = period_ns  # length of each summary period
+        self.layouts = {}  # field keys of a line -> (regex, numeric field names)
+        self.templates = {}  # (sensor, numeric field names) -> LineProtocolTemplate of the summary
+        self.carry = {}  # sensor -> (timestamps, values, field names) of the period still being filled
+        self.carry_start = {}  # sensor -> where the read that started the carried period began
+
+    def add(self, sensor, output_lp, read_start):
+        # Returns the summary lines of every period that is complete.
+        # read_start is where this batch was read from, see resumePoint()
+        timestamps,values,names = self.__parse(output_lp)
+        if not len(timestamps):
+            return b""
+
+        out = b""
+        carried = self.carry.get(sensor)
+        if carried is not None and carried[2] == names:
+            carried_lines = len(carried[0])
+            timestamps = np.concatenate((carried[0], timestamps))
+            values = np.concatenate((carried[1], values))
+        else:
+            # The sensor's fields changed, e.g. a different driver
+            carried_lines = 0
+            out = self.flush(sensor)
+
+        # Everything but the last period is complete, lines are in time order
+        periods = timestamps // self.period_ns
+        last_start = int(np.searchsorted(periods, periods[-1]))
+        if last_start >= carried_lines:
+            self.carry_start[sensor] = read_start
+        self.carry[sensor] = (timestamps[last_start:], values[last_start:], names)
+
+        if last_start == 0:
+            return out
+        return out + self.__summarize(sensor, timestamps[:last_start], values[:last_start], names)
+
+    def flush(self, sensor):
+        # Summary of the carried period, e.g. once its hour file is complete
+        carried = self.carry.pop(sensor, None)
+        self.carry_start.pop(sensor, None)
+        if carried is None:
+            return b""
+        return self.__summarize(sensor, *carried)
+
+    def flushStale(self, sensor, before_ns):
+        # Summary of the carried period if it ended before before_ns, for a
+        # sensor that stopped sending
+        carried = self.carry.get(sensor)
+        if carried is None or (carried[0][0] // self.period_ns + 1) * self.period_ns > before_ns:
+            return b""
+        return self.flush(sensor)
+
+    def reset(self, sensor):
+        # Forget the carried period, it is read again from resumePoint()
+        self.carry.pop(sensor, None)
+        self.carry_start.pop(sensor, None)
+
+    def resumePoint(self, sensor, read_end):
+        # Where reading has to resume after a restart so the carried period
+        # is rebuilt. Periods before it in the same read are sent again, to
+        # the same series and timestamps, so they overwrite themselves
+        return self.carry_start.get(sensor, read_end)
+
+    def __summarize(self, sensor, timestamps, values, names):
+        # One line per period
+        periods = timestamps // self.period_ns
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        counts = np.diff(np.r_[starts, len(periods)])
+        means = np.add.reduceat(values, starts, axis=0) / counts[:, None]
+        mins = np.minimum.reduceat(values, starts, axis=0)
+        maxs = np.maximum.reduceat(values, starts, axis=0)
+        period_ns = periods[starts] * self.period_ns
+
+        template = self.__template(sensor, names)
+        rows = np.column_stack((counts, means, mins, maxs)).tolist()
+        return "".join(
+            f"{template.serialize(row, timestamp_ns)}\n" for row, timestamp_ns in zip(rows, period_ns.tolist())
+        ).encode()
+
+    def __template(self, sensor, names):
+        # Fields in the order of the columns in __summarize()
+        key = (sensor, names)
+        if key not in self.templates:
+            fields = [("count", float)]
+            for suffix in ("mean", "min", "max"):
+                fields.extend((f"{name}_{suffix}", float) for name in names)
+            self.templates[key] = LineProtocolTemplate(self.measurement, {"id": sensor}, fields)
+        return self.templates[key]
+
+    def __parse(self, output_lp):
+        # (timestamps, values, numeric field names) of the lines that have
+        # every numeric field of the first line. A field dropped as nan or
+        # a line with other fields leaves that line out of the summary
+        first_line = output_lp[:output_lp.find(b"\n")] if b"\n" in output_lp else output_lp
+        layout = self.__layout(first_line)
+        if layout is None or not layout[1]:
+            return np.empty(0, np.int64), np.empty((0, 0)), ()
+
+        regex,names = layout
+        matches = regex.findall(output_lp)
+        if not matches:
+            return np.empty(0, np.int64), np.empty((0, len(names))), names
+
+        columns = np.array(matches)
+        return columns[:, -1].astype(np.int64), columns[:, :-1].astype(np.float64), names
+
+    def __layout(self, line):
+        # Regex capturing the numeric fields and the timestamp of lines with
+        # the same fields as this one, one match per line
+        fields = self.__fields(line)
+        if fields is None:
+            return None
+        if fields in self.layouts:
+            return self.layouts[fields]
+
+        names = tuple(key for key, numeric in fields if numeric)
+        pattern = rb"^[^ ]+ "
+        for name in names:
+            pattern += rb"(?:[^\n]*?,)?" + re.escape(name.encode()) + rb"=([^,\s\"]+)"
+        pattern += rb"[^\n]* (\d+)$"
+        self.layouts[fields] = (re.compile(pattern, re.MULTILINE), names)
+        return self.layouts[fields]
+
+    def __fields(self, line):
+        # ((key, numeric), ...) of one line, None if it can't be split.
+        # String values are quoted and may hold spaces or commas
+        fields = []
+        try:
+            field_set = line.decode().split(" ", 1)[1].rsplit(" ", 1)[0]
+            i = 0
+            while i < len(field_set):
+                eq = field_set.index("=", i)
+                key = field_set[i:eq]
+                if field_set[eq + 1:eq + 2] == '"':
+                    # Skip to the closing quote, past escaped ones
+                    end = eq + 2
+                    while field_set[end] != '"':
+                        end += 2 if field_set[end] == "\\" else 1
+                    fields.append((key, False))
+                    i = end + 2
+                else:
+                    end = field_set.find(",", eq)
+                    end = len(field_set) if end < 0 else end
+                    fields.append((key, True))
+                    i = end + 1
+        except (UnicodeDecodeError, IndexError, ValueError):
+            return None
+        return tuple(fields)
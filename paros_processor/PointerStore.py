@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import pickle
+import logging
+import threading
+
+class PointerStore:
+
+    def __init__(self, path, checkpoint_interval, legacy_path=None, stage_timer=None):
+        # Instance Vars
+        self.path = path  # JSON checkpoint file
+        self.checkpoint_interval = checkpoint_interval  # seconds between checkpoints, 0 writes on every update
+        self.pointers = {}  # sensor_id -> [hour, offset], always the live state
+        self.dirty = False  # True when pointers differ from the last checkpoint
+        self.last_checkpoint = time.monotonic()
+        self.checkpoint_count = 0  # number of checkpoint files written
+        self.lock = threading.Lock()  # sensors may update pointers from several threads
+        self.checkpoint_lock = threading.Lock()  # one checkpoint file write at a time
+        self.stage_timer = stage_timer  # ParosStageTimer that checkpoint writes are added to as "pointer"
+
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as f:
+                self.pointers = json.load(f)['pointers']
+        elif legacy_path is not None and os.path.isfile(legacy_path) and os.path.getsize(legacy_path) > 0:
+            # Carry over the pointers from the old pickle file
+            with open(legacy_path, 'rb') as f:
+                self.pointers = {sensor_id: list(pointer) for sensor_id, pointer in pickle.load(f).items()}
+            logging.info(f"Migrated {len(self.pointers)} pointers from {legacy_path} to {self.path}")
+            self.checkpoint(force=True)
+
+    def get(self, sensor_id=None):
+        # If a sensor_id is requested, send only that. Otherwise, send the whole dict
+        if sensor_id is None:
+            return self.pointers
+        return self.pointers.get(sensor_id)
+
+    def set(self, sensor_id, hour, offset):
+        with self.lock:
+            self.pointers[sensor_id] = [hour, offset]
+            self.dirty = True
+        logging.debug(f"Updated pointer for sensor {sensor_id} with values hour={hour} and offset={offset}")
+
+        self.checkpoint()
+
+    def checkpoint(self, force=False):
+        # Pointers only reach the disk every checkpoint_interval seconds. After a
+        # crash the processor resumes from the last checkpoint, so at most
+        # checkpoint_interval seconds of uploads are sent to InfluxDB again.
+        # Those points have the same series and timestamp so they overwrite
+        # themselves rather than creating duplicates
+        with self.checkpoint_lock:
+            if not self.dirty and not force:
+                return
+
+            if not force and time.monotonic() - self.last_checkpoint < self.checkpoint_interval:
+                return
+
+            # Write a complete copy next to the checkpoint and rename it over the
+            # old one, so a power cut leaves either the old or the new file
+            write_start_ns = time.perf_counter_ns()
+            with self.lock:
+                state = json.dumps({'pointers': self.pointers})
+                self.dirty = False
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(state)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            # persist the rename itself
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+            self.last_checkpoint = time.monotonic()
+            self.checkpoint_count += 1
+            if self.stage_timer is not None:
+                self.stage_timer.add("pointer", time.perf_counter_ns() - write_start_ns)
+
+    def close(self):
+        self.checkpoint(force=self.dirty)
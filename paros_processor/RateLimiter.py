@@ -0,0 +1,28 @@
+import time
+import threading
+
+class RateLimiter:
+
+    # Token bucket in bytes. A request larger than what is in the bucket is
+    # let through and the debt is paid off by the requests after it, so no
+    # request ever has to be split
+
+    def __init__(self, rate, burst):
+        # Instance Vars
+        self.rate = rate  # bytes/sec on average
+        self.burst = burst  # most bytes sent back to back after being idle
+        self.tokens = burst
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()  # uploads may run on several threads
+
+    def wait(self, size):
+        # Blocks until size bytes may be sent
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+            delay = max(0, -self.tokens) / self.rate
+            self.tokens -= size
+
+        if delay > 0:
+            time.sleep(delay)
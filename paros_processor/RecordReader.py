@@ -0,0 +1,32 @@
+import logging
+
+class RecordReader:
+
+    def __init__(self, record_format):
+        # Instance Vars
+        self.record_format = record_format  # ParosRecordFormat from the file header
+
+    def readFile(self, f, offset, max_lines):
+        # Same as TailReader.readFile for an hour file of fixed width records.
+        # Offsets are still bytes into the file, so pointers, archives and
+        # resends work the same for both formats
+        header_size = self.record_format.header_size
+        record_size = self.record_format.record_size
+
+        start = max(offset, header_size)
+        misaligned = (start - header_size) % record_size
+        if misaligned:
+            start -= misaligned
+            logging.warning(f"Pointer was not at the start of a record, moved back to offset {start}")
+
+        f.seek(start)
+        buf = f.read(max_lines * record_size)
+
+        # A record still being written is left for the next read
+        num_records = len(buf) // record_size
+        if not num_records:
+            return b"", offset, 0
+
+        end = num_records * record_size
+        output_lp,num_lines = self.record_format.render(memoryview(buf)[:end])
+        return output_lp, start + end, num_lines
@@ -0,0 +1,153 @@
+import logging
+from ParosRecordFormat import ParosRecordFormat
+from .ArchiveReader import ArchiveReader
+from .RecordReader import RecordReader
+
+class TailReader:
+
+    MAX_BLOCK_SIZE = 8 * 1024 * 1024  # Largest single read from an hour file
+    RESYNC_SIZE = 64 * 1024  # How far back to look for the start of a line
+    HEADER_READ_SIZE = 64 * 1024  # Most bytes read when checking for a record header
+
+    def __init__(self, prefix):
+        # Instance Vars
+        self.prefix = prefix  # every valid line starts with these bytes
+        self.line_size = 256  # running estimate of bytes per line, sizes the reads
+        self.archive = None  # ArchiveReader of the archived hour being read
+        self.cur_path = None  # hour file the format below was detected for
+        self.records = None  # RecordReader if cur_path holds binary records, None for line protocol
+
+    def read(self, path, offset, max_lines):
+        # Returns (line protocol bytes, new offset, number of lines) for at most
+        # max_lines complete lines starting at offset. A trailing line that is
+        # still being written is left for the next read
+        self.closeArchive()
+        with open(path, 'rb', buffering=0) as f:
+            return self.__readPath(f, path, offset, max_lines)
+
+    def readArchive(self, path, offset, max_lines):
+        # Same as read() for an archived hour. Offsets are in the uncompressed
+        # hour, and the archive stays open so reading it batch by batch
+        # decompresses it once
+        if self.archive is None or self.archive.path != path:
+            self.closeArchive()
+            self.archive = ArchiveReader(path)
+
+        return self.__readPath(self.archive, path, offset, max_lines)
+
+    def closeArchive(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def __readPath(self, f, path, offset, max_lines):
+        # Samplers can store an hour as line protocol or as binary records,
+        # the start of the file tells which
+        if path != self.cur_path:
+            f.seek(0)
+            try:
+                record_format = ParosRecordFormat.fromHeader(f.read(self.HEADER_READ_SIZE))
+            except EOFError:
+                # The sampler has only just created the file
+                return b"", offset, 0
+
+            self.cur_path = path
+            self.records = RecordReader(record_format) if record_format else None
+
+        if self.records is None:
+            return self.readFile(f, offset, max_lines)
+
+        output_lp,new_offset,num_lines = self.records.readFile(f, offset, max_lines)
+        if num_lines:
+            # Batch sizes are worked out from the size of the rendered lines
+            self.line_size = max(64, len(output_lp) // num_lines + 1)
+
+        return output_lp, new_offset, num_lines
+
+    def readFile(self, f, offset, max_lines):
+        block_size = min(self.MAX_BLOCK_SIZE, max_lines * self.line_size + 4096)
+        f.seek(offset)
+        buf = f.read(block_size)
+
+        if not buf:
+            return b"", offset, 0
+
+        if offset > 0 and not buf.startswith(self.prefix):
+            # The offset is not at the start of a line, go back to where
+            # the line starts and send it in full
+            start = max(0, offset - self.RESYNC_SIZE)
+            f.seek(start)
+            before = f.read(offset - start)
+            if not before.endswith(b"\n"):
+                offset = start + before.rfind(b"\n") + 1
+                logging.warning(f"Pointer was not at the start of a line, moved back to offset {offset}")
+                f.seek(offset)
+                buf = f.read(block_size)
+
+        end = buf.rfind(b"\n") + 1
+        if end == 0 and len(buf) == block_size < self.MAX_BLOCK_SIZE:
+            # The first line did not fit in the estimated block size
+            f.seek(offset)
+            buf = f.read(self.MAX_BLOCK_SIZE)
+            block_size = self.MAX_BLOCK_SIZE
+            end = buf.rfind(b"\n") + 1
+
+        if end == 0:
+            if len(buf) == block_size:
+                # A single line larger than the block can't be valid line protocol
+                skipped = self.__skipLine(f, offset)
+                logging.warning(f"Skipped {skipped - offset} bytes without a newline at offset {offset}")
+                return b"", skipped, 0
+
+            # Only a partial line so far
+            return b"", offset, 0
+
+        num_lines = buf.count(b"\n", 0, end)
+        if num_lines > max_lines:
+            # Walk to the last allowed newline from whichever side is closer
+            if num_lines - max_lines < max_lines:
+                for i in range(num_lines - max_lines):
+                    end = buf.rfind(b"\n", 0, end - 1) + 1
+            else:
+                end = 0
+                for i in range(max_lines):
+                    end = buf.find(b"\n", end) + 1
+            num_lines = max_lines
+
+        # keep the read size in line with the lines actually being written
+        self.line_size = max(64, end // num_lines + 1)
+
+        new_offset = offset + end
+        if end != len(buf):
+            buf = buf[:end]
+
+        # Every line should start with the prefix. Counting prefixes after
+        # newlines checks the whole batch without looping over the lines
+        if not buf.startswith(self.prefix) or buf.count(b"\n" + self.prefix) != num_lines - 1:
+            buf, num_lines = self.__dropInvalidLines(buf, offset)
+
+        return buf, new_offset, num_lines
+
+    def __dropInvalidLines(self, buf, offset):
+        all_lines = buf.split(b"\n")[:-1]
+        lines = [line for line in all_lines if line.startswith(self.prefix)]
+        logging.warning(f"Dropped {len(all_lines) - len(lines)} invalid lines after offset {offset}")
+
+        if not lines:
+            return b"", 0
+
+        lines.append(b"")
+        return b"\n".join(lines), len(lines) - 1
+
+    def __skipLine(self, f, offset):
+        f.seek(offset)
+        while True:
+            block = f.read(self.MAX_BLOCK_SIZE)
+            if not block:
+                return offset
+
+            newline = block.find(b"\n")
+            if newline != -1:
+                return offset + newline + 1
+
+            offset += len(block)
@@ -0,0 +1,56 @@
+import os
+import logging
+import threading
+import persistqueue
+
+class UploadSpool:
+
+    def __init__(self, path, max_bytes):
+        # Instance Vars
+        self.path = path  # directory of the on-disk queue
+        self.max_bytes = max_bytes  # stop staging once the queue is this large
+
+        os.makedirs(self.path, exist_ok=True)
+
+        # Batches are only removed once they are acked, anything taken but not
+        # acked before a crash is handed out again on the next start
+        self.queue = persistqueue.SQLiteAckQueue(self.path, multithreading=True)
+        self.pending = self.queue.qsize()  # batches put and not acked yet
+        self.lock = threading.Lock()  # put() and ack() run on the upload pool's threads
+
+        if self.pending:
+            logging.info(f"Found {self.pending} spooled batches in {self.path}")
+
+    def hasRoom(self):
+        return self.__diskUsage() < self.max_bytes
+
+    def put(self, body, num_lines, raw_size, compressed):
+        # body is the request body from InfluxWriter.encode(), ready to be posted
+        self.queue.put({"body": body, "num_lines": num_lines, "raw_size": raw_size, "compressed": compressed})
+        with self.lock:
+            self.pending += 1
+
+    def get(self):
+        # Returns the oldest batch or None if the spool is empty
+        try:
+            return self.queue.get(block=False)
+        except persistqueue.Empty:
+            return None
+
+    def ack(self, item):
+        self.queue.ack(item)
+        with self.lock:
+            self.pending = max(0, self.pending - 1)
+            drained = not self.pending
+
+        if drained:
+            # Give the space back to the SD card
+            self.queue.clear_acked_data(max_delete=None, keep_latest=None)
+            self.queue.shrink_disk_usage()
+
+    def nack(self, item):
+        # Put the batch back at the head of the queue
+        self.queue.nack(item)
+
+    def __diskUsage(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
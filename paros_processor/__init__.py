@@ -0,0 +1,26 @@
+# paros_processor/__init__.py
+
+import os
+import sys
+
+# Sample formats are shared with the samplers, which import each other by bare
+# module name from paros_sensors
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "paros_sensors"))
+
+# Helpers used by processor.py
+from .PointerStore import PointerStore
+from .TailReader import TailReader
+from .InfluxWriter import InfluxWriter
+from .BatchController import BatchController
+from .HourIndex import HourIndex
+from .DirWatcher import DirWatcher
+from .CircuitBreaker import CircuitBreaker
+from .UploadSpool import UploadSpool
+from .ArchiveReader import ArchiveReader
+from .HourArchiver import HourArchiver
+from .RecordReader import RecordReader
+from .RateLimiter import RateLimiter
+
+# LiveSummarizer needs numpy and is only imported by processor.py in tiered
+# upload mode, so the other modes start without it. HourQC needs numpy too
+# and is only imported by qc.py
@@ -0,0 +1,104 @@
+import os
+import time
+import logging
+import threading
+import collections
+
+class FramePipeline:
+
+    STATS_PERIOD = 600  # seconds between queue statistics in the log
+    READER_NICE = -10  # priority boost for the reader thread, needs CAP_SYS_NICE
+
+    def __init__(self, name, read_fn, capacity, timeout):
+        # Instance Vars
+        self.name = name  # used in log messages
+        self.read_fn = read_fn  # returns a list of (frame, timestamp_ns) or None on a timeout
+        self.capacity = capacity  # most frames waiting for the writer
+        self.timeout = timeout  # seconds without frames before get() returns None
+
+        # deque append and popleft are atomic, so the reader never waits on
+        # the writer. The event only wakes the writer up
+        self.frames = collections.deque()
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.error = None  # exception that stopped the reader
+
+        # Queue statistics
+        self.received = 0  # frames read since start
+        self.dropped = 0  # frames lost because the queue was full
+        self.high_water = 0  # most frames ever waiting
+        self.next_stats_time = time.monotonic() + self.STATS_PERIOD
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.__readLoop, name=f"{self.name}-reader", daemon=True)
+        self.thread.start()
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self):
+        # The reader finishes its current read, at most a port timeout
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def get(self):
+        # Everything the reader has queued, or None if nothing arrived
+        # within the timeout
+        deadline = time.monotonic() + self.timeout
+        while not self.frames and self.error is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.ready.wait(remaining)
+            self.ready.clear()
+
+        if self.error is not None:
+            raise self.error
+
+        batch = []
+        while self.frames:
+            batch.append(self.frames.popleft())
+
+        if time.monotonic() >= self.next_stats_time:
+            self.logStats()
+
+        return batch or None
+
+    def logStats(self):
+        self.next_stats_time = time.monotonic() + self.STATS_PERIOD
+        log = logging.warning if self.dropped else logging.info
+        log(
+            f"{self.name} frame queue: {self.received} frames received, {self.dropped} dropped, "
+            f"high water {self.high_water}/{self.capacity}"
+        )
+
+    def __readLoop(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.READER_NICE)
+        except (OSError, AttributeError):
+            logging.debug(f"Unable to raise the priority of the {self.name} reader thread")
+
+        try:
+            while not self.stop_event.is_set():
+                timed_frames = self.read_fn()
+                if not timed_frames:
+                    continue
+
+                self.received += len(timed_frames)
+                room = self.capacity - len(self.frames)
+                if room < len(timed_frames):
+                    # The writer is stalled. Keep what is already queued in
+                    # order and drop the newest frames
+                    self.dropped += len(timed_frames) - max(0, room)
+                    timed_frames = timed_frames[:max(0, room)]
+
+                self.frames.extend(timed_frames)
+                self.high_water = max(self.high_water, len(self.frames))
+                self.ready.set()
+        except Exception as e:
+            self.error = e
+            self.ready.set()
@@ -0,0 +1,74 @@
+import math
+
+# Same escaping rules used by influxdb_client.Point
+_ESCAPE_MEASUREMENT = str.maketrans({
+    ',': r'\,',
+    ' ': r'\ ',
+    '\n': r'\n',
+    '\t': r'\t',
+    '\r': r'\r',
+})
+
+_ESCAPE_KEY = str.maketrans({
+    ',': r'\,',
+    '=': r'\=',
+    ' ': r'\ ',
+    '\n': r'\n',
+    '\t': r'\t',
+    '\r': r'\r',
+})
+
+_ESCAPE_STRING = str.maketrans({
+    '"': r'\"',
+    '\\': r'\\',
+})
+
+class LineProtocolTemplate:
+
+    def __init__(self, measurement, tags, fields):
+        # The measurement, tags and field names of a sensor never change, so the
+        # line prefix and the field keys are escaped once here. fields is a list
+        # of (name, type) pairs in the order values are passed to serialize()
+        tag_str = ""
+        for tag_key, tag_value in sorted(tags.items()):
+            tag = str(tag_key).translate(_ESCAPE_KEY)
+            value = str(tag_value).translate(_ESCAPE_KEY)
+            if value.endswith('\\'):
+                value += ' '
+            if tag != '' and value != '':
+                tag_str += f",{tag}={value}"
+
+        self.prefix = f"{str(measurement).translate(_ESCAPE_MEASUREMENT)}{tag_str} "
+
+        # Point writes fields sorted by name, keep track of where each value goes
+        self.order = sorted(range(len(fields)), key=lambda i: fields[i][0])
+        self.keys = [f"{str(fields[i][0]).translate(_ESCAPE_KEY)}=" for i in self.order]
+        self.types = [fields[i][1] for i in self.order]
+        self.in_order = self.order == list(range(len(fields)))
+
+        for field_type in self.types:
+            if field_type not in (float, str):
+                raise ValueError(f"Unsupported field type {field_type}")
+
+    def serialize(self, values, timestamp_ns):
+        if not self.in_order:
+            values = [values[i] for i in self.order]
+
+        field_strs = []
+        for key, field_type, value in zip(self.keys, self.types, values):
+            if field_type is float:
+                s = repr(float(value))
+                if s.endswith('.0'):
+                    s = s[:-2]
+                elif not math.isfinite(value):
+                    # Point silently drops nan and inf
+                    continue
+                field_strs.append(key + s)
+            else:
+                field_strs.append(f'{key}"{value.translate(_ESCAPE_STRING)}"')
+
+        if not field_strs:
+            # Point serializes a sample without fields to an empty string
+            return ""
+
+        return f"{self.prefix}{','.join(field_strs)} {timestamp_ns}"
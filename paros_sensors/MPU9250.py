@@ -1,8 +1,7 @@
 import serial
 import os
-import influxdb_client
 from ParosSerialSensor import ParosSerialSensor
-from ParosSensor import ParosSensor
+from MPUFrameDecoder import MPUFrameDecoder
 import pathlib
 from dotenv import load_dotenv
 import argparse
@@ -13,6 +12,18 @@ import logging
 
 class MPU9250(ParosSerialSensor):
 
+    sampleFields = (
+        ("imu_time", float),
+        ("accelX", float),
+        ("accelY", float),
+        ("accelZ", float),
+        ("gyroX", float),
+        ("gyroY", float),
+        ("gyroZ", float)
+    )
+    imuFormat = "text"  # "binary" switches the ESP32 to COBS framed records once it is up
+    imuBinaryRate = 500  # binary mode: IMU samples/sec, 115200 baud carries up to 576
+
     def __init__(self, box_id, sensor_id, data_loc, device_file, modePin):
         # Enable IMU mode on the ESP32
         GPIO.setmode(GPIO.BOARD)
@@ -52,8 +63,36 @@ class MPU9250(ParosSerialSensor):
             i += 1
 
         self.box_id = box_id
+        self.decoder = None  # MPUFrameDecoder in binary mode
+
+        if os.getenv("PAROS_IMU_FORMAT", self.imuFormat) == "binary":
+            self.__startBinary(int(os.getenv("PAROS_IMU_RATE", self.imuBinaryRate)), bootup_limit)
+
+    @classmethod
+    def fromConfig(cls, box_id, sensor_id, data_loc, args):
+        # args as written in sensor_configs: "<device> <mode gpio pin>"
+        device_file, mode_pin = args.split()
+        return cls(box_id, sensor_id, data_loc, device_file, int(mode_pin))
+
+    def __startBinary(self, rate, bootup_limit):
+        # The ESP32 always boots sending text. The lines already on their
+        # way run into the first binary frame and fail its CRC, so wait for
+        # a frame that checks out
+        self.decoder = MPUFrameDecoder()
+        self.frameTerminator = MPUFrameDecoder.FRAME_END
+        super().writeSerial(f"B{rate}")
+
+        for i in range(bootup_limit):
+            frames = super().readFrames()
+            if frames and self.decoder.decodeFrames([(frame, 0) for frame in frames])[0]:
+                logging.info(f"ESP32 sending binary records at {rate}/s")
+                return
+
+        logging.critical("ESP32 did not switch to binary records")
+        exit(1)
 
     def samplingLoop(self):
+        self._startSampling()
 
         # count failures
         fail_count = 0
@@ -62,35 +101,39 @@ class MPU9250(ParosSerialSensor):
             try:
                 if fail_count > 10:
                     logging.critical("Stopping due to too many data failures")
-                    self.stopSampling()
+                    self.closeSamples()
                     exit(1)
 
-                strIn = super().readSerial()
+                frames = super().nextFrames()
 
-                if strIn is None:
+                if frames is None:
+                    # nothing before the timeout
                     fail_count += 1
                     continue
 
-                in_parts = strIn.strip().split(",")
-
-                # Validation
-                if len(in_parts) != 7:
-                    fail_count += 1
+                if self.decoder is not None:
+                    # Binary records, decoded together
+                    samples,failures = self.decoder.decodeFrames(frames)
+                    fail_count += failures
+                    self.parse_failures += failures
+                    for sample, timestamp_ns in samples:
+                        self.addSample(sample, timestamp_ns)
                     continue
 
-                p = influxdb_client.Point(self.box_id)
-                p.field("imu_time", float(in_parts[0]))
-                p.field("accelX", float(in_parts[1]))
-                p.field("accelY", float(in_parts[2]))
-                p.field("accelZ", float(in_parts[3]))
-                p.field("gyroX", float(in_parts[4]))
-                p.field("gyroY", float(in_parts[5]))
-                p.field("gyroZ", float(in_parts[6]))
+                for frame, timestamp_ns in frames:
+                    in_parts = frame.strip().split(b",")
+
+                    # Validation
+                    if len(in_parts) != 7:
+                        fail_count += 1
+                        self.parse_failures += 1
+                        continue
 
-                ParosSensor.addSample(self, p)
+                    self.addSample([float(part) for part in in_parts], timestamp_ns)
 
             except KeyboardInterrupt:
                 logging.info("Stopping sampling")
+                self.closeSamples()
                 GPIO.cleanup()
                 exit(0)
 
@@ -0,0 +1,94 @@
+import struct
+import binascii
+
+class MPUFrameDecoder:
+
+    # Binary frames from firmware/MPU9250.ino: a little-endian record of
+    # imu.time in ms and the raw accelerometer and gyroscope counts, then
+    # the CRC-16/CCITT of the record big-endian, COBS encoded and ended with
+    # a zero byte. COBS leaves no zero bytes inside a frame, so whatever
+    # happens to one frame the next zero byte starts a good one
+    FRAME_END = b"\x00"
+    RECORD = struct.Struct("<I6h")  # time, accel x/y/z, gyro x/y/z
+    FRAME_SIZE = RECORD.size + 3  # COBS code byte, record and CRC
+    CRC_INIT = 0xFFFF  # the CRC of a record followed by its CRC is 0
+
+    # Counts per unit at the full scale ranges set in the firmware, the
+    # same numbers the SparkFun library's calcAccel() and calcGyro() use
+    ACCEL_SENS = 4096.0  # per g at setAccelFSR(8)
+    GYRO_SENS = 16.4  # per dps at setGyroFSR(2000)
+
+    # A decoded frame in place: the first code byte, zeroed, then the
+    # record, then the CRC
+    DECODED_FRAME = struct.Struct("<xI6h2x")
+
+    def decodeFrames(self, timed_frames):
+        # timed_frames are (frame, timestamp_ns) with the FRAME_END taken
+        # off. Returns ([(sample, timestamp_ns), ...], number of bad frames)
+        records = self.__decodeAll(timed_frames)
+        failures = 0
+        if records is None:
+            failures = len(timed_frames)
+            records,timed_frames = self.__decodeEach(timed_frames)
+            failures -= len(records)
+
+        accel = self.ACCEL_SENS
+        gyro = self.GYRO_SENS
+        samples = [
+            ((float(imu_time), ax / accel, ay / accel, az / accel, gx / gyro, gy / gyro, gz / gyro), timestamp_ns)
+            for (imu_time, ax, ay, az, gx, gy, gz), (frame, timestamp_ns) in zip(records, timed_frames)
+        ]
+        return samples, failures
+
+    def __decodeAll(self, timed_frames):
+        # Every frame decoded in one buffer, None unless all of them are
+        # good. Each code byte is the distance to the next zero COBS took
+        # out, frames are shorter than 254 bytes so every code but a frame's
+        # first stands for a zero. The first is zeroed too and skipped by
+        # DECODED_FRAME, so one walk over the buffer decodes every frame and
+        # ends on the last byte only if all the codes add up
+        size = self.FRAME_SIZE
+        buffer = bytearray(b"".join([frame for frame, timestamp_ns in timed_frames]))
+        end = len(buffer)
+        if end != size * len(timed_frames):
+            return None
+
+        i = 0
+        while i < end:
+            code = buffer[i]
+            buffer[i] = 0
+            i += code
+
+        view = memoryview(buffer)
+        crc_hqx = binascii.crc_hqx
+        if i != end or any([crc_hqx(view[start:start + size - 1], self.CRC_INIT) for start in range(1, end, size)]):
+            return None
+        return list(self.DECODED_FRAME.iter_unpack(buffer))
+
+    def __decodeEach(self, timed_frames):
+        # (records, their timed frames) of the frames that are good, after
+        # one was cut off, run together with another or corrupted
+        records = []
+        good_frames = []
+        for timed_frame in timed_frames:
+            record = self.__decode(timed_frame[0])
+            if record is not None:
+                records.append(record)
+                good_frames.append(timed_frame)
+        return records, good_frames
+
+    def __decode(self, frame):
+        # One frame's record, or None
+        if len(frame) != self.FRAME_SIZE:
+            return None
+
+        buffer = bytearray(frame)
+        i = 0
+        while i < len(buffer):
+            code = buffer[i]
+            buffer[i] = 0
+            i += code
+
+        if i != len(buffer) or binascii.crc_hqx(buffer[1:], self.CRC_INIT) != 0:
+            return None
+        return self.DECODED_FRAME.unpack(buffer)
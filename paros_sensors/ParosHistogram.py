@@ -0,0 +1,17 @@
+import bisect
+
+class ParosHistogram:
+
+    # Bucket counts for a Prometheus histogram, see ParosMetrics.addHistogram()
+
+    def __init__(self, buckets):
+        # Instance Vars
+        self.buckets = buckets  # upper bounds, sorted
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
@@ -0,0 +1,153 @@
+import os
+import time
+import zlib
+import logging
+from ParosRecordFormat import ParosRecordFormat
+
+class ParosHourWriter:
+
+    FSYNC_POLICIES = ("never", "rotate", "flush")
+    NS_PER_HOUR = 3600 * 1000000000
+
+    def __init__(self, sensor_dir, max_samples, max_seconds, fsync_policy="rotate", header=b"", peek_size=0):
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync_policy}, expected one of {self.FSYNC_POLICIES}")
+
+        # Instance Vars
+        self.sensor_dir = sensor_dir
+        self.max_samples = max_samples  # flush once this many lines are buffered
+        self.max_seconds = max_seconds  # flush once the oldest buffered line is this old
+        self.fsync_policy = fsync_policy
+        self.header = header  # written at the start of new hour files
+        self.peek_size = peek_size  # bytes of an existing hour file kept in file_start
+
+        self.cur_hour = None  # hours since epoch of the open file
+        self.cur_file = None  # long-lived handle to the current hour file
+        self.cur_path = None  # path of the current hour file
+        self.file_start = b""  # first bytes of the current hour file, tells which format it is in
+        self.buffer = []  # encoded samples waiting to be written
+        self.buffer_start = 0  # monotonic time of the oldest buffered line
+
+    def rotate(self, timestamp_ns):
+        # Hour files are named after the UTC hour of the samples they hold, so
+        # anything buffered for the previous hour has to land before switching.
+        # Returns True if a different hour file was opened
+        sample_hour = timestamp_ns // self.NS_PER_HOUR
+        if sample_hour == self.cur_hour:
+            return False
+
+        self.__rotate(sample_hour)
+        return True
+
+    def write(self, data, timestamp_ns):
+        # data is one encoded sample
+        self.rotate(timestamp_ns)
+
+        if not self.buffer:
+            self.buffer_start = time.monotonic()
+
+        self.buffer.append(data)
+
+        if len(self.buffer) >= self.max_samples:
+            self.flush()
+        else:
+            self.flushIfDue()
+
+    def flushIfDue(self):
+        # Flushes once the oldest buffered line is max_seconds old. Also
+        # called without a new sample, so a sensor that went quiet doesn't
+        # keep its last samples in memory
+        if self.buffer and time.monotonic() - self.buffer_start >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer or self.cur_file is None:
+            return
+
+        # Only whole samples are ever written so the processor never
+        # sees half of a sample at the end of the file
+        data = b"".join(self.buffer)
+        self.__writeAll(data)
+        self.buffer = []
+
+        if self.fsync_policy == "flush":
+            os.fsync(self.cur_file.fileno())
+
+    def close(self):
+        if self.cur_file is None:
+            return
+
+        self.__closeFile()
+        self.cur_hour = None
+
+    def divert(self):
+        # Sends the rest of the hour to <hour file>.<crc of the header>, for
+        # when the hour file can't take these samples. The processor only
+        # uploads files named after the hour, so these are kept but not sent.
+        # Returns the new path
+        path = self.cur_path.split(".", 1)[0] + f".{zlib.crc32(self.header):08x}"
+        self.__closeFile()
+        self.__open(path)
+        return path
+
+    def __closeFile(self):
+        self.flush()
+        if self.fsync_policy != "never":
+            os.fsync(self.cur_file.fileno())
+
+        self.cur_file.close()
+        self.cur_file = None
+
+    def __rotate(self, sample_hour):
+        self.close()
+
+        file_name = time.strftime('%Y-%m-%d-%H', time.gmtime(sample_hour * 3600))
+        self.__open(os.path.join(self.sensor_dir, file_name))
+        self.cur_hour = sample_hour
+
+    def __open(self, cur_data_file):
+        # unbuffered binary handle, each flush is exactly one append
+        self.cur_file = open(cur_data_file, "ab", buffering=0)
+        self.cur_path = cur_data_file
+
+        if self.cur_file.tell() == 0:
+            self.__writeAll(self.header)
+            self.file_start = self.header
+        else:
+            # Appending to an hour that was started before a restart
+            with open(cur_data_file, "rb") as f:
+                self.file_start = f.read(self.peek_size)
+                f.seek(-1, os.SEEK_END)
+                last_byte = f.read(1)
+
+            # A line or record cut off by a power loss would run into the
+            # first new one, so only that one is lost
+            if self.file_start.startswith(ParosRecordFormat.MAGIC):
+                self.__dropPartialRecord(cur_data_file)
+            elif last_byte != b"\n":
+                logging.warning(f"{cur_data_file} ends in a partial line, starting a new line")
+                self.__writeAll(b"\n")
+
+        logging.debug(f"Writing samples to {cur_data_file}")
+
+    def __dropPartialRecord(self, cur_data_file):
+        # Records are only found by their offset, so a partial one has to go
+        try:
+            record_format = ParosRecordFormat.fromHeader(self.file_start)
+        except EOFError:
+            return
+        if record_format is None:
+            return
+
+        size = self.cur_file.tell()
+        partial = (size - record_format.header_size) % record_format.record_size
+        if partial and size > record_format.header_size:
+            logging.warning(f"{cur_data_file} ends in a partial record, dropped its {partial} bytes")
+            self.cur_file.truncate(size - partial)
+            self.cur_file.seek(0, os.SEEK_END)
+
+    def __writeAll(self, data):
+        view = memoryview(data)
+        while view:
+            written = self.cur_file.write(view)
+            view = view[written:]
@@ -0,0 +1,95 @@
+import os
+import logging
+import threading
+
+# Label values escape backslash, double quote and newline
+_ESCAPE_LABEL = str.maketrans({
+    '\\': r'\\',
+    '"': r'\"',
+    '\n': r'\n',
+})
+
+class ParosMetrics:
+
+    WRITE_PERIOD = 15  # seconds between textfile writes, node-exporter reads them on every scrape
+
+    def __init__(self, file_name, metrics_loc):
+        # Instance Vars
+        self.path = os.path.join(metrics_loc, file_name)
+        self.collectors = []  # called with this object on every write to add the current values
+        self.families = {}  # name -> (type, help, [lines]) while writing
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def fromEnv(cls, file_name):
+        # None unless PAROS_METRICS_LOCATION is set
+        metrics_loc = os.getenv("PAROS_METRICS_LOCATION")
+        if not metrics_loc:
+            return None
+        return cls(file_name, metrics_loc)
+
+    def addCollector(self, collect):
+        self.collectors.append(collect)
+
+    def start(self):
+        # Counters are plain ints updated by the code being measured, this
+        # thread only reads them, so measuring costs the hot paths nothing
+        # beyond the increments
+        self.thread = threading.Thread(target=self.__writeLoop, name="metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def add(self, name, metric_type, help_text, value, labels=None):
+        # Called from a collector
+        family = self.families.setdefault(name, (metric_type, help_text, []))
+        family[2].append(f"{name}{self.__labelStr(labels)} {self.__valueStr(value)}")
+
+    def addHistogram(self, name, help_text, histogram, labels=None):
+        family = self.families.setdefault(name, ("histogram", help_text, []))
+        labels = labels or {}
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + [float("inf")], histogram.counts):
+            cumulative += count
+            family[2].append(f"{name}_bucket{self.__labelStr(dict(labels, le=self.__valueStr(bound)))} {cumulative}")
+        family[2].append(f"{name}_sum{self.__labelStr(labels)} {self.__valueStr(histogram.sum)}")
+        family[2].append(f"{name}_count{self.__labelStr(labels)} {histogram.count}")
+
+    def write(self):
+        # Renders every collector and replaces the textfile in one rename, so
+        # node-exporter never reads half of it
+        self.families = {}
+        for collect in self.collectors:
+            collect(self)
+
+        out = []
+        for name, (metric_type, help_text, lines) in self.families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {metric_type}")
+            out.extend(lines)
+        self.families = {}
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(out) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def __writeLoop(self):
+        while not self.stop_event.wait(self.WRITE_PERIOD):
+            try:
+                self.write()
+            except Exception as e:
+                logging.warning(f"Unable to write metrics to {self.path}: {e}")
+
+    def __labelStr(self, labels):
+        if not labels:
+            return ""
+        escaped = (f'{key}="{str(value).translate(_ESCAPE_LABEL)}"' for key, value in labels.items())
+        return "{" + ",".join(escaped) + "}"
+
+    def __valueStr(self, value):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import signal
+import logging
+import datetime
+import threading
+import collections
+
+class ParosProfiler:
+
+    PROFILE_SECONDS = 60  # longest profiling window, a second signal stops it sooner
+    SAMPLE_INTERVAL = 0.01  # seconds between stack samples
+    PROFILE_LOCATION = "/tmp"  # where the stacks are written
+    TOP_FUNCTIONS = 10  # functions listed in the log when a profile is written
+
+    def __init__(self, name, profile_loc, profile_seconds):
+        # Instance Vars
+        self.name = name  # used in the file name and log messages
+        self.profile_loc = profile_loc
+        self.profile_seconds = profile_seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def fromEnv(cls, name):
+        return cls(
+            name,
+            os.getenv("PAROS_PROFILE_LOCATION", cls.PROFILE_LOCATION),
+            float(os.getenv("PAROS_PROFILE_SECONDS", cls.PROFILE_SECONDS))
+        )
+
+    def install(self):
+        # SIGUSR1 starts a profile and a second one stops it early, e.g.
+        # systemctl kill -s USR1 paros-processor. Only the main thread can
+        # set signal handlers
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+
+    def toggle(self):
+        # Sampling every thread's stack from a thread of its own costs the
+        # profiled code nothing but the GIL hand-offs, unlike cProfile which
+        # also only sees the thread that started it
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                self.stop_event.set()
+                return
+
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.__sampleLoop, name="profiler", daemon=True)
+            self.thread.start()
+
+    def __sampleLoop(self):
+        logging.info(f"Profiling {self.name} for up to {self.profile_seconds:g} s")
+        own_ident = threading.get_ident()
+        stacks = collections.Counter()  # (thread name, stack) -> samples
+        start = time.monotonic()
+        deadline = start + self.profile_seconds
+
+        while not self.stop_event.wait(self.SAMPLE_INTERVAL) and time.monotonic() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    stacks[(thread_names.get(ident, str(ident)), self.__stack(frame))] += 1
+
+        try:
+            self.__write(stacks, time.monotonic() - start)
+        except Exception as e:
+            logging.error(f"Unable to write the profile of {self.name}: {e}")
+
+    def __stack(self, frame):
+        # Outermost call first
+        calls = []
+        while frame is not None:
+            code = frame.f_code
+            calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return tuple(reversed(calls))
+
+    def __write(self, stacks, elapsed):
+        # One "thread;outer;...;inner count" line per stack, the folded
+        # format flamegraph.pl and speedscope read
+        os.makedirs(self.profile_loc, exist_ok=True)
+        file_time = datetime.datetime.now(datetime.UTC).strftime('%Y-%m-%d-%H%M%S')
+        path = os.path.join(self.profile_loc, f"{self.name}-{file_time}.folded")
+        with open(path, "w") as f:
+            for (thread_name, stack), count in stacks.most_common():
+                f.write(";".join((thread_name,) + stack) + f" {count}\n")
+
+        # Where the time went, by the function on top of each stack. Threads
+        # waiting on a port or a socket show up here too
+        total = sum(stacks.values())
+        leaves = collections.Counter()
+        for (thread_name, stack), count in stacks.items():
+            leaves[f"{thread_name}: {stack[-1]}"] += count
+        top = ", ".join(f"{leaf} {count * 100 / total:.1f}%" for leaf, count in leaves.most_common(self.TOP_FUNCTIONS))
+        logging.info(f"Profiled {self.name} for {elapsed:.1f} s, {total} samples written to {path}. Top: {top}")
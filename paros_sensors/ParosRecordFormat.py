@@ -0,0 +1,141 @@
+import json
+import math
+import struct
+import datetime
+from itertools import repeat
+from LineProtocolTemplate import LineProtocolTemplate
+
+class ParosRecordFormat:
+
+    MAGIC = b"PAROSREC"
+    VERSION = 1
+    KINDS = {
+        "float": "d",  # float64
+        "isotime": "q",  # ISO 8601 string field with microseconds, stored as int64 microseconds since epoch
+    }
+    HEADER_START = struct.Struct("<8sI")  # magic, length of the json description
+    EPOCH = datetime.datetime(1970, 1, 1)
+    ONE_US = datetime.timedelta(microseconds=1)
+
+    def __init__(self, measurement, tags, fields):
+        # fields is a list of (name, kind) pairs in the order values are passed
+        # to pack(). Every record is an int64 timestamp followed by the fields
+        # in that order, so records are fixed width and the file after the
+        # header can be mapped straight into an array
+        for name, kind in fields:
+            if kind not in self.KINDS:
+                raise ValueError(f"Unsupported record kind {kind} for field {name}")
+
+        # Instance Vars
+        self.measurement = measurement
+        self.tags = dict(tags)
+        self.fields = [(name, kind) for name, kind in fields]
+        self.struct = struct.Struct("<q" + "".join(self.KINDS[kind] for name, kind in self.fields))
+        self.record_size = self.struct.size
+        self.isotime_fields = [i for i, (name, kind) in enumerate(self.fields) if kind == "isotime"]
+        self.iso_seconds = {}  # rendered "YYYY-MM-DDTHH:MM:SS" by second, samples share seconds
+
+        # Line protocol is rendered exactly like the text format
+        self.template = LineProtocolTemplate(
+            measurement,
+            self.tags,
+            [(name, float if kind == "float" else str) for name, kind in self.fields]
+        )
+        field_fmts = []
+        for key, i in zip(self.template.keys, self.template.order):
+            value_fmt = "%s" if self.fields[i][1] == "float" else '"%s"'
+            field_fmts.append(key.replace("%", "%%") + value_fmt)
+        self.line_fmt = f"{self.template.prefix.replace('%', '%%')}{','.join(field_fmts)} %d\n"
+
+        # The header describes the records, the sampler and the processor
+        # only have to agree on this class
+        description = json.dumps({
+            "version": self.VERSION,
+            "measurement": self.measurement,
+            "tags": self.tags,
+            "fields": self.fields
+        }, sort_keys=True).encode()
+        header = self.HEADER_START.pack(self.MAGIC, len(description)) + description
+        self.header = header + b" " * (-len(header) % 8)  # records start 8 byte aligned
+        self.header_size = len(self.header)
+
+    @classmethod
+    def fromHeader(cls, data):
+        # Returns the format described by the start of a file, None if it is
+        # not a record file or EOFError if the header is not all there yet
+        if not data.startswith(cls.MAGIC[:len(data)]):
+            return None
+        if len(data) < cls.HEADER_START.size:
+            raise EOFError("Incomplete record header")
+
+        magic, description_size = cls.HEADER_START.unpack_from(data)
+        if magic != cls.MAGIC:
+            return None
+
+        description_end = cls.HEADER_START.size + description_size
+        if len(data) < description_end:
+            raise EOFError("Incomplete record header")
+
+        description = json.loads(data[cls.HEADER_START.size:description_end])
+        if description["version"] != cls.VERSION:
+            raise ValueError(f"Unsupported record format version {description['version']}")
+
+        return cls(description["measurement"], description["tags"], description["fields"])
+
+    def pack(self, values, timestamp_ns):
+        if self.isotime_fields:
+            values = list(values)
+            for i in self.isotime_fields:
+                values[i] = self.isoToMicros(values[i])
+
+        return self.struct.pack(timestamp_ns, *values)
+
+    def render(self, data):
+        # Line protocol for whole records in data, returns (bytes, number of lines).
+        # Each field is formatted a whole column at a time
+        rows = list(self.struct.iter_unpack(data))
+        if not rows:
+            return b"", 0
+
+        columns = list(zip(*rows))
+        rendered = []
+        for i in self.template.order:
+            column = columns[i + 1]
+            if self.fields[i][1] == "float":
+                if not all(map(math.isfinite, column)):
+                    # Point drops nan and inf, which changes the shape of the line
+                    return self.__renderRows(rows)
+                rendered.append(map(str.removesuffix, map(float.__repr__, column), repeat(".0")))
+            else:
+                rendered.append(map(self.microsToIso, column))
+
+        lp = "".join(map(self.line_fmt.__mod__, zip(*rendered, columns[0])))
+        return lp.encode(), len(rows)
+
+    def isoToMicros(self, time_str):
+        return (datetime.datetime.fromisoformat(time_str) - self.EPOCH) // self.ONE_US
+
+    def microsToIso(self, micros):
+        # Same string the drivers store, always with 6 digits of microseconds
+        seconds, fraction = divmod(micros, 1000000)
+        second_str = self.iso_seconds.get(seconds)
+        if second_str is None:
+            if len(self.iso_seconds) > 4096:
+                self.iso_seconds.clear()
+            second_str = (self.EPOCH + datetime.timedelta(seconds=seconds)).isoformat()
+            self.iso_seconds[seconds] = second_str
+
+        return f"{second_str}.{fraction:06d}"
+
+    def __renderRows(self, rows):
+        lines = []
+        for row in rows:
+            values = list(row[1:])
+            for i in self.isotime_fields:
+                values[i] = self.microsToIso(values[i])
+
+            line = self.template.serialize(values, row[0])
+            if line:
+                lines.append(f"{line}\n")
+
+        return "".join(lines).encode(), len(lines)
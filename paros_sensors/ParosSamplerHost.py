@@ -0,0 +1,137 @@
+import os
+import json
+import signal
+import socket
+import asyncio
+import atexit
+import logging
+import pathlib
+import importlib
+import threading
+from concurrent import futures
+from dotenv import load_dotenv
+from ParosProfiler import ParosProfiler
+
+class ParosSamplerHost:
+
+    RESTART_DELAY = 10  # seconds before restarting a sensor that stopped, same as RestartSec of the sampler services
+    STOP_TIMEOUT = 5  # seconds the sensors get to close their hour files on shutdown
+
+    def __init__(self, box_id, data_loc, sensors):
+        # Instance Vars
+        self.box_id = box_id
+        self.data_loc = data_loc
+        self.sensors = sensors  # entries of sensor_configs/<host>.json
+        self.running = {}  # sensor_id -> sensor object whose samplingLoop is running
+        self.lock = threading.Lock()
+        self.stopping = False
+
+        # Every sensor blocks in its own samplingLoop, so each one gets a thread
+        self.executor = futures.ThreadPoolExecutor(max_workers=max(1, len(self.sensors)))
+
+    async def run(self):
+        # Runs every sensor until SIGTERM or ctrl+c. A sensor that fails or
+        # gives up is restarted on its own without touching the others
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop_event.set)
+
+        # SIGUSR1 profiles every sensor's thread at once
+        profiler = ParosProfiler.fromEnv(f"paros_sampler_host_{self.box_id}")
+        loop.add_signal_handler(signal.SIGUSR1, profiler.toggle)
+
+        tasks = [asyncio.create_task(self.__superviseSensor(sensor)) for sensor in self.sensors]
+        await self.stop_event.wait()
+
+        logging.info("Stopping all sensors...")
+        with self.lock:
+            self.stopping = True
+            running = list(self.running.values())
+        for cur_sensor in running:
+            cur_sensor.requestStop()
+
+        done, pending = await asyncio.wait(tasks, timeout=self.STOP_TIMEOUT)
+        if pending:
+            logging.warning(f"{len(pending)} sensors did not stop in time")
+        self.executor.shutdown(wait=False)
+
+    async def __superviseSensor(self, sensor):
+        sensor_id = sensor["sensor_id"]
+        loop = asyncio.get_running_loop()
+
+        while not self.stopping:
+            try:
+                exit_code = await loop.run_in_executor(self.executor, self.__runSensor, sensor)
+                if not self.stopping:
+                    logging.error(f"Sensor {sensor_id} stopped with exit code {exit_code}")
+            except Exception as e:
+                logging.exception(f"Sensor {sensor_id} failed: {e}")
+
+            if self.stopping:
+                break
+
+            logging.info(f"Restarting sensor {sensor_id} in {self.RESTART_DELAY} s")
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), self.RESTART_DELAY)
+            except asyncio.TimeoutError:
+                pass
+
+    def __runSensor(self, sensor):
+        # Runs on an executor thread, returns the code the driver exited with
+        sensor_id = sensor["sensor_id"]
+        threading.current_thread().name = f"sampler-{sensor_id}"
+
+        cur_sensor = None
+        try:
+            # Drivers are imported by name like the sampler services run them,
+            # so one whose dependencies are missing only takes down itself
+            driver_name = sensor["driver"].removesuffix(".py")
+            driver = getattr(importlib.import_module(driver_name), driver_name)
+
+            cur_sensor = driver.fromConfig(self.box_id, sensor_id, self.data_loc, sensor["args"])
+            with self.lock:
+                if self.stopping:
+                    # Stopped while the driver was setting up
+                    return 0
+                self.running[sensor_id] = cur_sensor
+            cur_sensor.samplingLoop()
+        except SystemExit as e:
+            # Drivers exit() when they give up, and after a ctrl+c
+            return e.code
+        finally:
+            with self.lock:
+                self.running.pop(sensor_id, None)
+
+            if cur_sensor is not None:
+                # A restart creates a new sensor object, release this one now
+                cur_sensor.closeSamples()
+                atexit.unregister(cur_sensor.closeSamples)
+                if hasattr(cur_sensor, "_getSensorPort"):
+                    cur_sensor._getSensorPort().close()
+
+if __name__ == "__main__":
+    # Setup logging, the thread name tells the sensors apart
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(levelname)s: %(message)s")
+
+    # load .env file
+    file_path = pathlib.Path(__file__).parent.resolve()
+    load_dotenv(f"{file_path}/../.env")
+
+    # Required environment vars
+    required_envs = [
+        "PAROS_DATA_LOCATION"
+    ]
+
+    for env_item in required_envs:
+        if os.getenv(env_item) is None:
+            logging.critical(f"Unable to find environment variable {env_item}. Does .env exist?")
+            exit(1)
+
+    # Same sensor config the per-sensor services are created from
+    hostname = socket.gethostname()
+    with open(f"sensor_configs/{hostname}.json", "r") as f:
+        sensors = json.load(f)["sensors"]
+
+    host = ParosSamplerHost(hostname, os.getenv("PAROS_DATA_LOCATION"), sensors)
+    asyncio.run(host.run())
@@ -1,9 +1,25 @@
-import datetime
 import os
+import time
+import atexit
+import signal
+import logging
+import threading
+from ParosHourWriter import ParosHourWriter
+from LineProtocolTemplate import LineProtocolTemplate
+from ParosRecordFormat import ParosRecordFormat
+from ParosMetrics import ParosMetrics
+from ParosProfiler import ParosProfiler
+from ParosStageTimer import ParosStageTimer
 
 class ParosSensor:
 
-    sampleBufferSize = 20  # this value * Fs is the number of samples kept in a local buffer before sending
+    sampleBufferSize = 20  # maximum number of samples held in memory before they are written to the hour file
+    sampleBufferTime = 1.0  # maximum number of seconds a sample is held in memory before it is written
+    fsyncPolicy = "rotate"  # when to fsync the hour file, one of ParosHourWriter.FSYNC_POLICIES
+    sampleFields = ()  # (name, type) of each field in a sample, set by each driver
+    sampleRecordKinds = {}  # ParosRecordFormat kind of each str field, needed for binary storage
+    sampleFormat = "text"  # "text" stores line protocol, "binary" stores fixed width records
+    stageLogPeriod = 600  # seconds between stage time summaries in the log
 
     def __init__(self, box_id, sensor_id, data_loc):
         # Instance Vars
@@ -14,19 +30,155 @@ class ParosSensor:
         # create data dir if needed
         os.makedirs(os.path.join(self.data_loc, self.sensor_id), exist_ok=True)
 
-    def addSample(self, p):
-        # get system timestamp
-        sys_timestamp = datetime.datetime.now(datetime.UTC)
-
-        # add additional info to sample
-        p.time(sys_timestamp)
-        p.tag("id", self.sensor_id)
-
-        # add point to data file as line protocol format
-        # this makes it easier for the processor to use
-        # and it also makes it easier to manually upload
-        # to influxdb if something should go wrong
-        cur_data_file = os.path.join(self.data_loc, self.sensor_id, sys_timestamp.strftime('%Y-%m-%d-%H'))
-        serialized_point = p.to_line_protocol()
-        with open(cur_data_file, "a+") as f:
-            f.write(f"{serialized_point}\n")
+        # Precompiled line protocol for this sensor's measurement, id tag and fields
+        self.template = LineProtocolTemplate(self.box_id, {"id": self.sensor_id}, self.sampleFields)
+
+        # Fixed width records for the same fields, None if a field has no binary kind
+        self.record_format = None
+        record_fields = [(name, "float" if field_type is float else self.sampleRecordKinds.get(name)) for name, field_type in self.sampleFields]
+        if all(kind is not None for name, kind in record_fields):
+            self.record_format = ParosRecordFormat(self.box_id, {"id": self.sensor_id}, record_fields)
+
+        sample_format = os.getenv("PAROS_SAMPLE_FORMAT", self.sampleFormat)
+        if sample_format == "binary" and self.record_format is None:
+            logging.warning(f"{type(self).__name__} has fields without a binary kind, storing samples as text")
+            sample_format = "text"
+
+        # Buffered writer for the hour files, can be tuned from .env
+        self.writer = ParosHourWriter(
+            os.path.join(self.data_loc, self.sensor_id),
+            int(os.getenv("PAROS_SAMPLE_BUFFER_SIZE", self.sampleBufferSize)),
+            float(os.getenv("PAROS_SAMPLE_BUFFER_TIME", self.sampleBufferTime)),
+            os.getenv("PAROS_FSYNC_POLICY", self.fsyncPolicy),
+            header=self.record_format.header if sample_format == "binary" else b"",
+            peek_size=self.record_format.header_size if self.record_format else 0
+        )
+        self.binary = False  # format of the current hour file
+
+        # Counters for the node-exporter textfile, written by the metrics thread
+        self.sample_count = 0  # samples written since start
+        self.parse_failures = 0  # frames the driver could not parse
+        self.last_sample_ns = 0  # timestamp of the latest sample
+        self.metrics_rate_start = (time.monotonic(), 0)  # (time, sample_count) at the previous metrics write
+        self.metrics = ParosMetrics.fromEnv(f"paros_sampler_{self.sensor_id}.prom")
+        if self.metrics is not None:
+            self.metrics.addCollector(self._collectMetrics)
+
+        # Where the time goes: read, parse, serialize and append, summarized
+        # in the log. addSample() only adds up its times, the transport moves
+        # them into the stage timer once per read with _flushSampleStages()
+        self.stage_timer = ParosStageTimer(
+            f"Sensor {self.sensor_id}",
+            ("read", "parse", "serialize", "append"),
+            float(os.getenv("PAROS_STAGE_LOG_PERIOD", self.stageLogPeriod))
+        )
+        self.serialize_ns = 0  # addSample() time since the last flush, by stage
+        self.append_ns = 0
+        self.staged_samples = 0  # sample_count at the last flush
+
+        # Set by requestStop() from another thread
+        self.stop_requested = threading.Event()
+
+        # SIGUSR1 profiles the sampler for a while, see ParosProfiler
+        self.profiler = ParosProfiler.fromEnv(f"paros_sampler_{self.sensor_id}")
+
+        # systemd stops services with SIGTERM, which is turned into a
+        # KeyboardInterrupt so the drivers run the same shutdown path as ctrl+c
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            self.profiler.install()
+
+    def addSample(self, values, timestamp_ns=None):
+        start_ns = time.perf_counter_ns()
+
+        # get system timestamp, unless the driver knows when the sample arrived
+        sys_timestamp = time.time_ns() if timestamp_ns is None else timestamp_ns
+
+        self.sample_count += 1
+        self.last_sample_ns = sys_timestamp
+
+        # An hour file keeps the format it was started in, so a restart with
+        # a different PAROS_SAMPLE_FORMAT only takes effect at the next hour
+        if self.writer.rotate(sys_timestamp):
+            self.binary = self.__isRecordFile(self.writer.file_start)
+            if self.binary is None:
+                hour_path = self.writer.cur_path
+                divert_path = self.writer.divert()
+                logging.error(f"Hour file {hour_path} was started with other record fields, writing the rest of the hour to {divert_path}, which is not uploaded")
+                self.binary = self.__isRecordFile(self.writer.file_start)
+
+        if self.binary:
+            data = self.record_format.pack(values, sys_timestamp)
+        else:
+            # add point to data file as line protocol format
+            # this makes it easier for the processor to use
+            # and it also makes it easier to manually upload
+            # to influxdb if something should go wrong
+            serialized_point = self.template.serialize(values, sys_timestamp)
+            data = f"{serialized_point}\n".encode() if serialized_point else None
+        serialized_ns = time.perf_counter_ns()
+
+        if data:
+            self.writer.write(data, sys_timestamp)
+
+        self.serialize_ns += serialized_ns - start_ns
+        self.append_ns += time.perf_counter_ns() - serialized_ns
+
+    def _startSampling(self):
+        # Called by each driver's samplingLoop(), once its constructor has
+        # set up the device. A driver that fails to start then leaves no
+        # metrics thread or atexit entry behind for a sampler host to leak
+        if self.metrics is not None:
+            self.metrics.start()
+
+        # Make sure buffered samples land on disk however the sampler stops
+        atexit.register(self.closeSamples)
+
+    def _flushSampleStages(self):
+        # Moves the addSample() times into the stage timer, returns their total
+        samples = self.sample_count - self.staged_samples
+        self.stage_timer.add("serialize", self.serialize_ns, samples)
+        self.stage_timer.add("append", self.append_ns, samples)
+        sample_ns = self.serialize_ns + self.append_ns
+        self.serialize_ns = 0
+        self.append_ns = 0
+        self.staged_samples = self.sample_count
+        return sample_ns
+
+    def flushSamples(self):
+        # Writes buffered samples that are PAROS_SAMPLE_BUFFER_TIME old, for
+        # the transport to call when a read brought no samples
+        self.writer.flushIfDue()
+
+    def requestStop(self):
+        # Stops samplingLoop from another thread. The transport raises
+        # KeyboardInterrupt at its next read, so the driver runs its ctrl+c
+        # handling without being interrupted in the middle of writing samples
+        self.stop_requested.set()
+
+    def closeSamples(self):
+        self.writer.close()
+        if self.metrics is not None:
+            self.metrics.stop()
+
+    def _collectMetrics(self, metrics):
+        # Called from the metrics thread, only reads the counters
+        labels = {"sensor": self.sensor_id}
+        now = time.monotonic()
+        rate_time, rate_count = self.metrics_rate_start
+        self.metrics_rate_start = (now, self.sample_count)
+
+        metrics.add("paros_sampler_samples_total", "counter", "Samples written to the hour files", self.sample_count, labels)
+        metrics.add("paros_sampler_sample_rate", "gauge", "Samples/sec since the previous metrics write", (self.sample_count - rate_count) / max(now - rate_time, 1e-9), labels)
+        metrics.add("paros_sampler_parse_failures_total", "counter", "Frames from the device that could not be parsed", self.parse_failures, labels)
+        metrics.add("paros_sampler_last_sample_timestamp_seconds", "gauge", "Timestamp of the latest sample", self.last_sample_ns / 1e9, labels)
+
+    def __isRecordFile(self, file_start):
+        # None if it is a record file for other fields than this sensor's
+        if not file_start.startswith(ParosRecordFormat.MAGIC):
+            return False
+
+        if file_start != self.record_format.header:
+            return None
+
+        return True
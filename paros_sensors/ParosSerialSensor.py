@@ -1,9 +1,18 @@
 from ParosSensor import ParosSensor
+from FramePipeline import FramePipeline
+from ParosHistogram import ParosHistogram
+import os
+import time
 import serial
 import logging
 
 class ParosSerialSensor(ParosSensor):
 
+    frameTerminator = b"\n"  # end of each frame sent by the device, set by each driver
+    maxFrameSize = 4096  # drop unterminated input beyond this many bytes
+    samplePipeline = False  # read frames on their own thread so slow disk writes can't hold up the port
+    sampleQueueSize = 10000  # pipeline mode: most frames waiting to be written
+    READ_LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5]  # seconds
 
     def __init__(self, box_id, sensor_id, data_loc, device_file, ser_baud, ser_bytesize, ser_parity, ser_stopbits, ser_timeout):
         # Super constructor
@@ -12,6 +21,32 @@ class ParosSerialSensor(ParosSensor):
         # Instance Vars
         self.sensor_id = sensor_id  # serial num of barometer
         self.box_id = box_id  # name of box
+        self.frame_buffer = b""  # input after the last complete frame
+        self.frame_size = 1  # shortest frame in the last read, how much to wait for
+        self.read_time_ns = 0  # when the last read returned
+        self.last_frame_ns = 0  # timestamp of the last frame, frame timestamps never go back
+        self.pipeline = None  # FramePipeline in pipeline mode
+
+        # Metrics, see _collectMetrics()
+        self.read_timeouts = 0  # reads that returned no bytes before the port timeout, counted by readFrames()
+        self.read_latency = ParosHistogram(self.READ_LATENCY_BUCKETS)  # oldest frame of each read, arrival to handling
+
+        # Stage timing, the driver's parse time is what is left of its time
+        # with the frames once addSample() is taken out
+        self.frames_done_ns = None  # perf counter when the driver got its last frames
+        self.frames_handed = 0  # frames in that batch
+
+        # Time to send one character, start bit + data bits + parity + stop bits
+        char_bits = 1 + ser_bytesize + (ser_parity != serial.PARITY_NONE) + ser_stopbits
+        self.char_time_ns = int(char_bits * 1e9 / ser_baud)
+
+        if os.getenv("PAROS_SAMPLE_PIPELINE", "1" if self.samplePipeline else "0") == "1":
+            self.pipeline = FramePipeline(
+                f"Sensor {sensor_id}",
+                self.readTimedFrames,
+                int(os.getenv("PAROS_SAMPLE_QUEUE_SIZE", self.sampleQueueSize)),
+                ser_timeout
+            )
 
         # Create Sensor Port
         self.sensorPort = serial.Serial()
@@ -35,14 +70,18 @@ class ParosSerialSensor(ParosSensor):
             exit(1)
 
     def writeSerial(self, cmd, wait_reply=False):
+        if wait_reply and self.pipeline is not None and self.pipeline.running():
+            # The reply would end up in the reader thread
+            self.pipeline.stop()
+
         # Encode string
         encoded_cmd = self.__encodeCMD(cmd)
-        logging.debug(f"Sending to device: {encoded_cmd}")
+        logging.debug("Sending to device: %s", encoded_cmd)
         self.sensorPort.write(encoded_cmd)  # Send to device
 
         if wait_reply:
             reply = self.sensorPort.readline()  # Readline blocks until timeout
-            logging.debug(f"Received Reply: {reply}")
+            logging.debug("Received Reply: %s", reply)
 
             try:
                 return reply.decode()  # Decode input
@@ -57,13 +96,116 @@ class ParosSerialSensor(ParosSensor):
         else:
             cur_line = self.sensorPort.readline()  # Readline blocks until timeout
 
-        logging.debug(f"Received from Device: {cur_line}")
+        logging.debug("Received from Device: %s", cur_line)
 
         try:
             return cur_line.decode()  # Decode input
         except:
             return None
 
+    def readFrames(self, terminator=None):
+        # Complete frames without their terminator, as many as have arrived.
+        # Everything waiting is taken in one read instead of a readline per
+        # frame. When nothing is waiting this blocks until at least a frame's
+        # worth of bytes arrives, so a slow device doesn't cause a read per
+        # byte. Returns None if nothing arrived before the port timeout
+        if terminator is None:
+            terminator = self.frameTerminator
+
+        wanted = max(1, self.frame_size - len(self.frame_buffer))
+        cur_data = self.sensorPort.read(max(self.sensorPort.in_waiting, wanted))
+        self.read_time_ns = time.time_ns()
+        if not cur_data:
+            # Only a read without a single byte is a timeout, a partial
+            # frame just returns no frames
+            self.read_timeouts += 1
+            return None
+
+        frames = (self.frame_buffer + cur_data).split(terminator)
+        self.frame_buffer = frames.pop()
+
+        if frames:
+            self.frame_size = min(map(len, frames)) + len(terminator)
+
+        if len(self.frame_buffer) > self.maxFrameSize:
+            logging.warning(f"Dropped {len(self.frame_buffer)} bytes without a frame terminator")
+            self.frame_buffer = b""
+
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for frame in frames:
+                logging.debug("Received from Device: %s", frame)
+
+        return frames
+
+    def readTimedFrames(self, terminator=None):
+        # readFrames() with the time each frame finished arriving. The last
+        # byte of the read arrived at about read_time_ns, and every byte
+        # after a frame took one character time on the wire
+        if terminator is None:
+            terminator = self.frameTerminator
+
+        read_start_ns = time.perf_counter_ns()
+        frames = self.readFrames(terminator)
+        # Includes waiting for the device, a sampler that keeps up spends most of its time here
+        self.stage_timer.add("read", time.perf_counter_ns() - read_start_ns)
+        if frames is None:
+            return None
+
+        timed_frames = [None] * len(frames)
+        bytes_after = len(self.frame_buffer)
+        for i in range(len(frames) - 1, -1, -1):
+            timed_frames[i] = (frames[i], self.read_time_ns - bytes_after * self.char_time_ns)
+            bytes_after += len(frames[i]) + len(terminator)
+
+        # Estimates can overlap the previous read slightly, keep them in
+        # order so the hour writer never goes back an hour
+        if timed_frames and timed_frames[0][1] < self.last_frame_ns:
+            timed_frames = [(frame, max(timestamp_ns, self.last_frame_ns)) for frame, timestamp_ns in timed_frames]
+        if timed_frames:
+            self.last_frame_ns = timed_frames[-1][1]
+
+        return timed_frames
+
+    def nextFrames(self):
+        # The frames for samplingLoop as (frame, timestamp_ns), or None if
+        # nothing arrived before the port timeout. In pipeline mode they come
+        # from the reader thread, otherwise straight from the port
+        if self.stop_requested.is_set():
+            raise KeyboardInterrupt
+
+        if self.frames_done_ns is not None:
+            handled_ns = time.perf_counter_ns() - self.frames_done_ns
+            self.stage_timer.add("parse", handled_ns - self._flushSampleStages(), self.frames_handed)
+        self.stage_timer.logSummary()
+
+        if self.pipeline is None:
+            timed_frames = self.readTimedFrames()
+        else:
+            if not self.pipeline.running():
+                self.pipeline.start()
+            timed_frames = self.pipeline.get()
+
+        # Measured once per read, not per frame
+        if timed_frames:
+            self.read_latency.observe((time.time_ns() - timed_frames[0][1]) / 1e9)
+        else:
+            # No new samples to check the buffer time on, so it is checked
+            # here. Samples then wait at most the buffer time plus a port timeout
+            self.flushSamples()
+
+        self.frames_handed = len(timed_frames) if timed_frames else 0
+        self.frames_done_ns = time.perf_counter_ns()
+        return timed_frames
+
+    def _collectMetrics(self, metrics):
+        super()._collectMetrics(metrics)
+        labels = {"sensor": self.sensor_id}
+        metrics.add("paros_sampler_read_timeouts_total", "counter", "Serial reads with nothing before the port timeout", self.read_timeouts, labels)
+        metrics.addHistogram("paros_sampler_read_latency_seconds", "Time from the oldest frame of a read arriving to the driver handling it", self.read_latency, labels)
+        if self.pipeline is not None:
+            metrics.add("paros_sampler_frames_dropped_total", "counter", "Frames dropped because the frame queue was full", self.pipeline.dropped, labels)
+            metrics.add("paros_sampler_frame_queue_high_water", "gauge", "Most frames ever waiting in the frame queue", self.pipeline.high_water, labels)
+
     def _getSensorPort(self):
         return self.sensorPort
 
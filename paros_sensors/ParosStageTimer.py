@@ -0,0 +1,41 @@
+import time
+import logging
+
+class ParosStageTimer:
+
+    # Always-on totals of the time spent in each stage of a hot loop, logged
+    # every log_period seconds. Updates are plain adds without a lock, the
+    # numbers are for finding where the time goes, not for accounting
+
+    def __init__(self, name, stages, log_period):
+        # Instance Vars
+        self.name = name  # used in log messages
+        self.stages = stages  # in the order they are logged
+        self.log_period = log_period
+        self.totals = dict.fromkeys(stages, 0)  # ns in each stage since the last summary
+        self.counts = dict.fromkeys(stages, 0)  # times each stage ran since the last summary
+        self.period_start = time.monotonic()
+        self.next_log_time = self.period_start + self.log_period
+
+    def add(self, stage, elapsed_ns, count=1):
+        self.totals[stage] += elapsed_ns
+        self.counts[stage] += count
+
+    def logSummary(self, force=False):
+        # Cheap to call every loop, only logs once log_period has passed
+        now = time.monotonic()
+        if now < self.next_log_time and not force:
+            return
+
+        elapsed = now - self.period_start
+        summary = ", ".join(
+            f"{stage} {self.totals[stage] / 1e6:.1f} ms / {self.counts[stage]} "
+            f"({self.totals[stage] / 1e7 / max(elapsed, 1e-9):.1f}%)"
+            for stage in self.stages
+        )
+        logging.info(f"{self.name} stage times over {elapsed:.0f} s: {summary}")
+
+        self.totals = dict.fromkeys(self.stages, 0)
+        self.counts = dict.fromkeys(self.stages, 0)
+        self.period_start = now
+        self.next_log_time = now + self.log_period
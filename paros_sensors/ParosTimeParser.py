@@ -0,0 +1,83 @@
+import datetime
+
+class ParosTimeParser:
+
+    # Barometer timestamps are "MM/DD/YY HH:MM:SS.ffffff". Everything up to
+    # the seconds only changes once a second, so it is parsed once and the
+    # result reused for every sample in that second
+    SECOND_SIZE = 17  # len("MM/DD/YY HH:MM:SS")
+    STRPTIME_FORMAT = "%m/%d/%y %H:%M:%S.%f"
+
+    def __init__(self):
+        # Instance Vars
+        self.second_key = None  # "MM/DD/YY HH:MM:SS" of the cached second
+        self.second_iso = None  # the same second as "YYYY-MM-DDTHH:MM:SS"
+
+    def toIso(self, time_str):
+        # Same string as strptime() then isoformat() with the microseconds
+        # always written out. Raises ValueError for anything strptime rejects
+        fraction = self.__fraction(time_str)
+        if fraction is None:
+            return self.__isoFromDatetime(self.__strptime(time_str))
+
+        return f"{self.second_iso}.{fraction}"
+
+    def __fraction(self, time_str):
+        # Six digit fraction of the second for the fixed layout, with the
+        # cache pointing at the second of time_str. None if time_str has to
+        # go through strptime
+        fraction = time_str[self.SECOND_SIZE + 1:]
+        if (
+            time_str[self.SECOND_SIZE:self.SECOND_SIZE + 1] != "."
+            or not 0 < len(fraction) <= 6
+            or not (fraction.isascii() and fraction.isdigit())
+        ):
+            return None
+
+        second_key = time_str[:self.SECOND_SIZE]
+        if second_key != self.second_key and not self.__cacheSecond(second_key):
+            return None
+
+        # strptime reads a short fraction as the leading digits
+        return fraction if len(fraction) == 6 else fraction.ljust(6, "0")
+
+    def __cacheSecond(self, second_key):
+        # Only the exact fixed layout is handled here, anything else goes
+        # through strptime so odd input behaves exactly as it always has
+        if (
+            not (second_key.isascii() and second_key[0:2].isdigit() and second_key[3:5].isdigit() and second_key[6:8].isdigit())
+            or not (second_key[9:11].isdigit() and second_key[12:14].isdigit() and second_key[15:17].isdigit())
+            or second_key[2] != "/" or second_key[5] != "/" or second_key[8] != " "
+            or second_key[11] != ":" or second_key[14] != ":"
+        ):
+            return False
+
+        # %y: 69-99 are 1969-1999, 00-68 are 2000-2068
+        year = int(second_key[6:8])
+        year += 1900 if year >= 69 else 2000
+
+        try:
+            second = datetime.datetime(
+                year,
+                int(second_key[0:2]),
+                int(second_key[3:5]),
+                int(second_key[9:11]),
+                int(second_key[12:14]),
+                int(second_key[15:17])
+            )
+        except ValueError:
+            return False
+
+        self.second_key = second_key
+        self.second_iso = second.isoformat()
+        return True
+
+    def __strptime(self, time_str):
+        return datetime.datetime.strptime(time_str, self.STRPTIME_FORMAT)
+
+    def __isoFromDatetime(self, in_time):
+        timeStr = in_time.isoformat()
+        if in_time.microsecond == 0:
+            timeStr += ".000000"
+
+        return timeStr
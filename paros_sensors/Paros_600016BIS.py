@@ -1,8 +1,7 @@
-from ParosSensor import ParosSensor
 from ParosSerialSensor import ParosSerialSensor
+from ParosTimeParser import ParosTimeParser
 import serial
 import datetime
-import influxdb_client
 import argparse
 import os
 from dotenv import load_dotenv
@@ -12,6 +11,10 @@ import logging
 
 class Paros_600016BIS(ParosSerialSensor):
 
+    # Barometer time is stored as a field, not the primary time field
+    sampleFields = (("value", float), ("baro_time", str))
+    sampleRecordKinds = {"baro_time": "isotime"}
+
     def __init__(self, box_id, sensor_id, data_loc, device_file):
         # Supercontructor
         super().__init__(
@@ -28,6 +31,7 @@ class Paros_600016BIS(ParosSerialSensor):
 
         # Define Instance Vars
         self.box_id = box_id
+        self.time_parser = ParosTimeParser()  # barometer timestamps to ISO strings
 
         # Verify serial number of barometer
         # This also resets the barometer to a normal state if it was left sampling
@@ -46,7 +50,14 @@ class Paros_600016BIS(ParosSerialSensor):
             logging.critical(f"Barometer on device {device_file} either did not respond or returned a malformed response")
             exit(1)
 
+    @classmethod
+    def fromConfig(cls, box_id, sensor_id, data_loc, args):
+        # args as written in sensor_configs: "<device>"
+        device_file, = args.split()
+        return cls(box_id, sensor_id, data_loc, device_file)
+
     def samplingLoop(self):
+        self._startSampling()
 
         # Set barometer clocks at the start of sampling
         utcTimeStr = datetime.datetime.now(datetime.UTC).strftime('%m/%d/%y %H:%M:%S')
@@ -74,57 +85,58 @@ class Paros_600016BIS(ParosSerialSensor):
                     self.stopSampling()
                     exit(1)
 
-                # Read line
-                strIn = super().readSerial()
-
-                # strIn is none if it was unable to decode
-                if strIn is None:
-                    fail_count += 1
-                    continue
-
-                # strip whitespace
-                strIn = strIn.strip()
-
-                # split up line
-                in_parts = strIn.split(",")
-                
-                # Verify that this is actually a sample line
-                if in_parts[0] != "*0001V":
-                    fail_count += 1
-                    continue
+                # Read lines
+                frames = super().nextFrames()
 
-                # Verify length of line
-                if len(in_parts) != 3:
+                # nothing before the timeout
+                if frames is None:
                     fail_count += 1
                     continue
 
-                # get barometer timestamp
-                baro_timestamp = datetime.datetime.strptime(in_parts[1], "%m/%d/%y %H:%M:%S.%f")
-                # get barometer value
-                cur_value = float(in_parts[2])
+                for frame, timestamp_ns in frames:
+                    sample = self.__parseFrame(frame)
 
-                # form influxdb point data structure
-                p = influxdb_client.Point(self.box_id)
-                p.field("value", cur_value)
-                # Barometer time is stored as a field, not the primary time field
-                p.field("baro_time", self.__getTimeStr(baro_timestamp))
+                    if sample is None:
+                        fail_count += 1
+                        self.parse_failures += 1
+                        continue
 
-                ParosSensor.addSample(self, p)
+                    self.addSample(sample, timestamp_ns)
 
             except KeyboardInterrupt:
                 logging.info("Stopping sampling...")
                 self.stopSampling()
+                self.closeSamples()
                 exit(0)
 
-    def stopSampling(self):
-        super().writeSerial('*0100SN', wait_reply=True)
+    def __parseFrame(self, frame):
+        # strip whitespace and split up line
+        in_parts = frame.strip().split(b",")
+
+        # Verify that this is actually a sample line
+        if in_parts[0] != b"*0001V":
+            return None
+
+        # Verify length of line
+        if len(in_parts) != 3:
+            return None
 
-    def __getTimeStr(self, in_time):
-        timeStr = in_time.isoformat()
-        if in_time.microsecond == 0:
-            timeStr += ".000000"
+        # None if it was unable to decode
+        try:
+            time_str = in_parts[1].decode()
+            value_str = in_parts[2].decode()
+        except UnicodeDecodeError:
+            return None
 
-        return timeStr
+        # get barometer timestamp
+        baro_time = self.time_parser.toIso(time_str)
+        # get barometer value
+        cur_value = float(value_str)
+
+        return (cur_value, baro_time)
+
+    def stopSampling(self):
+        super().writeSerial('*0100SN', wait_reply=True)
 
 if __name__ == "__main__":
     # Setup logging
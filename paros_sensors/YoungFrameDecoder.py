@@ -0,0 +1,100 @@
+import math
+from functools import reduce
+from operator import xor
+
+class YoungFrameDecoder:
+
+    # Frames from the 86000 look like b"<id> <speed> <direction> <status>*<checksum>\r"
+    FRAME_END = b"\r"
+    STATUS_OK = b"00"
+    FIELD_CACHE_SIZE = 16384  # speeds have 10000 possible values, directions 3601
+
+    # The checksum is the XOR of every byte before the asterisk. For a plain
+    # "<id> <speed> <direction> 00" frame that is the XOR of each field's
+    # bytes and the three spaces, and b"00" XORs to 0
+    SPACES_XOR = ord(" ")
+    HEX = {f"{i:02X}".encode(): i for i in range(256)} | {f"{i:02x}".encode(): i for i in range(256)}
+
+    def __init__(self):
+        # Instance Vars
+        self.fields = {}  # field as sent -> (XOR of its bytes, float value or None)
+        self.trig = {}  # direction field as sent -> (cos, sin) of that direction
+
+    def decodeFrame(self, frame):
+        # One frame without the trailing b"\r". Returns a sample, None for a
+        # frame that failed its status or checksum, or () for a frame that
+        # is not a data frame at all
+        stripped = frame.strip()
+        parts = stripped.split(b" ")
+
+        # verification step
+        verification_parts = parts[-1].split(b"*")
+        if len(verification_parts) != 2:
+            return ()
+
+        if verification_parts[0] != self.STATUS_OK:
+            # status code error
+            return None
+
+        checksum = self.HEX.get(verification_parts[1])
+        if checksum is None:
+            try:
+                checksum = int(verification_parts[1], 16)
+            except ValueError:
+                return None
+
+        if len(parts) != 4 or len(stripped) != len(frame):
+            return self.__decodeOddFrame(frame, parts, checksum)
+
+        fields = self.fields
+        ident_xor,ident_value = fields.get(parts[0]) or self.__field(parts[0])
+        speed_xor,speed = fields.get(parts[1]) or self.__field(parts[1])
+        direction_xor,direction = fields.get(parts[2]) or self.__field(parts[2])
+
+        if ident_xor ^ speed_xor ^ direction_xor ^ self.SPACES_XOR != checksum:
+            # this often happens on the first read
+            return None
+
+        cos_sin = self.trig.get(parts[2])
+        if cos_sin is None or speed is None:
+            return self.__sample(speed, direction, parts[2])
+
+        return (speed, direction, speed * cos_sin[0], speed * cos_sin[1])
+
+    def __decodeOddFrame(self, frame, parts, checksum):
+        # Extra fields or whitespace around the frame, checksum every byte
+        if reduce(xor, frame[:frame.find(b"*")], 0) != checksum or len(parts) < 3:
+            return None
+
+        return self.__sample(self.__field(parts[1])[1], self.__field(parts[2])[1], parts[2])
+
+    def __sample(self, speed, direction, direction_field):
+        if speed is None or direction is None:
+            return None
+
+        # covert to cartesian
+        cos_sin = self.trig.get(direction_field)
+        if cos_sin is None:
+            angle_rad = math.radians(direction)
+            cos_sin = (math.cos(angle_rad), math.sin(angle_rad))
+            if len(self.trig) < self.FIELD_CACHE_SIZE:
+                self.trig[direction_field] = cos_sin
+
+        return (speed, direction, speed * cos_sin[0], speed * cos_sin[1])
+
+    def __field(self, field):
+        # Wind doesn't change much between frames, so the same few hundred
+        # fields come up over and over
+        cached = self.fields.get(field)
+        if cached is not None:
+            return cached
+
+        try:
+            value = float(field)
+        except ValueError:
+            value = None
+
+        cached = (reduce(xor, field, 0), value)
+        if len(self.fields) < self.FIELD_CACHE_SIZE:
+            self.fields[field] = cached
+        return cached
@@ -1,9 +1,7 @@
 import serial
 import os
-import influxdb_client
-import math
 from ParosSerialSensor import ParosSerialSensor
-from ParosSensor import ParosSensor
+from YoungFrameDecoder import YoungFrameDecoder
 import pathlib
 from dotenv import load_dotenv
 import argparse
@@ -12,6 +10,10 @@ import logging
 
 class Young_86000(ParosSerialSensor):
 
+    sampleFields = (("speed", float), ("direction", float), ("u", float), ("v", float))
+    frameTerminator = YoungFrameDecoder.FRAME_END
+    maxFrameSize = 256
+
     def __init__(self, box_id, sensor_id, data_loc, device_file):
         super().__init__(
             box_id,
@@ -26,6 +28,7 @@ class Young_86000(ParosSerialSensor):
         )
 
         self.box_id = box_id
+        self.decoder = YoungFrameDecoder()
 
         test_line = super().readSerial(b'\r')
         input_parts = test_line.split(" ")
@@ -37,19 +40,14 @@ class Young_86000(ParosSerialSensor):
             logging.critical(f"Unable to find anemometer with id {sensor_id}")
             exit(1)
 
-    def __xor_checksum(self, string):
-        result = 0
-
-        # Finding the index of the asterisk in the string
-        asterisk_index = string.find('*')
-
-        # Performing XOR operation on characters before the asterisk
-        for char in string[:asterisk_index]:
-            result ^= ord(char)
-
-        return result
+    @classmethod
+    def fromConfig(cls, box_id, sensor_id, data_loc, args):
+        # args as written in sensor_configs: "<device>"
+        device_file, = args.split()
+        return cls(box_id, sensor_id, data_loc, device_file)
 
     def samplingLoop(self):
+        self._startSampling()
 
         # count failures
         fail_count = 0
@@ -58,53 +56,29 @@ class Young_86000(ParosSerialSensor):
             try:
                 if fail_count > 10:
                     logging.critical("Stopping due to too many data failures")
-                    self.stopSampling()
+                    self.closeSamples()
                     exit(1)
 
-                strIn = super().readSerial(b'\r')
-
-                if strIn is None:
-                    fail_count += 1
-                    continue
-
-                in_parts = strIn.strip().split(" ")
-
-                # verification step
-                verification_parts = in_parts[-1].split("*")
-                if len(verification_parts) != 2:
-                    continue
-
-                if verification_parts[0] != "00":
-                    # status code error
-                    fail_count += 1
-                    continue
+                frames = super().nextFrames()
 
-                # verify checksum
-                checksum = int(verification_parts[1],16)
-                calc_checksum = self.__xor_checksum(strIn)
-                if calc_checksum != checksum:
-                    # continue if bad checksum (this often happens on the first read)
-                    fail_count += 1
+                if frames is None:
                     continue
 
-                cur_speed = float(in_parts[1])
-                cur_direction = float(in_parts[2])
-
-                # covert to cartesian
-                angle_rad = math.radians(cur_direction)
-                u = cur_speed * math.cos(angle_rad)
-                v = cur_speed * math.sin(angle_rad)
+                for frame, timestamp_ns in frames:
+                    sample = self.decoder.decodeFrame(frame)
 
-                p = influxdb_client.Point(self.box_id)
-                p.field("speed", cur_speed)
-                p.field("direction", cur_direction)
-                p.field("u", u)
-                p.field("v", v)
+                    if sample is None:
+                        # bad status or checksum (this often happens on the first read)
+                        fail_count += 1
+                        self.parse_failures += 1
+                        continue
 
-                ParosSensor.addSample(self, p)
+                    if sample:
+                        self.addSample(sample, timestamp_ns)
 
             except KeyboardInterrupt:
                 logging.info("Stopping sampling")
+                self.closeSamples()
                 exit(0)
 
 if __name__ == "__main__":
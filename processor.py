@@ -1,22 +1,63 @@
-import influxdb_client
 import pathlib
 from dotenv import load_dotenv
 import os
 import datetime
-import pickle
+import signal
 import socket
 import json
 import logging
+import time
+import threading
+import collections
+from concurrent import futures
 from time import sleep
 import re
+from paros_processor import PointerStore, TailReader, InfluxWriter, BatchController, HourIndex, DirWatcher, CircuitBreaker, UploadSpool, HourArchiver, RateLimiter
+from ParosMetrics import ParosMetrics
+from ParosHistogram import ParosHistogram
+from ParosProfiler import ParosProfiler
+from ParosStageTimer import ParosStageTimer
 
 class parosProcessor:
 
-    POINTER_PATH = 'pointer.pickle'
-    MAXIMUM_UPLOAD_SIZE = 600  # Maximum # of lines/datapoints for each upload
+    POINTER_PATH = 'pointer.json'
+    LEGACY_POINTER_PATH = 'pointer.pickle'  # pointer file used before the JSON checkpoints
+    POINTER_CHECKPOINT_INTERVAL = 10  # Maximum seconds between pointer checkpoints to disk
+    MAXIMUM_UPLOAD_SIZE = 600  # Maximum # of lines/datapoints for each upload at the live edge
+    MAXIMUM_CATCHUP_SIZE = 200000  # Maximum # of lines/datapoints for each upload while catching up
+    MAXIMUM_UPLOAD_BYTES = 8 * 1024 * 1024  # Maximum uncompressed size of each upload while catching up
+    UPLOAD_TARGET_LATENCY = 2.0  # Catch-up uploads shrink when a write takes longer than this many seconds
     LOOP_PERIOD = 1  # Loop timing control period
-
-    def __init__(self, data_loc, influx_host, influx_org, influx_bucket, influx_token):
+    PROCESSOR_MODE = "serial"  # "serial" handles sensors one after another, "concurrent" runs them independently,
+                               # "batched" combines all sensors into one request
+    UPLOAD_WORKERS = 4  # Concurrent mode: uploads running at the same time across all sensors
+    MAX_IN_FLIGHT = 2  # Concurrent mode: uploads running at the same time for each sensor
+    BATCH_MAX_LINES = 5000  # Batched mode: maximum # of lines in one combined request
+    BATCH_MAX_BYTES = 1024 * 1024  # Batched mode: maximum uncompressed size of one combined request
+    STATS_PERIOD = 60  # Seconds between upload statistics in the log
+    HOUR_CLOSE_DELAY = 10  # Seconds after the end of an hour before moving past it, covers the samplers' write buffers
+    WAKEUP_MODE = "timer"  # "timer" polls every LOOP_PERIOD, "inotify" wakes up when the samplers write
+    WATCH_FALLBACK_PERIOD = 10  # inotify wakeup: maximum seconds between loops without any file events
+    WATCH_DEBOUNCE = 0.05  # inotify wakeup: seconds to let writes from the other samplers land after a wakeup
+    MIN_UPLOAD_INTERVAL = 1.0  # inotify wakeup: minimum seconds between loops at the live edge, however often the samplers flush
+    BREAKER_FAILURE_THRESHOLD = 3  # Consecutive failed writes before backing off
+    BACKOFF_BASE = 1  # Seconds before the first retry once backing off
+    BACKOFF_MAX = 300  # Maximum seconds between retries
+    SPOOL_MAX_BYTES = 1024 * 1024 * 1024  # Stop staging batches once the spool is this large
+    SPOOL_DRAIN_BATCHES = 50  # Maximum # of spooled batches sent per loop
+    ARCHIVE_PERIOD = 60  # Seconds between archiving passes
+    BACKUP_MAX_BYTES = 16 * 1024 * 1024 * 1024  # Oldest archived hours are removed beyond this total size
+    BACKUP_MAX_DAYS = 365  # Archived hours older than this are removed
+    LIVE_POINTER_PATH = 'live_pointer.json'  # Tiered upload: pointers of the summary lane
+    LIVE_SUMMARY_PERIOD = 1.0  # Tiered upload: seconds of data in each summary point
+    LIVE_LOOP_PERIOD = 5  # Tiered upload: seconds between summary uploads
+    LIVE_MAX_LINES = 50000  # Tiered upload: Maximum # of lines read for summaries at once
+    BACKFILL_MAX_RATE = 0  # Tiered upload: bytes/sec of full-rate uploads, 0 for unlimited
+    QC_DIR = 'qc'  # Hour QC summaries from qc.py, uploaded like a sensor's hour files
+    UPLOAD_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30]  # Seconds, upload latency histogram
+    UPLOAD_LINES_BUCKETS = [10, 100, 600, 1000, 5000, 20000, 50000, 200000]  # Lines, upload batch size histogram
+
+    def __init__(self, data_loc, influx_host, influx_org, influx_bucket, influx_token, buffer_loc=None, backup_loc=None):
         #
         # Instance Vars
         #
@@ -24,16 +65,34 @@ class parosProcessor:
         # Parameters
         self.data_loc = data_loc
         self.influx_bucket = influx_bucket
-        self.influx_fail = False
         self.hostname = socket.gethostname()
+        self.processor_mode = os.getenv("PAROS_PROCESSOR_MODE", self.PROCESSOR_MODE)
+        self.upload_workers = int(os.getenv("PAROS_UPLOAD_WORKERS", self.UPLOAD_WORKERS))
+        self.max_in_flight = int(os.getenv("PAROS_MAX_IN_FLIGHT", self.MAX_IN_FLIGHT))
+        self.stop_event = threading.Event()  # stops the sensor threads in concurrent mode
+        self.batch_max_lines = int(os.getenv("PAROS_BATCH_MAX_LINES", self.BATCH_MAX_LINES))
+        self.batch_max_bytes = int(os.getenv("PAROS_BATCH_MAX_BYTES", self.BATCH_MAX_BYTES))
+        self.next_stats_time = time.monotonic() + self.STATS_PERIOD
+        self.min_upload_interval = float(os.getenv("PAROS_MIN_UPLOAD_INTERVAL", self.MIN_UPLOAD_INTERVAL))
 
         # InfluxDB Objects
-        self.influx_client = influxdb_client.InfluxDBClient(
-            url=influx_host,
-            token=influx_token,
-            org=influx_org
+        self.influx_writer = InfluxWriter(
+            influx_host,
+            influx_token,
+            influx_org,
+            influx_bucket,
+            compress=os.getenv("PAROS_INFLUXDB_GZIP", "1") == "1",
+            pool_size=max(4, self.upload_workers)
         )
-        self.influx_write_api = self.influx_client.write_api(write_options=influxdb_client.client.write_api.SYNCHRONOUS, debug=True)
+
+        # Backs off while InfluxDB is unreachable
+        self.breaker = CircuitBreaker(self.BREAKER_FAILURE_THRESHOLD, self.BACKOFF_BASE, self.BACKOFF_MAX)
+
+        # Batches that could not be sent are staged on disk when a buffer
+        # location is configured, and sent once InfluxDB is back
+        self.spool = None
+        if buffer_loc:
+            self.spool = UploadSpool(buffer_loc, int(os.getenv("PAROS_SPOOL_MAX_BYTES", self.SPOOL_MAX_BYTES)))
 
         # List of Sensors
         self.sensors = []
@@ -44,9 +103,79 @@ class parosProcessor:
                 self.sensors.append(sensor['sensor_id'])
                 logging.debug(f"Found sensor {sensor}")
 
+        # Hour QC summaries are line protocol starting with the hostname too,
+        # they only get the full-rate lane
+        self.live_sensors = list(self.sensors)
+        if os.getenv("PAROS_QC_UPLOAD", "0") == "1":
+            self.sensors.append(self.QC_DIR)
+            os.makedirs(os.path.join(self.data_loc, self.QC_DIR), exist_ok=True)
+
+        # Completed hours are compressed into the backup location once uploaded
+        self.archiver = None
+        if backup_loc:
+            self.archiver = HourArchiver(
+                self.data_loc,
+                backup_loc,
+                int(os.getenv("PAROS_BACKUP_MAX_BYTES", self.BACKUP_MAX_BYTES)),
+                float(os.getenv("PAROS_BACKUP_MAX_DAYS", self.BACKUP_MAX_DAYS))
+            )
+
+        # Reads new lines from the hour files, every line starts with the hostname
+        self.tail_readers = {sensor: TailReader(self.hostname.encode()) for sensor in self.sensors}
+
+        # Hour files that exist for each sensor, so gaps can be skipped in one step
+        self.hour_indexes = {
+            sensor: HourIndex(os.path.join(self.data_loc, sensor), self.archiver.archiveDir(sensor) if self.archiver else None)
+            for sensor in self.sensors
+        }
+
+        # Wakeups when the samplers write, instead of polling
+        self.dir_watcher = None
+        self.data_events = {sensor: threading.Event() for sensor in self.sensors}  # concurrent mode: new data per sensor
+        if os.getenv("PAROS_PROCESSOR_WAKEUP", self.WAKEUP_MODE) == "inotify":
+            self.dir_watcher = DirWatcher()
+            if self.dir_watcher.available():
+                for sensor in self.sensors:
+                    cur_sensor_dir = os.path.join(self.data_loc, sensor)
+                    os.makedirs(cur_sensor_dir, exist_ok=True)
+                    self.dir_watcher.watch(sensor, cur_sensor_dir)
+            else:
+                self.dir_watcher = None
+
+        # Upload sizes adapt to how the link is doing, one controller per sensor
+        # and one for the combined requests of batched mode
+        target_latency = float(os.getenv("PAROS_UPLOAD_TARGET_LATENCY", self.UPLOAD_TARGET_LATENCY))
+        self.batch_controllers = {
+            sensor: BatchController(f"Sensor {sensor}", self.MAXIMUM_UPLOAD_SIZE, self.MAXIMUM_CATCHUP_SIZE, self.MAXIMUM_UPLOAD_BYTES, target_latency)
+            for sensor in self.sensors
+        }
+        self.combined_controller = BatchController("Combined upload", self.batch_max_lines, self.MAXIMUM_CATCHUP_SIZE, self.MAXIMUM_UPLOAD_BYTES, target_latency)
+
+        # Prometheus textfile metrics when PAROS_METRICS_LOCATION is set. Uploads
+        # are labelled by sensor, or "combined" for the requests of batched mode
+        self.metrics = ParosMetrics.fromEnv("paros_processor.prom")
+        self.metrics_lock = threading.Lock()  # uploads finish on several threads in concurrent mode
+        upload_labels = self.sensors + ["combined"]
+        self.upload_latency = {label: ParosHistogram(self.UPLOAD_LATENCY_BUCKETS) for label in upload_labels}
+        self.upload_lines = {label: ParosHistogram(self.UPLOAD_LINES_BUCKETS) for label in upload_labels}
+        self.upload_errors = {label: 0 for label in upload_labels + ["spool"]}  # failed writes, "spool" for spooled batches
+        self.spooled_batches = {label: 0 for label in upload_labels}
+
+        # Where the time goes: reading the hour files, compressing, POSTing
+        # and writing pointer checkpoints, logged every STATS_PERIOD
+        self.stage_timer = ParosStageTimer("Processor", ("read", "compress", "post", "pointer"), self.STATS_PERIOD)
+
         #
         # Pointer File Creation
         #
+        # Pointers are kept in memory and checkpointed to disk periodically
+        self.pointers = PointerStore(
+            self.POINTER_PATH,
+            float(os.getenv("PAROS_POINTER_CHECKPOINT_INTERVAL", self.POINTER_CHECKPOINT_INTERVAL)),
+            legacy_path=self.LEGACY_POINTER_PATH,
+            stage_timer=self.stage_timer
+        )
+
         cur_time = datetime.datetime.now(datetime.UTC)
         file_hour = cur_time.strftime('%Y-%m-%d-%H')
 
@@ -56,158 +185,628 @@ class parosProcessor:
                 logging.info(f"Adding new sensor {sensor} to pointer file")
                 self.setPointer(sensor, file_hour, 0)
 
+        # Tiered upload: a summary lane sends mean/min/max of the newest data
+        # of every sensor to the <hostname>_summary measurement right away,
+        # with pointers of its own. The pointers above are then the full-rate
+        # backfill lane, which can be rate limited to leave room for them
+        self.live_summarizer = None
+        self.live_pointers = None
+        self.backfill_limiter = None
+        if os.getenv("PAROS_LIVE_SUMMARY", "0") == "1":
+            # Only this mode needs numpy
+            from paros_processor.LiveSummarizer import LiveSummarizer
+            summary_period = float(os.getenv("PAROS_LIVE_SUMMARY_PERIOD", self.LIVE_SUMMARY_PERIOD))
+            self.live_summarizer = LiveSummarizer(f"{self.hostname}_summary", int(summary_period * 1e9))
+            self.live_readers = {sensor: TailReader(self.hostname.encode()) for sensor in self.live_sensors}
+            self.live_pointers = PointerStore(
+                self.LIVE_POINTER_PATH,
+                float(os.getenv("PAROS_POINTER_CHECKPOINT_INTERVAL", self.POINTER_CHECKPOINT_INTERVAL))
+            )
+            for sensor in self.live_sensors:
+                if self.live_pointers.get(sensor) is None:
+                    self.live_pointers.set(sensor, file_hour, 0)
+            self.upload_errors["live"] = 0
+
+            backfill_rate = float(os.getenv("PAROS_BACKFILL_MAX_RATE", self.BACKFILL_MAX_RATE))
+            if backfill_rate > 0:
+                self.backfill_limiter = RateLimiter(backfill_rate, backfill_rate)
+
     def getPointer(self, sensor_id = None):
-        if os.path.isfile(self.POINTER_PATH) and os.path.getsize(self.POINTER_PATH) > 0:
-            # Only try to open the file if it exists and its size is greather than 0
-            with open(self.POINTER_PATH, 'rb') as f:
-                # pickle files are opened in binary mode
-                cur_pointer = pickle.load(f)
-                # If a sensor_id is requested, send only that. Otherwise, send the whole dict
-                if sensor_id is None:
-                    return cur_pointer
-                else:
-                    if sensor_id in cur_pointer:
-                        return cur_pointer[sensor_id]
-                    else:
-                        return None
-        else:
-            # return none if the file doesn't exist
-            return None
+        return self.pointers.get(sensor_id)
 
     def setPointer(self, sensor_id, hour, offset):
-        # get the current pointer to update its value
-        cur_pointer = self.getPointer()
-        if cur_pointer is None:
-            cur_pointer = {}
-
-        cur_pointer[sensor_id] = [hour, offset]
-        with open(self.POINTER_PATH, 'wb') as f:
-            # overwrite existing pickle file in binary mode
-            pickle.dump(cur_pointer, f)
-            logging.debug(f"Updated pointer file for sensor {sensor_id} with values hour={hour} and offset={offset}")
-
-    def __getLatestData(self, cur_path, cur_offset):
-        with open(cur_path, 'rb') as f:
-            # Open indicated data file and seek to pointer offset
-            # Storing the offset is much faster than reading the
-            # whole file every time
-            f.seek(cur_offset)
-
-            output_str = ""  # stored line protocols that are new
-            line_counter = 0  # stores the number of lines added
-
-            # Do not allow a single block of more than the number of lines
-            # specified in self.MAXIMUM_UPLOAD_SIZE
-            while line_counter <= self.MAXIMUM_UPLOAD_SIZE:
-                lp_str = f.readline()
-                if not lp_str:
-                    # Arrived at the end of the file
-                    break
+        self.pointers.set(sensor_id, hour, offset)
 
-                # Validate lp_str and revert if needed
-                while not lp_str.startswith(self.hostname.encode()):
-                    # That's an issue! Go back one byte until the string is valid
-                    cur_offset -= 1
-                    f.seek(cur_offset)
-                    lp_str = f.readline()
+    def __getLatestData(self, tail_reader, cur_path, cur_offset, max_lines):
+        # Open indicated data file and read from the pointer offset
+        # Storing the offset is much faster than reading the
+        # whole file every time. Do not allow a single block of more
+        # than max_lines lines
+        return tail_reader.read(cur_path, cur_offset, max_lines)
 
-                output_str += lp_str.decode()  # append line to output
-                line_counter += 1  # incremement line counter
-                cur_offset += len(lp_str)  # update offset by the length of the line
+    def __readSensor(self, sensor, cur_file, cur_offset, max_lines, tail_reader=None):
+        # The summary lane reads with a TailReader of its own
+        if tail_reader is None:
+            tail_reader = self.tail_readers[sensor]
 
-        return output_str,cur_offset,line_counter
-
-    def __processSensor(self, sensor):
         cur_sensor_dir = os.path.join(self.data_loc, sensor)  # Find the sensor data path in the filesystem
-        cur_file,cur_offset = self.getPointer(sensor)  # Get the state of the current pointer for this sensor
         cur_path = os.path.join(cur_sensor_dir, cur_file)  # Get full path of the current data file
 
         # this stored the output line-protocol for the given sensors during this loop
-        output_lp = ""
-        cur_pointer_time = datetime.datetime.strptime(cur_file, '%Y-%m-%d-%H')  # Create a datetime object from the stored hour
-
+        output_lp = b""
         num_lines = 0  # initialize num_lines var for later
 
+        new_offset = cur_offset
+        read_start_ns = time.perf_counter_ns()
         if os.path.isfile(cur_path):
             # This is where the data is actually pulled from the file, only if the file exists
-            output_lp,cur_offset,num_lines = self.__getLatestData(cur_path, cur_offset)
-
-        if output_lp:
-            # There is new line protocol to send to InfluxDB
+            output_lp,new_offset,num_lines = self.__getLatestData(tail_reader, cur_path, cur_offset, max_lines)
+        elif self.archiver and os.path.isfile(self.archiver.archivePath(sensor, cur_file)):
+            # The hour was already archived, e.g. the pointer was rewound or not
+            # checkpointed past it before a restart. Read the compressed copy as it is
+            archive_path = self.archiver.archivePath(sensor, cur_file)
+            output_lp,new_offset,num_lines = tail_reader.readArchive(archive_path, cur_offset, max_lines)
+        self.stage_timer.add("read", time.perf_counter_ns() - read_start_ns)
+
+        if new_offset != cur_offset:
+            # New lines, or only invalid lines that were skipped over
+            return output_lp,cur_file,new_offset,num_lines
+
+        # Nothing new to send
+        # This will execute if the program is running too fast (not an issue)
+        # or if the file is no longer being written to. In this case usually
+        # it is time to switch to the next hour of data. The hour index knows
+        # which hours have files, so hours where the sampler was down are
+        # skipped in one step instead of one per loop
+        live_hour = self.__getLiveHour()
+        if live_hour > cur_file:
+            # Verify that the sensors aren't time traveling before
+            # switching to the new file
+            cur_file = self.hour_indexes[sensor].nextHour(cur_file, live_hour)
+            cur_offset = 0
+
+        return output_lp,cur_file,cur_offset,num_lines
+
+    def __isBehind(self, cur_file, num_lines, max_lines):
+        # Data from a completed hour, or more new lines than fit in one upload.
+        # The pointer only moves to a new hour HOUR_CLOSE_DELAY after it
+        # starts, until then the previous hour is still the live one
+        return num_lines >= max_lines or cur_file < self.__getLiveHour()
+
+    def __uploadReady(self):
+        # False while backing off with nowhere to stage batches, in which case
+        # there is no point reading anything from the hour files
+        if not self.breaker.isWaiting():
+            return True
+        return self.spool is not None and self.spool.hasRoom()
+
+    def __writeInflux(self, sensor, output_lp, num_lines):
+        # Returns how long the write took, or None if the batch was too large
+        # for InfluxDB and went out in parts. Raises if the batch was neither
+        # uploaded nor spooled, in which case the pointer must not move
+        encode_start_ns = time.perf_counter_ns()
+        body = self.influx_writer.encode(output_lp)
+        self.stage_timer.add("compress", time.perf_counter_ns() - encode_start_ns)
+        label = sensor if sensor in self.upload_latency else "combined"
+
+        # Nothing skips ahead of spooled batches while they are being sent
+        if (self.spool is None or not self.spool.pending) and self.breaker.allowRequest():
             try:
+                if self.backfill_limiter is not None:
+                    self.backfill_limiter.wait(len(body))
+
                 # Send 'em off!
-                self.influx_write_api.write(
-                    bucket = self.influx_bucket,
-                    record = output_lp
-                )
+                write_start_time = time.monotonic()
+                rejected,too_large = self.influx_writer.post(body, num_lines, len(output_lp))
+                latency = time.monotonic() - write_start_time
+                self.stage_timer.add("post", int(latency * 1e9))
+                self.breaker.recordSuccess()
+                with self.metrics_lock:
+                    self.upload_latency[label].observe(latency)
+                    self.upload_lines[label].observe(num_lines)
+
+                logging.debug(f"Uploaded {num_lines - rejected} of {num_lines} lines of line-protocol for sensor {sensor}")
+                return None if too_large else latency
+            except Exception as e:
+                # Failed writes count too, a timeout is time spent posting
+                self.stage_timer.add("post", int((time.monotonic() - write_start_time) * 1e9))
+                self.breaker.recordFailure(e)
+                with self.metrics_lock:
+                    self.upload_errors[label] += 1
+                if self.spool is None:
+                    raise
+
+        if self.spool is None:
+            raise ConnectionError("Waiting to retry InfluxDB")
+
+        if not self.spool.hasRoom():
+            raise ConnectionError(f"Spool in {self.spool.path} is full")
+
+        self.spool.put(body, num_lines, len(output_lp), self.influx_writer.compress)
+        with self.metrics_lock:
+            self.spooled_batches[label] += 1
+        logging.debug(f"Spooled {num_lines} of line-protocol for sensor {sensor}")
+        return 0
+
+    def __recordUpload(self, controller, num_lines, latency):
+        # A batch too large for InfluxDB shrinks the next ones like a failure
+        if latency is None:
+            controller.recordFailure()
+        else:
+            controller.recordSuccess(num_lines, latency)
 
-                if self.influx_fail:
-                    logging.info("Conenction to InfluxDB restored")
-                    self.influx_fail = False
+    def __drainSpool(self):
+        # Sends spooled batches once InfluxDB accepts writes again
+        if self.spool is None or not self.spool.pending:
+            return
 
-                logging.debug(f"Uploaded {num_lines} of line-protocol for sensor {sensor}")
+        for i in range(self.SPOOL_DRAIN_BATCHES):
+            if not self.breaker.allowRequest():
+                return
 
-                # Update the pointer ONLY after successfully sending to InfluxDB
-                self.setPointer(sensor, cur_file, cur_offset)
+            item = self.spool.get()
+            if item is None:
+                return
+
+            if self.backfill_limiter is not None:
+                self.backfill_limiter.wait(len(item["body"]))
+
+            post_start_ns = time.perf_counter_ns()
+            try:
+                # Lines InfluxDB refuses are counted by the writer, the rest have landed
+                self.influx_writer.post(item["body"], item["num_lines"], item["raw_size"], item["compressed"])
             except Exception as e:
-                if not self.influx_fail:
-                    logging.error(f"Connection to InfluxDB Lost: {e}")
-                    self.influx_fail = True
+                self.stage_timer.add("post", time.perf_counter_ns() - post_start_ns)
+                self.spool.nack(item)
+                self.breaker.recordFailure(e)
+                with self.metrics_lock:
+                    self.upload_errors["spool"] += 1
+                return
 
-                pass
-        else:
-            # Nothing new to send
-            # This will execute if the program is running too fast (not an issue)
-            # or if the file is no longer being written to. In this case usually
-            # it is time to switch to the next hour of data. This also allows the processor
-            # to "find" the next available file if the program is running behind without
-            # having to list the whole directory of files and sort them, which takes
-            # a long time
-            if self.__getHourOnlyUTCNow() > cur_pointer_time:
-                # Verify that the sensors aren't time traveling before
-                # switching to the new file
-                cur_pointer_time += datetime.timedelta(hours=1)
-                cur_file = cur_pointer_time.strftime('%Y-%m-%d-%H')
-                cur_offset = 0
-
-                self.setPointer(sensor, cur_file, cur_offset)
-
-        # Returns the number of lines uploaded to influxdb
-        return num_lines
+            self.stage_timer.add("post", time.perf_counter_ns() - post_start_ns)
+            self.spool.ack(item)
+            self.breaker.recordSuccess()
+
+    def __processSensor(self, sensor):
+        if not self.__uploadReady():
+            return False
+
+        controller = self.batch_controllers[sensor]
+        cur_file,cur_offset = self.getPointer(sensor)  # Get the state of the current pointer for this sensor
+        max_lines = controller.nextSize(self.tail_readers[sensor].line_size)
+        output_lp,new_file,new_offset,num_lines = self.__readSensor(sensor, cur_file, cur_offset, max_lines)
+        controller.update(self.__isBehind(cur_file, num_lines, max_lines))
+
+        if output_lp:
+            # There is new line protocol to send to InfluxDB
+            try:
+                latency = self.__writeInflux(sensor, output_lp, num_lines)
+            except Exception:
+                controller.recordFailure()
+                return False
+
+            self.__recordUpload(controller, num_lines, latency)
+
+            # Update the pointer ONLY after successfully sending to InfluxDB
+            self.setPointer(sensor, new_file, new_offset)
+        elif (new_file, new_offset) != (cur_file, cur_offset):
+            # Moved to the next hour or past invalid lines
+            self.setPointer(sensor, new_file, new_offset)
+
+        # Returns True if this sensor is catching up
+        return controller.state == BatchController.CATCHUP
+
+    def __sensorLoop(self, sensor):
+        # Concurrent mode: each sensor reads ahead and keeps up to MAX_IN_FLIGHT
+        # uploads running on the shared upload pool. Uploads may finish in any
+        # order but the pointer only ever moves to the end of the oldest batch
+        # once it is confirmed, so the pointer advances strictly in file order
+        controller = self.batch_controllers[sensor]
+        read_file,read_offset = self.getPointer(sensor)  # where the next batch is read from
+        in_flight = collections.deque()  # (future, num_lines, file, offset) of batches being uploaded
+
+        while not self.stop_event.is_set():
+            loop_start_time = time.monotonic()
+            caught_up = False
+
+            # Fill the pipeline
+            while len(in_flight) < self.max_in_flight and self.__uploadReady():
+                max_lines = controller.nextSize(self.tail_readers[sensor].line_size)
+                output_lp,new_file,new_offset,num_lines = self.__readSensor(sensor, read_file, read_offset, max_lines)
+                controller.update(self.__isBehind(read_file, num_lines, max_lines))
+
+                if output_lp:
+                    future = self.upload_pool.submit(self.__writeInflux, sensor, output_lp, num_lines)
+                    in_flight.append((future, num_lines, new_file, new_offset))
+                elif (new_file, new_offset) == (read_file, read_offset):
+                    # Nothing new to send
+                    caught_up = True
+                    break
+                elif in_flight:
+                    # Moving to the next hour or past invalid lines has to wait for the pending uploads
+                    break
+                else:
+                    # Moved to the next hour or past invalid lines
+                    self.setPointer(sensor, new_file, new_offset)
+
+                read_file,read_offset = new_file,new_offset
+
+                if output_lp and controller.state == BatchController.LIVE:
+                    # Read everything there is for now
+                    caught_up = True
+                    break
+
+            # Commit the oldest batch
+            if in_flight:
+                future,num_lines,new_file,new_offset = in_flight[0]
+                try:
+                    self.__recordUpload(controller, num_lines, future.result())
+                    in_flight.popleft()
+                    self.setPointer(sensor, new_file, new_offset)
+                    continue
+                except Exception:
+                    controller.recordFailure()
+
+                    # Let the rest finish, then read again from the last confirmed batch.
+                    # Any later batch that did get through is simply sent again
+                    futures.wait([batch[0] for batch in in_flight])
+                    in_flight.clear()
+                    read_file,read_offset = self.getPointer(sensor)
+                    caught_up = True
+
+            if caught_up or not in_flight:
+                self.__waitForSensorData(sensor, loop_start_time)
+
+    def __waitForData(self, loop_start_time):
+        # Serial and batched modes: wait until the next loop should start
+        if self.dir_watcher is None:
+            sleep(max(0, loop_start_time + self.LOOP_PERIOD - time.monotonic()))
+            return
+
+        # A sampler flushing many times a second would otherwise cause an
+        # upload per flush, writes in the meantime are still queued
+        sleep(max(0, loop_start_time + self.min_upload_interval - time.monotonic()))
+
+        changes = self.dir_watcher.wait(self.WATCH_FALLBACK_PERIOD)
+        self.__addNewHours(changes)
+        if changes:
+            sleep(self.WATCH_DEBOUNCE)
+
+    def __waitForSensorData(self, sensor, loop_start_time):
+        # Concurrent mode: wait until the next loop of this sensor should start
+        if self.dir_watcher is None:
+            self.stop_event.wait(max(0, loop_start_time + self.LOOP_PERIOD - time.monotonic()))
+            return
+
+        # Same floor as the other modes, events in the meantime stay set
+        if self.stop_event.wait(max(0, loop_start_time + self.min_upload_interval - time.monotonic())):
+            return
+
+        self.data_events[sensor].wait(self.WATCH_FALLBACK_PERIOD)
+        self.data_events[sensor].clear()
+
+    def __watchLoop(self):
+        # Concurrent mode: hands file events to the sensor threads
+        while not self.stop_event.is_set():
+            changes = self.dir_watcher.wait(self.LOOP_PERIOD)
+            self.__addNewHours(changes)
+            for sensor in changes:
+                self.data_events[sensor].set()
+
+    def __addNewHours(self, changes):
+        for sensor,created in changes.items():
+            for file_name in created:
+                if HourIndex.HOUR_FILE_RE.fullmatch(file_name):
+                    self.hour_indexes[sensor].add(file_name)
+
+    def __getLiveHour(self):
+        # Name of the hour file the pointers may move up to
+        return (datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=self.HOUR_CLOSE_DELAY)).strftime('%Y-%m-%d-%H')
 
     def __getHourOnlyUTCNow(self):
         # Gets the current datetime in UTC then removes timezone info, and removes
         # anything more granular than an hour for comparison purposes
         return datetime.datetime.now(datetime.UTC).replace(tzinfo=None, minute=0, second=0, microsecond=0)
 
+    def __processBatch(self):
+        # Batched mode: the new lines of every sensor go out in one request and
+        # each pointer moves only once that request is accepted
+        if not self.__uploadReady():
+            return False
+
+        output_parts = []  # line protocol of each sensor in this request
+        batch = []  # (sensor, file, offset) to commit after the upload
+        total_lines = 0
+        total_bytes = 0
+        behind = False  # True if a sensor is in a completed hour or had more data than its share of the request
+        full = False  # True if a sensor had more data than its share of the request
+
+        # Request budget for this loop
+        controller = self.combined_controller
+        line_size = max(tail_reader.line_size for tail_reader in self.tail_readers.values())
+        max_total_lines = controller.nextSize(line_size)
+        max_total_bytes = self.batch_max_bytes if controller.state == BatchController.LIVE else self.MAXIMUM_UPLOAD_BYTES
+
+        for i,sensor in enumerate(self.sensors):
+            # Split what is left of the request budget between the remaining sensors
+            remaining_sensors = len(self.sensors) - i
+            line_share = (max_total_lines - total_lines) // remaining_sensors
+            byte_share = (max_total_bytes - total_bytes) // remaining_sensors
+            max_lines = max(1, min(line_share, byte_share // self.tail_readers[sensor].line_size))
+
+            cur_file,cur_offset = self.getPointer(sensor)
+            output_lp,new_file,new_offset,num_lines = self.__readSensor(sensor, cur_file, cur_offset, max_lines)
+            if self.__isBehind(cur_file, num_lines, max_lines):
+                behind = True
+            if num_lines >= max_lines:
+                full = True
+
+            if output_lp:
+                output_parts.append(output_lp)
+                batch.append((sensor, new_file, new_offset))
+                total_lines += num_lines
+                total_bytes += len(output_lp)
+            elif (new_file, new_offset) != (cur_file, cur_offset):
+                # Moved to the next hour or past invalid lines
+                self.setPointer(sensor, new_file, new_offset)
+
+        controller.update(behind)
+
+        if not output_parts:
+            return behind
+
+        try:
+            latency = self.__writeInflux(",".join(sensor for sensor,new_file,new_offset in batch), b"".join(output_parts), total_lines)
+        except Exception:
+            controller.recordFailure()
+            return False
+
+        # A sensor that filled its share means the request budget was the limit
+        self.__recordUpload(controller, max_total_lines if full else total_lines, latency)
+
+        # Update the pointers ONLY after successfully sending to InfluxDB
+        for sensor,new_file,new_offset in batch:
+            self.setPointer(sensor, new_file, new_offset)
+
+        # Returns True while catching up
+        return behind
+
+    def __periodicTasks(self):
+        # Persist pointers if the checkpoint interval has passed
+        self.pointers.checkpoint()
+
+        self.__drainSpool()
+
+        if time.monotonic() >= self.next_stats_time:
+            self.influx_writer.logStats()
+            self.stage_timer.logSummary(force=True)
+            self.next_stats_time = time.monotonic() + self.STATS_PERIOD
+
+    def __archiveLoop(self):
+        # Background thread: compress the hours every sensor is done with and
+        # keep the backup location within its retention budget
+        while not self.stop_event.wait(self.ARCHIVE_PERIOD):
+            try:
+                for sensor in self.sensors:
+                    cur_file,cur_offset = self.getPointer(sensor)
+                    self.archiver.archive(sensor, cur_file)
+
+                self.archiver.enforceRetention()
+            except Exception as e:
+                logging.error(f"Unable to archive hour files: {e}")
+
+    def __liveLoop(self):
+        # Background thread, tiered upload: summaries of every sensor's newest
+        # data in one request every LIVE_LOOP_PERIOD
+        while not self.stop_event.wait(self.LIVE_LOOP_PERIOD):
+            try:
+                self.__processLive()
+            except Exception as e:
+                for sensor in self.live_sensors:
+                    self.live_summarizer.reset(sensor)
+                logging.error(f"Unable to send live summaries: {e}")
+
+    def __processLive(self):
+        # The summary lane only looks at the live hour and the one before,
+        # older hours are left to the backfill lane
+        live_time = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=self.HOUR_CLOSE_DELAY)
+        oldest_hour = (live_time - datetime.timedelta(hours=1)).strftime('%Y-%m-%d-%H')
+
+        summaries = []
+        read_ends = {}
+        for sensor in self.live_sensors:
+            cur_file,cur_offset = self.live_pointers.get(sensor)
+            if cur_file < oldest_hour:
+                logging.info(f"Live summaries for sensor {sensor} skip from hour {cur_file} to the live hour")
+                cur_file,cur_offset = live_time.strftime('%Y-%m-%d-%H'),0
+                self.live_summarizer.reset(sensor)
+
+            # Everything there is, in blocks of at most LIVE_MAX_LINES
+            while True:
+                output_lp,new_file,new_offset,num_lines = self.__readSensor(sensor, cur_file, cur_offset, self.LIVE_MAX_LINES, self.live_readers[sensor])
+                if output_lp:
+                    summaries.append(self.live_summarizer.add(sensor, output_lp, (cur_file, cur_offset)))
+                elif new_file != cur_file:
+                    # The hour is complete
+                    summaries.append(self.live_summarizer.flush(sensor))
+
+                if (new_file, new_offset) == (cur_file, cur_offset):
+                    break
+                cur_file,cur_offset = new_file,new_offset
+
+            # A sensor that stopped sending still gets its last summary
+            summaries.append(self.live_summarizer.flushStale(sensor, time.time_ns() - self.HOUR_CLOSE_DELAY * 1000000000))
+            read_ends[sensor] = (cur_file, cur_offset)
+
+        output_lp = b"".join(summaries)
+        if output_lp:
+            if not self.breaker.allowRequest():
+                # Read again from the same pointers once InfluxDB is back
+                for sensor in self.live_sensors:
+                    self.live_summarizer.reset(sensor)
+                return
+
+            try:
+                # Lines InfluxDB refuses are counted by the writer, the rest have landed
+                self.influx_writer.post(self.influx_writer.encode(output_lp), output_lp.count(b"\n"), len(output_lp))
+            except Exception as e:
+                self.breaker.recordFailure(e)
+                with self.metrics_lock:
+                    self.upload_errors["live"] += 1
+                for sensor in self.live_sensors:
+                    self.live_summarizer.reset(sensor)
+                return
+            self.breaker.recordSuccess()
+
+        # The pointers stay at the start of any period still being filled
+        for sensor,read_end in read_ends.items():
+            self.live_pointers.set(sensor, *self.live_summarizer.resumePoint(sensor, read_end))
+
+    def __closePointers(self):
+        # Final checkpoint of both lanes
+        self.pointers.close()
+        if self.live_pointers is not None:
+            self.live_pointers.close()
+
+    def __collectMetrics(self, metrics):
+        # Called from the metrics thread every ParosMetrics.WRITE_PERIOD
+        live_hour = self.__getHourOnlyUTCNow()
+        for sensor in self.sensors:
+            labels = {"sensor": sensor}
+            cur_file,cur_offset = self.getPointer(sensor)
+            hours_behind = (live_hour - datetime.datetime.strptime(cur_file, '%Y-%m-%d-%H')).total_seconds() / 3600
+            metrics.add("paros_processor_bytes_behind", "gauge", "Bytes of hour files after the pointer, not uploaded yet", self.__bytesBehind(sensor, cur_file, cur_offset), labels)
+            metrics.add("paros_processor_hours_behind", "gauge", "Hours between the pointer and the live hour", max(0, hours_behind), labels)
+
+        with self.metrics_lock:
+            for label in self.upload_latency:
+                labels = {"sensor": label}
+                metrics.addHistogram("paros_processor_upload_latency_seconds", "Time to write one batch to InfluxDB", self.upload_latency[label], labels)
+                metrics.addHistogram("paros_processor_upload_lines", "Lines in each batch written to InfluxDB", self.upload_lines[label], labels)
+                metrics.add("paros_processor_spooled_batches_total", "counter", "Batches staged in the spool instead of being sent", self.spooled_batches[label], labels)
+            for label,errors in self.upload_errors.items():
+                metrics.add("paros_processor_upload_errors_total", "counter", "Failed writes to InfluxDB", errors, {"sensor": label})
+
+        metrics.add("paros_processor_rejected_lines_total", "counter", "Lines InfluxDB refused on their own, dropped instead of retried", self.influx_writer.rejected_lines)
+        if self.spool is not None:
+            metrics.add("paros_processor_spool_pending_batches", "gauge", "Batches waiting in the spool", self.spool.pending)
+        metrics.add("paros_processor_breaker_open", "gauge", "1 while backing off from InfluxDB", int(self.breaker.state != CircuitBreaker.CLOSED))
+
+    def __bytesBehind(self, sensor, cur_file, cur_offset):
+        # Rest of the pointer's hour file plus every later hour file. Archived
+        # hours are not counted, only the pointer being rewound reaches them
+        cur_sensor_dir = os.path.join(self.data_loc, sensor)
+        behind = 0
+        try:
+            with os.scandir(cur_sensor_dir) as entries:
+                for entry in entries:
+                    if entry.name >= cur_file and HourIndex.HOUR_FILE_RE.fullmatch(entry.name):
+                        behind += entry.stat().st_size - (cur_offset if entry.name == cur_file else 0)
+        except FileNotFoundError:
+            pass
+        return max(0, behind)
+
     def processorLoop(self):
+        if self.archiver:
+            threading.Thread(target=self.__archiveLoop, name="archiver", daemon=True).start()
+
+        if self.metrics is not None:
+            self.metrics.addCollector(self.__collectMetrics)
+            self.metrics.start()
+
+        if self.live_summarizer is not None:
+            threading.Thread(target=self.__liveLoop, name="live-summary", daemon=True).start()
+
+        if self.processor_mode == "concurrent":
+            self.__concurrentLoop()
+        elif self.processor_mode == "batched":
+            self.__batchedLoop()
+        else:
+            self.__serialLoop()
+
+    def __serialLoop(self):
         # Main loop
         while True:
             try:
                 # Record system time when starting an iteration
-                loop_start_time = datetime.datetime.now()
-                max_num_lines = 0  # stores the maximum numnber of lines sent during this iteration
+                loop_start_time = time.monotonic()
+                behind = False  # True if any sensor is catching up
 
                 # loop through each sensor and poll files
                 for sensor in self.sensors:
-                    cur_num_lines = self.__processSensor(sensor)
+                    if self.__processSensor(sensor):
+                        behind = True
 
-                    # if this is a maximum, update
-                    if cur_num_lines > max_num_lines:
-                        max_num_lines = cur_num_lines
+                self.__periodicTasks()
 
                 # Timing control portion of the loop. Usually, there is no reason for the program to
                 # be looping as fast as possible, so we wait until the current system time is at least
-                # 1 second past the time when the iteration started. The exception is that if the program
-                # needs to catch up, which is evident by the lines being sent being equal to maximum upload,
-                # then we want the program to keep looping without control until it is stable again
-                if max_num_lines < self.MAXIMUM_UPLOAD_SIZE:
-                    while datetime.datetime.now() < loop_start_time + datetime.timedelta(seconds=self.LOOP_PERIOD):
-                        sleep(0.01)
+                # 1 second past the time when the iteration started, or with inotify wakeups until a sampler
+                # writes something. The exception is that if the program
+                # needs to catch up, which is evident by a sensor reading a completed hour or filling a whole
+                # upload, then we want the program to keep looping without control until it is stable again
+                if not behind:
+                    self.__waitForData(loop_start_time)
 
             except KeyboardInterrupt:
                 # Handles ctrl+c events
                 logging.info("Stopping processor from key interrupt")
+                self.__closePointers()
+                exit(0)
+
+    def __concurrentLoop(self):
+        # One thread per sensor, uploads go through a shared bounded pool
+        self.upload_pool = futures.ThreadPoolExecutor(max_workers=self.upload_workers)
+        sensor_threads = []
+        for sensor in self.sensors:
+            sensor_thread = threading.Thread(target=self.__sensorLoop, args=(sensor,), name=f"sensor-{sensor}", daemon=True)
+            sensor_thread.start()
+            sensor_threads.append(sensor_thread)
+
+        if self.dir_watcher is not None:
+            threading.Thread(target=self.__watchLoop, name="dir-watcher", daemon=True).start()
+
+        try:
+            while any(sensor_thread.is_alive() for sensor_thread in sensor_threads):
+                self.__periodicTasks()
+                sleep(self.LOOP_PERIOD)
+
+            logging.critical("All sensor threads stopped")
+            self.__closePointers()
+            exit(1)
+
+        except KeyboardInterrupt:
+            # Handles ctrl+c events
+            logging.info("Stopping processor from key interrupt")
+            self.stop_event.set()
+            for data_event in self.data_events.values():
+                data_event.set()
+            for sensor_thread in sensor_threads:
+                sensor_thread.join()
+            self.upload_pool.shutdown()
+            self.__closePointers()
+            exit(0)
+
+    def __batchedLoop(self):
+        # Main loop
+        while True:
+            try:
+                # Record system time when starting an iteration
+                loop_start_time = time.monotonic()
+
+                behind = self.__processBatch()
+
+                self.__periodicTasks()
+
+                # Same timing control as the serial loop, keep going without waiting
+                # while some sensor is catching up
+                if not behind:
+                    self.__waitForData(loop_start_time)
+
+            except KeyboardInterrupt:
+                # Handles ctrl+c events
+                logging.info("Stopping processor from key interrupt")
+                self.__closePointers()
                 exit(0)
 
 def main():
@@ -232,13 +831,22 @@ def main():
             logging.critical(f"Unable to find environment variable {env_item}. Does .env exist?")
             exit(1)
 
+    # systemd stops the processor with SIGTERM, handle it like ctrl+c
+    # so the latest pointers are checkpointed before exiting
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    # SIGUSR1 profiles the processor for a while, see ParosProfiler
+    ParosProfiler.fromEnv("paros_processor").install()
+
     # Create processor
     processor = parosProcessor(
         os.getenv("PAROS_DATA_LOCATION"),
         os.getenv("PAROS_INFLUXDB_HOST"),
         os.getenv("PAROS_INFLUXDB_ORG"),
         os.getenv("PAROS_INFLUXDB_BUCKET"),
-        os.getenv("PAROS_INFLUXDB_TOKEN")
+        os.getenv("PAROS_INFLUXDB_TOKEN"),
+        buffer_loc=os.getenv("PAROS_BUFFER_LOCATION"),
+        backup_loc=os.getenv("PAROS_BACKUP_LOCATION")
     )
 
     # Main loop in the main thread
@@ -0,0 +1,99 @@
+import os
+import json
+import socket
+import logging
+import pathlib
+import argparse
+import datetime
+from dotenv import load_dotenv
+from paros_processor import HourIndex
+from paros_processor.HourQC import HourQC
+
+QC_DIR = 'qc'  # same as parosProcessor.QC_DIR, summaries are uploaded from here
+
+def hourFiles(data_loc, backup_loc, sensor, first_hour, end_hour):
+    # (hour, path) of every hour file of sensor from first_hour up to but not
+    # including end_hour, the uncompressed file if it hasn't been archived yet
+    sensor_dir = os.path.join(data_loc, sensor)
+    archive_dir = os.path.join(backup_loc, sensor) if backup_loc else None
+    for hour in HourIndex(sensor_dir, archive_dir).hours:
+        if first_hour <= hour < end_hour:
+            path = os.path.join(sensor_dir, hour)
+            if archive_dir and not os.path.exists(path):
+                path = os.path.join(archive_dir, hour + ".gz")
+            yield hour, path
+
+def main():
+    # Setup logging
+    logging.basicConfig(level=logging.INFO)
+
+    # Read .env file
+    file_path = pathlib.Path(__file__).parent.resolve()
+    load_dotenv(f"{file_path}/.env")
+
+    parser = argparse.ArgumentParser(description="Checks the health of every sensor's hour files")
+    parser.add_argument("--day", help="UTC day to check, YYYY-MM-DD, yesterday by default")
+    parser.add_argument("--last-hours", help="Check the last so many completed hours instead of a day", type=int)
+    parser.add_argument("--sensors", help="Sensor ids to check, every sensor of this box by default", nargs="+")
+    parser.add_argument("--no-write", help="Only print the results, don't write summaries for the processor to upload", action="store_true")
+    args = parser.parse_args()
+
+    data_loc = os.getenv("PAROS_DATA_LOCATION")
+    if data_loc is None:
+        logging.critical("Unable to find environment variable PAROS_DATA_LOCATION. Does .env exist?")
+        exit(1)
+    backup_loc = os.getenv("PAROS_BACKUP_LOCATION")
+    hostname = socket.gethostname()
+
+    sensors = args.sensors
+    if sensors is None:
+        with open(f'sensor_configs/{hostname}.json', 'r') as f:
+            sensors = [sensor['sensor_id'] for sensor in json.load(f)['sensors']]
+
+    now = datetime.datetime.now(datetime.UTC).replace(minute=0, second=0, microsecond=0)
+    if args.last_hours:
+        first = now - datetime.timedelta(hours=args.last_hours)
+        end = now
+    else:
+        day = datetime.date.fromisoformat(args.day) if args.day else (now - datetime.timedelta(days=1)).date()
+        first = datetime.datetime.combine(day, datetime.time(), datetime.UTC)
+        end = first + datetime.timedelta(days=1)
+    first_hour = first.strftime('%Y-%m-%d-%H')
+    end_hour = end.strftime('%Y-%m-%d-%H')
+
+    qc = HourQC(f"{hostname}_qc")
+    summaries = []
+    print(f"{'sensor':16s} {'hour':13s} {'samples':>8s} {'rate_hz':>8s} {'jitter':>7s} {'gaps':>5s} {'gap_s':>7s} {'rejected':>8s} {'outliers':>8s} {'coverage':>8s} {'drift_ppm':>9s}")
+    for sensor in sensors:
+        for hour, path in hourFiles(data_loc, backup_loc, sensor, first_hour, end_hour):
+            try:
+                results = qc.checkHour(path, hour)
+            except (OSError, EOFError) as e:
+                # Archived while it was being checked, or a damaged archive
+                logging.error(f"Unable to check hour {hour} of sensor {sensor}: {e}")
+                continue
+
+            hour_ns = int(datetime.datetime.strptime(hour, '%Y-%m-%d-%H').replace(tzinfo=datetime.UTC).timestamp()) * 1000000000
+            summary = qc.summaryLine(sensor, results, hour_ns)
+            if summary:
+                summaries.append(summary)
+
+            outliers = sum(value for name, value in results.items() if name.endswith("_outliers") or name.endswith("_out_of_range"))
+            drifts = [value for name, value in results.items() if name.endswith("_drift_ppm")]
+            print(
+                f"{sensor:16s} {hour:13s} {results['samples']:8.0f} {results['rate_hz']:8.2f} {results['jitter_ms']:7.2f} "
+                f"{results['gaps']:5.0f} {results['gap_seconds']:7.1f} {results['rejected_lines']:8.0f} {outliers:8.0f} "
+                f"{results['coverage']:8.4f} {drifts[0] if drifts else float('nan'):9.2f}"
+            )
+
+    output_lp = b"".join(summaries)
+    if output_lp and not args.no_write:
+        # One write into the current hour, picked up by the processor with PAROS_QC_UPLOAD=1
+        qc_dir = os.path.join(data_loc, QC_DIR)
+        os.makedirs(qc_dir, exist_ok=True)
+        with open(os.path.join(qc_dir, now.strftime('%Y-%m-%d-%H')), "ab") as f:
+            f.write(output_lp)
+        logging.info(f"Wrote {len(summaries)} hour summaries to {qc_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ arg_venv=0
 arg_frp=0
 arg_sensors=0
 arg_processor=0
+arg_sampler_host=0
 
 for arg in "$@"; do
     if [[ "$arg" == "--new" ]]; then
@@ -26,6 +27,8 @@ for arg in "$@"; do
         arg_sensors=1
     elif [[ "$arg" == "--processor" ]]; then
         arg_processor=1
+    elif [[ "$arg" == "--sampler-host" ]]; then
+        arg_sampler_host=1
     fi
 done
 
@@ -51,6 +54,14 @@ fi
 #
 if [[ $arg_new -eq 1 ]] || [[ $arg_packages -eq 1 ]]; then
     sudo apt install python3-venv python3-dev prometheus-node-exporter
+
+    # node-exporter publishes the samplers' and processor's metrics from its
+    # textfile directory, which is owned by root
+    if [[ -n "$PAROS_METRICS_LOCATION" ]]; then
+        sudo mkdir -p $PAROS_METRICS_LOCATION
+        sudo chgrp pi $PAROS_METRICS_LOCATION
+        sudo chmod g+w $PAROS_METRICS_LOCATION
+    fi
 fi
 
 #
@@ -114,7 +125,34 @@ fi
 #
 # Sensor Daemons
 #
-if [[ $arg_new -eq 1 ]] || [[ $arg_sensors -eq 1 ]]; then
+if ([[ $arg_new -eq 1 ]] || [[ $arg_sensors -eq 1 ]]) && [[ $arg_sampler_host -eq 1 ]]; then
+    # One process samples every sensor in the config instead of one per sensor
+    jq -r '.sensors[].sensor_id' sensor_configs/$THIS_HOSTNAME.json | while read -r sensor_id; do
+        sudo systemctl disable --now paros-sampler-$sensor_id.service 2> /dev/null
+    done
+
+    sudo tee /etc/systemd/system/paros-sampler-host.service > /dev/null << EOF
+[Unit]
+Description=Paros Sampler Host
+After=network-online.target,time-sync.target
+Wants=network-online.target,time-sync.target
+
+[Service]
+WorkingDirectory=$THIS_LOCATION
+ExecStart=$PAROS_VENV_LOCATION/bin/python $THIS_LOCATION/paros_sensors/ParosSamplerHost.py
+Restart=always
+RestartSec=10
+User=pi
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    sudo systemctl daemon-reload
+    sudo systemctl enable paros-sampler-host.service
+elif [[ $arg_new -eq 1 ]] || [[ $arg_sensors -eq 1 ]]; then
+    sudo systemctl disable --now paros-sampler-host.service 2> /dev/null
+
     jq -c '.sensors[]' sensor_configs/$THIS_HOSTNAME.json | while read -r sensor; do
         driver=$(echo "$sensor" | jq -r '.driver')
         sensor_id=$(echo "$sensor" | jq -r '.sensor_id')
@@ -146,7 +184,7 @@ fi
 # Processor Daemon
 #
 if [[ $arg_new -eq 1 ]] || [[ $arg_processor -eq 1 ]]; then
-    sudo sudo tee /etc/systemd/system/paros-processor.service > /dev/null << EOF
+    sudo tee /etc/systemd/system/paros-processor.service > /dev/null << EOF
 [Unit]
 Description=Paros Processor
 After=network-online.target,time-sync.target
@@ -161,10 +199,37 @@ User=pi
 
 [Install]
 WantedBy=multi-user.target
+EOF
+
+    # Checks the previous day's hour files once a day, see qc.py
+    sudo tee /etc/systemd/system/paros-qc.service > /dev/null << EOF
+[Unit]
+Description=Paros Hour File QC
+
+[Service]
+Type=oneshot
+WorkingDirectory=$THIS_LOCATION
+ExecStart=$PAROS_VENV_LOCATION/bin/python $THIS_LOCATION/qc.py
+Nice=19
+IOSchedulingClass=idle
+User=pi
+EOF
+
+    sudo tee /etc/systemd/system/paros-qc.timer > /dev/null << EOF
+[Unit]
+Description=Daily Paros Hour File QC
+
+[Timer]
+OnCalendar=*-*-* 00:20:00 UTC
+Persistent=true
+
+[Install]
+WantedBy=timers.target
 EOF
 
     sudo systemctl daemon-reload
     sudo systemctl enable paros-processor.service
+    sudo systemctl enable paros-qc.timer
 
     echo "DONE. Reboot node!"
 fi